@@ -1,11 +1,15 @@
 # -*- coding: utf-8 -*-
 # ===== L9 Boss Timer (Hybrid: interval from sheet, fixed & world fixed times) =====
 
-import os, re, time, asyncio
+import os, re, sys, time, random, asyncio, functools, threading, heapq, itertools, sqlite3, bisect, operator, contextlib
+import signal, socket, logging, queue, contextvars
+from logging.handlers import QueueHandler, QueueListener
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, date, timedelta
-from typing import Optional, Tuple, List
+from typing import Optional, Tuple, List, NamedTuple
+from collections import deque, Counter
 
-import json
+import json, hashlib, hmac
 from aiohttp import web
 
 import pytz
@@ -16,12 +20,17 @@ from discord.ext.commands import has_permissions
 from discord.ui import View, Button
 from discord import Interaction
 from oauth2client.service_account import ServiceAccountCredentials
+from requests.adapters import HTTPAdapter
 
 # ========= ตั้งค่า Discord =========
 app_prefix = "!"
-TOKEN = os.getenv("DISCORD_TOKEN", "")
-if not TOKEN:
-    raise RuntimeError("ENV DISCORD_TOKEN ไม่ได้ตั้งค่า")
+TOKEN = os.getenv("DISCORD_TOKEN", "")   # ตรวจตอนรันบอทจริง (simulate.py ไม่ต้องใช้)
+
+# log: ระดับขั้นต่ำ (DEBUG/INFO/WARNING/ERROR) และรูปแบบ text หรือ json (บรรทัดละ 1 object)
+LOG_LEVEL     = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT    = os.getenv("LOG_FORMAT", "text")
+LOG_DEDUP_SEC = float(os.getenv("LOG_DEDUP_SEC", "60"))   # ข้อความเดิมซ้ำภายในช่วงนี้ → พิมพ์ครั้งเดียว (0 = ปิด)
+LOG_QUEUE_MAX = 10000                                     # stdout ค้างจนคิวเต็ม → ทิ้ง (นับใน l9_log_dropped_total)
 
 # ========= ตั้งค่า Google Sheet =========
 SPREADSHEET_ID   = os.getenv("SPREADSHEET_ID", "1Ps_sLYIA3j9WWyrP7kLN4g-kPaN_rPBTqSmsxzxzarQ")  # <- ไอดีไฟล์ใหม่ของคุณ
@@ -33,6 +42,29 @@ PRIMARY_WS   = "boss_timer"
 FALLBACK_WS  = "Boss Tracker"
 READ_RANGE   = "A1:K2000"   # A..K = 11 คอลัมน์ตามชีต
 
+# งาน gspread เป็น blocking → รันใน thread pool แยก ไม่ให้ event loop ค้าง (= จำนวนชีตที่อ่านพร้อมกันได้)
+SHEET_IO_WORKERS     = int(os.getenv("SHEET_IO_WORKERS", "2"))
+SHEET_RETRY_BASE_SEC = 2     # backoff 2, 4, 8 ... วินาที (await ไม่บล็อก heartbeat)
+
+# circuit breaker ของ Sheets: ล้มเหลวติดกันครบ → หยุดเรียกชีตชั่วคราว ใช้ข้อมูลล่าสุดที่ดีไปก่อน
+SHEET_BREAKER_FAILURES = 3      # ล้มเหลวติดกันเท่านี้ (หรือโดน quota 429 ครั้งเดียว) → เปิด breaker
+SHEET_BREAKER_BASE_SEC = 60     # พักรอบแรก แล้วเพิ่มเท่าตัวทุกครั้งที่ลองใหม่แล้วยังล้ม (มี jitter)
+SHEET_BREAKER_MAX_SEC  = 900
+
+# ไทม์ไลน์รอบเกิดล่วงหน้า (วัน)
+TIMELINE_HORIZON_DAYS = int(os.getenv("TIMELINE_HORIZON_DAYS", "7"))
+TIMELINE_EXTEND_STEP  = timedelta(hours=1)   # ต่อไทม์ไลน์ทีละก้อน ไม่ต้องสร้างทุกครั้งที่เรียก advance
+
+# รับการแก้ชีตแบบ push จาก Apps Script (onEdit → POST /sheet-webhook)
+SHEET_WEBHOOK_SECRET = os.getenv("SHEET_WEBHOOK_SECRET", "")          # ว่าง = ปิด webhook โพลชีตทุกรอบเหมือนเดิม
+SHEET_RECONCILE_SEC  = int(os.getenv("SHEET_RECONCILE_SEC", "900"))   # เปิด webhook แล้ว อ่านชีตเต็มเพื่อกระทบยอดทุกเท่านี้
+WEBHOOK_MAX_SKEW_SEC = 300                                             # ts ใน payload ต่างจากเวลาจริงเกินนี้ → ปฏิเสธ (กัน replay)
+SHEET_DIFF_MAX_ROWS  = 200    # แถวเปลี่ยนเกินนี้ในรอบเดียว → สร้างใหม่ทั้งชีตใน executor แทนแก้ทีละแถวบน loop
+
+# !kill: อัปเดตไทม์ไลน์ทันที แล้วเขียนเวลาตายกลับชีตแบบ write-behind
+KILL_FLUSH_SEC       = float(os.getenv("KILL_FLUSH_SEC", "5"))   # รวม !kill ที่เข้ามาในช่วงนี้เป็น batch_update เดียวต่อไฟล์
+KILL_WRITE_MAX_TRIES = 5      # เขียนไม่สำเร็จติดกันเท่านี้ → ทิ้ง แล้วอ่านชีตใหม่ให้ไทม์ไลน์ตรงกับชีต
+
 # ห้องปลายทาง
 CHANNEL_ID_DEFAULT = 1404159701750382673
 SHEET_CHANNEL_MAP = {
@@ -45,8 +77,49 @@ SHEET_CHANNEL_MAP = {
 ROLE_ID_1 = 1402706627886321724
 ROLE_ID_2 = 1402025046850932856
 
+# หลายกิลด์/หลายชีตในโปรเซสเดียว: TENANTS_FILE = JSON รายการ tenant (ดู load_tenants)
+# ไม่ตั้ง → tenant เดียวชื่อ DEFAULT_TENANT จากค่าด้านบน (SPREADSHEET_ID / ห้อง / ยศ) เหมือนเดิม
+TENANTS_FILE   = os.getenv("TENANTS_FILE", "")
+DEFAULT_TENANT = "default"
+SHEET_READ_QUOTA_PER_MIN = int(os.getenv("SHEET_READ_QUOTA_PER_MIN", "60"))   # โควตาอ่าน Sheets ต่อนาที รวมทุก tenant (ต่อ service account)
+SHEET_CALLS_PER_POLL     = 2     # probe modifiedTime + batch read ต่อการอ่าน 1 ครั้ง
+
 ALERT_THRESHOLDS_MIN = [60, 30, 5]   # เวิลด์บอสจะใช้แค่ T-5 แบบรวมบรรทัด
-ALERT_WINDOW_SEC = 75
+ALERT_WINDOW_SEC = 75                # ยอมส่งช้าได้ไม่เกินนี้ (เช่น บอทเพิ่งรีสตาร์ท) เกินกว่านี้ถือว่าพลาดรอบ
+SCHED_MAX_SLEEP_SEC = 300            # scheduler ตื่นมาเช็กอย่างน้อยทุก 5 นาที กันนาฬิกาเพี้ยน
+ALERT_LOOKAHEAD = timedelta(minutes=max(ALERT_THRESHOLDS_MIN) + 15)   # วางคิวล่วงหน้าจากไทม์ไลน์
+ALERT_LEDGER_DB = os.getenv("ALERT_LEDGER_DB", "alert_ledger.sqlite3")   # กันแจ้งซ้ำข้ามรีสตาร์ท
+SHEET_SNAPSHOT_PATH = os.getenv("SHEET_SNAPSHOT_PATH", "sheet_snapshot.json")   # แถวล่าสุดที่ดี ใช้ warm start (ว่าง = ปิด)
+
+# หลาย replica (rolling deploy): ตัวที่ถือ lease เท่านั้นที่ส่งแจ้งเตือน/อ่านชีต/รับคำสั่ง ตัวอื่นเป็น standby อุ่นไว้
+# LEASE_DB, ALERT_LEDGER_DB และ SHEET_SNAPSHOT_PATH ต้องอยู่บน volume ที่ทุก replica เห็น (ว่าง = ปิด ทำงานตัวเดียว)
+LEASE_DB        = os.getenv("LEASE_DB", ALERT_LEDGER_DB)
+LEASE_TTL_SEC   = int(os.getenv("LEASE_TTL_SEC", "15"))   # ผู้ถือหายไป (crash) → อีกตัวรับช่วงหลังเท่านี้
+LEASE_RENEW_SEC = 3                                       # ต่อ lease / standby ลองยึดทุกเท่านี้ (ปล่อยตอนปิด → รับช่วงใน ~3 วินาที)
+
+# ส่งข้อความ
+DISPATCH_COALESCE_SEC = float(os.getenv("DISPATCH_COALESCE_SEC", "3"))   # รวมแจ้งเตือนที่ถึงเวลาใกล้กันเป็นข้อความเดียว
+CHANNEL_SEND_RATE     = (5, 5.0)     # Discord: ส่งได้ราว 5 ข้อความ / 5 วินาที ต่อห้อง
+EMBED_MAX_FIELDS      = 25
+MESSAGE_MAX_EMBEDS    = 10
+MESSAGE_MAX_CHARS     = 6000         # รวมทุก embed ในข้อความเดียว
+
+# ติดตามบอสรายคน (!sub) → DM แยกคิวจากแจ้งเตือนห้อง
+SUB_DEFAULT_LEAD_MIN = 10
+SUB_MAX_LEAD_MIN     = max(ALERT_THRESHOLDS_MIN)   # ไม่เกินช่วงที่ scheduler วางคิวล่วงหน้า (ALERT_LOOKAHEAD)
+SUB_MAX_PER_USER     = 25
+SUB_MAX_LEVEL        = 999
+DM_CONCURRENCY       = int(os.getenv("DM_CONCURRENCY", "4"))
+DM_SEND_RATE         = (int(os.getenv("DM_PER_SEC", "20")), 1.0)   # DM รวมทุกคน/วินาที เหลือโควตา global ของ Discord ให้ห้อง
+DM_QUEUE_MAX         = 20000                                        # คนที่รอ DM พร้อมกันเกินนี้ → ทิ้ง (นับใน l9_dm_dropped_total)
+
+# บอร์ดตาราง (ข้อความปักหมุดที่แก้ไขในที่เดิม)
+BOARD_ENABLED  = os.getenv("BOARD_ENABLED", "0") == "1"   # เปิดบอร์ดทุกห้องใน SHEET_CHANNEL_MAP อัตโนมัติ
+BOARD_EDIT_SEC = 30                                        # แก้บอร์ดแต่ละห้องได้ไม่ถี่กว่านี้
+
+# ฟีดตาราง /schedule.json และ /schedule.ics (สร้างจากไทม์ไลน์ในหน่วยความจำ ไม่ยิงชีต)
+SCHEDULE_FEED_DAYS    = min(int(os.getenv("SCHEDULE_FEED_DAYS", "3")), TIMELINE_HORIZON_DAYS)
+SCHEDULE_FEED_MAX_AGE = 60    # Cache-Control max-age (วินาที) ≈ รอบ check_alerts
 
 # UI
 DEFAULT_EMBED_COLOR = 0xffcc00
@@ -61,40 +134,193 @@ def normalize_name(n: str) -> str:
     n = (n or "").strip()
     return NAME_ALIASES.get(n, n)
 
+@functools.lru_cache(maxsize=4096)
 def is_world_boss(name: str) -> bool:
     return normalize_name(name.replace(" (พรุ่งนี้)", "").strip()) in WORLD_BOSSES
 
 tz = pytz.timezone("Asia/Bangkok")
 
+# ========= Clock =========
+class Clock:
+    """
+    เวลาปัจจุบันของทั้งบอท (ใช้แทน datetime.now/time.time ตรง ๆ)
+    set(ts) ตรึงเวลาให้ simulation เดินเวลาเองได้ — ปกติเป็นเวลาจริง
+    """
+
+    def __init__(self):
+        self._fixed = None
+
+    def time(self) -> float:
+        return time.time() if self._fixed is None else self._fixed
+
+    def now(self) -> datetime:
+        return datetime.now(tz) if self._fixed is None else datetime.fromtimestamp(self._fixed, tz)
+
+    def set(self, ts: Optional[float]):
+        self._fixed = ts
+
+clock = Clock()
+
 # === Mini Web for health/status on Koyeb ===
 STARTED_AT = datetime.now(tz)
+HEALTH_MAX_TICK_AGE_SEC = 300    # check_alerts ไม่สำเร็จนานเกินนี้ → /healthz ตอบ 503
+
+# เวลาที่ทำสำเร็จล่าสุด (epoch) — รายงานใน /healthz (อ่านชีตสำเร็จล่าสุดเก็บแยกต่อ tenant)
+HEALTH = {"last_tick_ok": None, "last_error": None}
+
+# ========= Metrics (Prometheus text format) =========
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+class Histogram:
+    __slots__ = ("help", "buckets", "counts", "sum", "count")
+
+    def __init__(self, help_text: str, buckets=LATENCY_BUCKETS):
+        self.help = help_text
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, v: float):
+        self.sum += v
+        self.count += 1
+        i = bisect.bisect_left(self.buckets, v)
+        if i < len(self.counts):
+            self.counts[i] += 1
+
+class Metrics:
+    """ตัวนับ/histogram แบบเบา ๆ สำหรับ /metrics — observe ได้จากทุกเธรด"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}   # name → [help, value]
+        self._hists = {}      # name → Histogram
+        self._gauges = {}     # name → (help, fn)
+
+    def counter(self, name: str, help_text: str):
+        self._counters.setdefault(name, [help_text, 0])
+
+    def histogram(self, name: str, help_text: str, buckets=LATENCY_BUCKETS):
+        self._hists.setdefault(name, Histogram(help_text, buckets))
+
+    def gauge(self, name: str, help_text: str, fn):
+        self._gauges[name] = (help_text, fn)
+
+    def inc(self, name: str, n: int = 1):
+        with self._lock:
+            self._counters[name][1] += n
+
+    def observe(self, name: str, v: float):
+        with self._lock:
+            self._hists[name].observe(v)
+
+    @contextlib.contextmanager
+    def timer(self, name: str):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - t0)
+
+    def render(self) -> str:
+        out = []
+        with self._lock:
+            for name, (help_text, v) in self._counters.items():
+                out += [f"# HELP {name} {help_text}", f"# TYPE {name} counter", f"{name} {v}"]
+            for name, h in self._hists.items():
+                out += [f"# HELP {name} {h.help}", f"# TYPE {name} histogram"]
+                acc = 0
+                for le, c in zip(h.buckets, h.counts):
+                    acc += c
+                    out.append(f'{name}_bucket{{le="{le}"}} {acc}')
+                out += [f'{name}_bucket{{le="+Inf"}} {h.count}', f"{name}_sum {h.sum:.6f}", f"{name}_count {h.count}"]
+        for name, (help_text, fn) in self._gauges.items():
+            try:
+                v = fn()
+            except Exception:
+                continue
+            out += [f"# HELP {name} {help_text}", f"# TYPE {name} gauge", f"{name} {v}"]
+        return "\n".join(out) + "\n"
+
+METRICS = Metrics()
+METRICS.histogram("l9_sheet_auth_seconds", "Sheets authorize/token refresh latency")
+METRICS.histogram("l9_sheet_open_seconds", "open_by_key latency")
+METRICS.histogram("l9_sheet_read_seconds", "Sheets values read latency")
+METRICS.histogram("l9_sheet_probe_seconds", "Drive modifiedTime probe latency")
+METRICS.histogram("l9_parse_seconds", "Row hashing + parsing of changed rows per read")
+METRICS.counter("l9_rows_parsed_total", "Sheet rows parsed")
+METRICS.histogram("l9_tick_seconds", "check_alerts tick duration")
+METRICS.histogram("l9_loop_lag_seconds", "Event loop scheduling lag",
+                  buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0))
+METRICS.histogram("l9_discord_send_seconds", "Discord send/edit latency")
+METRICS.histogram("l9_dm_send_seconds", "Discord DM send latency")
+METRICS.counter("l9_alerts_deduped_total", "Alerts skipped because the ledger already had them")
+METRICS.counter("l9_sheet_breaker_trips_total", "Times the Sheets circuit breaker opened")
+METRICS.histogram("l9_sheet_write_seconds", "values_batch_update latency (!kill write-behind)")
+METRICS.histogram("l9_feed_build_seconds", "Schedule feed (JSON + iCalendar) serialization")
 
 async def handle_root(request):
     return web.Response(text="L9 Boss Timer Bot is running.")
 
+def _age(ts: Optional[float]) -> Optional[int]:
+    return None if ts is None else int(clock.time() - ts)
+
 async def handle_healthz(request):
-    now = datetime.now(tz)
+    now = clock.now()
+    uptime = int((now - STARTED_AT).total_seconds())
+    tick_age = _age(HEALTH["last_tick_ok"])
+    ok = (tick_age if tick_age is not None else uptime) <= HEALTH_MAX_TICK_AGE_SEC
     payload = {
-        "ok": True,
+        "ok": ok,
         "now": now.strftime("%Y-%m-%d %H:%M:%S %Z"),
-        "uptime_sec": int((now - STARTED_AT).total_seconds()),
-        "spreadsheet_id": os.getenv("SPREADSHEET_ID", ""),
-        "worksheet": PRIMARY_WS,
+        "uptime_sec": uptime,
+        "last_tick_ok_age_sec": tick_age,
+        "last_error": HEALTH["last_error"],
+        "lease": lease.status(),
+        "tenants": {t.key: t.health() for t in TENANTS},
+        "sheet_quota": {"tokens": int(sheet_quota.tokens), "per_min": SHEET_READ_QUOTA_PER_MIN,
+                        "hold_sec": sheet_quota.hold_in()},
+        "sheet_stats": dict(SHEET_STATS),
     }
-    return web.json_response(payload)
-
-async def start_http_server():
+    return web.json_response(payload, status=200 if ok else 503)
+
+async def handle_metrics(request):
+    lines = [METRICS.render()]
+    for prefix, stats in (("l9_sheet", SHEET_STATS), ("l9_dispatch", DISPATCH_STATS), ("l9_webhook", WEBHOOK_STATS),
+                          ("l9_feed", FEED_STATS), ("l9_kill", KILL_STATS), ("l9_dm", DM_STATS),
+                          ("l9_lease", LEASE_STATS), ("l9_log", LOG_STATS)):
+        for k, v in stats.items():
+            lines.append(f"# TYPE {prefix}_{k}_total counter\n{prefix}_{k}_total {v}\n")
+    return web.Response(text="".join(lines), content_type="text/plain", charset="utf-8")
+
+def make_http_app() -> web.Application:
     app = web.Application()
     app.router.add_get("/", handle_root)
     app.router.add_get("/healthz", handle_healthz)
+    app.router.add_get("/metrics", handle_metrics)
+    app.router.add_post("/sheet-webhook", handle_sheet_webhook)
+    app.router.add_get("/schedule.json", handle_schedule_json)
+    app.router.add_get("/schedule.ics", handle_schedule_ics)
+    return app
+
+async def start_http_server():
+    app = make_http_app()
     # Koyeb จะกำหนด PORT ให้ใน ENV เสมอ
     port = int(os.getenv("PORT", "8080"))
     runner = web.AppRunner(app)
     await runner.setup()
     site = web.TCPSite(runner, "0.0.0.0", port)
     await site.start()
+    return runner
 
+LOOP_LAG_INTERVAL_SEC = 1.0
 
+async def monitor_loop_lag():
+    """วัดว่า event loop ตื่นช้ากว่ากำหนดเท่าไร (บอกว่ามีงาน blocking ค้าง loop หรือไม่)"""
+    while True:
+        t0 = time.perf_counter()
+        await asyncio.sleep(LOOP_LAG_INTERVAL_SEC)
+        METRICS.observe("l9_loop_lag_seconds", max(0.0, time.perf_counter() - t0 - LOOP_LAG_INTERVAL_SEC))
 
 
 
@@ -104,25 +330,296 @@ intents.message_content = True
 allowed_mentions = discord.AllowedMentions(roles=True)
 bot = commands.Bot(command_prefix=app_prefix, intents=intents, allowed_mentions=allowed_mentions)
 
-def log(msg: str):
-    print(datetime.now(tz).strftime("[%H:%M:%S]"), msg)
+# ========= Logging =========
+LOG_TAG_LEVELS = {"DEBUG": logging.DEBUG, "WARN": logging.WARNING, "ERROR": logging.ERROR}   # แท็กอื่น ([AUTO] [SCHED] ...) = INFO
+LOG_DEDUP_MAX  = 4096    # ข้อความต่างกันที่จำไว้กันซ้ำ
+LOG_STATS = {"suppressed": 0, "dropped": 0}
+LOG_STATS_LOCK = threading.Lock()   # นับจากทั้ง event loop และ thread ของ sheet_executor
+
+def log_stat(key: str):
+    with LOG_STATS_LOCK:
+        LOG_STATS[key] += 1
+
+TICK_ID  = contextvars.ContextVar("tick_id", default=None)   # รอบ check_alerts ที่กำลังทำ (ติดไปกับ log ทุกบรรทัดในรอบ)
+TICK_SEQ = itertools.count(1)
+
+logger = logging.getLogger("l9")
+log_min_level = logging.INFO   # สำเนาของระดับ logger (เทียบ int ตรง ๆ ถูกกว่า isEnabledFor บน hot path)
+
+class LogDedupFilter(logging.Filter):
+    """
+    ข้อความเดียวกันเป๊ะภายใน window วินาที (ตาม clock) ผ่านแค่ครั้งแรก
+    ครั้งแรกหลังหมด window แนบจำนวนที่ข้ามไป (record.repeated) — รันในเธรดที่เรียก log ก่อนเข้าคิว
+    """
+
+    def __init__(self, window: float):
+        super().__init__()
+        self.window = window
+        self._seen = {}   # msg → [ts ที่พิมพ์ล่าสุด, จำนวนที่ข้าม]
+        self._lock = threading.Lock()
+
+    def filter(self, record) -> bool:
+        if self.window <= 0:
+            return True
+        now = getattr(record, "ts", record.created)
+        msg = record.msg
+        with self._lock:
+            seen = self._seen.get(msg)
+            if seen is not None and now - seen[0] < self.window:
+                seen[1] += 1
+                log_stat("suppressed")
+                return False
+            if seen is not None and seen[1]:
+                record.repeated = seen[1]
+            self._seen[msg] = [now, 0]
+            if len(self._seen) > LOG_DEDUP_MAX:
+                self._seen = {k: v for k, v in self._seen.items() if now - v[0] < self.window}
+                if len(self._seen) > LOG_DEDUP_MAX:
+                    self._seen.clear()
+        return True
+
+class LogQueueHandler(QueueHandler):
+    """ใส่ record ลงคิวเฉย ๆ — จัดเวลา/รูปแบบ/JSON ทำใน thread ที่เขียน stdout ไม่ใช่บน event loop"""
+
+    def prepare(self, record):
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            log_stat("dropped")
+
+class TextLogFormatter(logging.Formatter):
+    def format(self, record) -> str:
+        line = datetime.fromtimestamp(getattr(record, "ts", record.created), tz).strftime("[%H:%M:%S] ") + record.getMessage()
+        fields = getattr(record, "fields", None)
+        if fields:
+            line += " " + " ".join(f"{k}={v}" for k, v in fields.items())
+        if getattr(record, "repeated", 0):
+            line += f" (ซ้ำอีก {record.repeated} ครั้งก่อนหน้านี้)"
+        return line
+
+class JsonLogFormatter(logging.Formatter):
+    def format(self, record) -> str:
+        doc = {
+            "ts": datetime.fromtimestamp(getattr(record, "ts", record.created), tz).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "tag": getattr(record, "tag", ""),
+            "msg": getattr(record, "body", None) or record.getMessage(),
+        }
+        if getattr(record, "tick", None) is not None:
+            doc["tick"] = record.tick
+        if getattr(record, "repeated", 0):
+            doc["repeated"] = record.repeated
+        doc.update(getattr(record, "fields", None) or {})
+        return json.dumps(doc, ensure_ascii=False, default=str)
+
+def setup_logging(level: str = LOG_LEVEL, fmt: str = LOG_FORMAT) -> QueueListener:
+    """
+    logger "l9" → คิว (ไม่บล็อก) → thread เขียน stdout — เรียกจาก main ตอนเริ่มบอท คืน listener ที่เริ่มแล้ว
+    ผู้เรียก stop() ตอนปิดให้ log ที่ค้างคิวออกครบ (import เฉย ๆ ไม่เริ่ม thread: WARN/ERROR ออก stderr ตามค่าเริ่มของ logging)
+    """
+    global log_min_level
+    out = logging.StreamHandler(sys.stdout)
+    out.setFormatter(JsonLogFormatter() if fmt == "json" else TextLogFormatter())
+    q = queue.Queue(LOG_QUEUE_MAX)
+    logger.handlers[:] = [LogQueueHandler(q)]
+    logger.filters[:] = [LogDedupFilter(LOG_DEDUP_SEC)]
+    logger.setLevel(level if isinstance(logging.getLevelName(level), int) else "INFO")
+    log_min_level = logger.level
+    logger.propagate = False
+    listener = QueueListener(q, out)
+    listener.start()
+    return listener
+
+def debug_enabled() -> bool:
+    """ใช้คุมจุด hot path ที่ต้องคำนวณก่อนจะได้ข้อความ [DEBUG]"""
+    return log_min_level <= logging.DEBUG
+
+def log(msg: str, **fields):
+    """
+    แท็กหน้าข้อความเป็นระดับ: [DEBUG] → DEBUG, [WARN] → WARNING, [ERROR] → ERROR, อื่น ๆ → INFO
+    fields → คีย์เพิ่ม (JSON) / key=value ท้ายบรรทัด (text) — ระดับที่ปิดอยู่คืนทันที
+    """
+    end = msg.find("]") if msg[:1] == "[" else -1
+    tag = msg[1:end] if end > 0 else ""
+    level = LOG_TAG_LEVELS.get(tag, logging.INFO)
+    if level < log_min_level:
+        return
+    logger.log(level, msg, extra={"ts": clock.time(), "tag": tag, "body": msg[end + 1:].lstrip(),
+                                  "tick": TICK_ID.get(), "fields": fields})
 
 # ========= Google Sheets helper =========
 SCOPES = ["https://www.googleapis.com/auth/spreadsheets","https://www.googleapis.com/auth/drive"]
 
-def gspread_client():
-    # เขียนไฟล์ credentials.json จาก ENV ถ้ามี
+TOKEN_REFRESH_MARGIN_SEC = 300   # ต่ออายุ access token ล่วงหน้าก่อนหมดอายุ 5 นาที
+
+# ตัวนับตั้งแต่บอทเริ่ม (ดูได้ที่ /healthz)
+SHEET_STATS = {"auth": 0, "open": 0, "token_refresh": 0, "api_calls": 0, "probe_hits": 0, "parse_runs": 0,
+               "quota_deferred": 0}
+
+def load_credentials():
+    """โหลด service account จาก ENV ในหน่วยความจำ (ไม่เขียนไฟล์) — ไม่มี ENV ค่อยอ่าน credentials.json"""
     creds_json = os.getenv("GOOGLE_CREDENTIALS_JSON")
     if creds_json:
-        with open("credentials.json", "w", encoding="utf-8") as f:
-            f.write(creds_json)
+        return ServiceAccountCredentials.from_json_keyfile_dict(json.loads(creds_json), SCOPES)
+    return ServiceAccountCredentials.from_json_keyfile_name("credentials.json", SCOPES)
+
+class SheetSession:
+    """ถือ gspread client (auth + connection pool ชุดเดียวทั้งโปรเซส) + Spreadsheet ของทุก tenant ไว้ใช้ซ้ำ"""
+
+    def __init__(self):
+        self._lock = threading.Lock()   # ถูกเรียกจากหลายเธรดใน sheet_executor
+        self._client = None
+        self._creds = None
+        self._ss = {}   # spreadsheet_id → (Spreadsheet, how)
+
+    def client(self):
+        with self._lock:
+            if self._client is None:
+                with METRICS.timer("l9_sheet_auth_seconds"):
+                    self._creds = load_credentials()
+                    self._client = gspread.authorize(self._creds)
+                # connection pool ให้พอกับจำนวน worker
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(4, SHEET_IO_WORKERS))
+                self._client.http_client.session.mount("https://", adapter)
+                SHEET_STATS["auth"] += 1
+            self._refresh_token_if_needed()
+            return self._client, self._creds
+
+    def _refresh_token_if_needed(self):
+        http = self._client.http_client
+        auth = getattr(http, "auth", None)
+        if auth is None:
+            return
+        expiry = getattr(auth, "expiry", None)   # naive UTC (google-auth)
+        if not auth.token or (expiry and (expiry - datetime.utcnow()).total_seconds() < TOKEN_REFRESH_MARGIN_SEC):
+            with METRICS.timer("l9_sheet_auth_seconds"):
+                http.login()
+            SHEET_STATS["token_refresh"] += 1
+
+    def spreadsheet(self, ss_id: str = SPREADSHEET_ID):
+        client, _ = self.client()
+        with self._lock:
+            hit = self._ss.get(ss_id)
+            if hit is None:
+                with METRICS.timer("l9_sheet_open_seconds"):
+                    hit = self._ss[ss_id] = open_spreadsheet(client, ss_id)
+                SHEET_STATS["open"] += 1
+            return hit
+
+    def reset(self, ss_id: Optional[str] = None):
+        """
+        ทิ้ง Spreadsheet ของไฟล์นี้ที่ cache ไว้ (ครั้งหน้าจะ open ใหม่)
+        ไม่ระบุไฟล์ หรือไม่เหลือไฟล์ที่เปิดอยู่แล้ว → ทิ้ง client ด้วย (auth ใหม่)
+        """
+        with self._lock:
+            self._ss.pop(ss_id, None)
+            if ss_id is None or not self._ss:
+                self._client = self._creds = None
+                self._ss.clear()
+
+sheet_session = SheetSession()
+
+def _is_quota_error(e: Exception) -> bool:
+    resp = getattr(e, "response", None)
+    return getattr(resp, "status_code", None) == 429 or "RESOURCE_EXHAUSTED" in str(e)
+
+class CircuitBreaker:
+    """
+    closed → ล้มเหลวติดกันครบ (หรือโดน quota) → open: ไม่เรียกชีตจนพ้นเวลาพัก
+    เวลาพักเพิ่มแบบ exponential + jitter → half_open: ให้ลอง 1 ครั้ง สำเร็จ = closed / ล้ม = open (นานขึ้น)
+    ใช้จาก event loop เท่านั้น
+    """
+
+    def __init__(self, failures: int, base_sec: float, max_sec: float, ss_id: Optional[str] = None):
+        self.threshold = failures
+        self.base_sec = base_sec
+        self.max_sec = max_sec
+        self.state = "closed"
+        self.failures = 0      # ล้มเหลวติดกัน
+        self.trips = 0         # เปิดติดกันกี่รอบแล้ว (ใช้คำนวณเวลาพัก)
+        self.open_until = 0.0
+        self.ss_id = ss_id     # ไฟล์ที่ breaker นี้คุม (reset เฉพาะไฟล์นี้ตอนเปิด)
+        self.tag = ""          # "[tenant] " นำหน้า log เมื่อมีหลาย tenant
+
+    def allow(self) -> bool:
+        if self.state == "open":
+            if clock.time() < self.open_until:
+                return False
+            self.state = "half_open"
+            log(f"[SHEET] {self.tag}breaker half-open — ลองอ่านชีต 1 ครั้ง")
+        return True
+
+    def success(self):
+        if self.state != "closed":
+            log(f"[SHEET] {self.tag}breaker ปิด — ชีตกลับมาใช้ได้แล้ว")
+        self.state = "closed"
+        self.failures = self.trips = 0
+
+    def failure(self, e: Exception):
+        self.failures += 1
+        if self.state == "half_open" or self.failures >= self.threshold or _is_quota_error(e):
+            self._trip()
+
+    def _trip(self):
+        cap = min(self.max_sec, self.base_sec * (2 ** self.trips))
+        delay = random.uniform(cap / 2, cap)   # jitter กันหลายโปรเซสยิงพร้อมกัน
+        self.trips += 1
+        self.state = "open"
+        self.open_until = clock.time() + delay
+        METRICS.inc("l9_sheet_breaker_trips_total")
+        log(f"[SHEET] {self.tag}breaker เปิด {delay:.0f} วินาที (ล้มเหลวติดกัน {self.failures} ครั้ง) — ใช้ข้อมูลชีตล่าสุดไปก่อน")
+        sheet_session.reset(self.ss_id)   # รอบถัดไป open ใหม่ (ไม่เหลือไฟล์ไหนเปิด → auth ใหม่ด้วย) เผื่อ connection เสีย
+
+    def retry_in(self) -> Optional[int]:
+        return max(0, int(self.open_until - clock.time())) if self.state == "open" else None
+
+class QuotaBudget:
+    """
+    token bucket ของโควตาอ่าน Sheets ที่ทุก tenant ใช้ร่วมกัน (โควตาคิดต่อ service account ไม่ใช่ต่อไฟล์)
+    take() ไม่รอ: โควตาไม่พอ → tenant นั้นใช้ข้อมูลเดิมไปก่อน แล้วได้คิวก่อนในรอบถัดไป
+    โดน 429 → hold() พักทุก tenant พร้อมกัน ใช้จาก event loop เท่านั้น
+    """
+
+    def __init__(self, per_min: int):
+        self.capacity = float(per_min)
+        self.rate = per_min / 60.0
+        self.tokens = self.capacity
+        self.stamp = None
+        self.hold_until = 0.0
+
+    def _refill(self, now: float):
+        if self.stamp is not None:
+            self.tokens = min(self.capacity, self.tokens + max(0.0, now - self.stamp) * self.rate)
+        self.stamp = now
+
+    def take(self, n: float = 1) -> bool:
+        now = clock.time()
+        self._refill(now)
+        if now < self.hold_until or self.tokens < n:
+            SHEET_STATS["quota_deferred"] += 1
+            return False
+        self.tokens -= n
+        return True
+
+    def hold(self, sec: float):
+        self.hold_until = max(self.hold_until, clock.time() + sec)
+        self.tokens = 0.0
+
+    def hold_in(self) -> Optional[int]:
+        left = self.hold_until - clock.time()
+        return int(left) if left > 0 else None
+
+sheet_quota = QuotaBudget(SHEET_READ_QUOTA_PER_MIN)
 
-    creds = ServiceAccountCredentials.from_json_keyfile_name("credentials.json", SCOPES)
-    return gspread.authorize(creds), creds
+def gspread_client():
+    return sheet_session.client()
 
 
-def open_spreadsheet(client):
-    if SPREADSHEET_ID:   return client.open_by_key(SPREADSHEET_ID), "ID"
+def open_spreadsheet(client, ss_id: str = SPREADSHEET_ID):
+    if ss_id:            return client.open_by_key(ss_id), "ID"
     if SPREADSHEET_URL:  return client.open_by_url(SPREADSHEET_URL), "URL"
     if SPREADSHEET_NAME: return client.open(SPREADSHEET_NAME), "NAME"
     raise RuntimeError("ยังไม่ได้กำหนด SPREADSHEET_ID / URL / NAME")
@@ -131,6 +628,15 @@ def values_get_ws(ss, ws_title, a1_range=READ_RANGE):
     rng = f"'{ws_title}'!{a1_range}"
     return ss.values_get(rng).get("values", [])
 
+# ========= Async sheet access =========
+sheet_executor = ThreadPoolExecutor(max_workers=SHEET_IO_WORKERS, thread_name_prefix="sheet-io")
+
+async def run_blocking(fn, *args, **kwargs):
+    """รันฟังก์ชัน blocking (gspread/parse) ใน sheet_executor แล้ว await ผลลัพธ์"""
+    loop = asyncio.get_running_loop()
+    ctx = contextvars.copy_context()   # log ใน thread ยังติด tick id ของรอบที่สั่ง
+    return await loop.run_in_executor(sheet_executor, functools.partial(ctx.run, fn, *args, **kwargs))
+
 # ========= Parsing / utils =========
 BAD_TOKENS = {"", "-", "#VALUE!", "NA", "N/A", "None", "null", "NULL"}
 TIME_RE   = re.compile(r"^\s*(\d{1,2})[:\.](\d{2})(?::(\d{2}))?\s*$")   # HH:MM[:SS]
@@ -154,50 +660,98 @@ def parse_time_of_day(raw) -> Optional[Tuple[int,int,int]]:
     if not (0 <= hh <= 23 and 0 <= mm <= 59 and 0 <= ss <= 59): return None
     return hh, mm, ss
 
+SERIAL_BASE = datetime(1899, 12, 30)   # วันที่ 0 ของ serial Google Sheets
+
+_DAY_TZINFO = {}   # date → tzinfo ของวันนั้น (เฉพาะวันที่ offset ไม่เปลี่ยนทั้งวัน)
+
+def localize(naive: datetime) -> datetime:
+    """tz.localize แบบ cache tzinfo ต่อวัน (pytz localize ช้า และถูกเรียกทุกแถว)"""
+    d = naive.date()
+    tzi = _DAY_TZINFO.get(d)
+    if tzi is None:
+        aware = tz.localize(naive)
+        first = tz.localize(datetime(d.year, d.month, d.day)).tzinfo
+        last = tz.localize(datetime(d.year, d.month, d.day, 23, 59, 59)).tzinfo
+        if first is last:
+            _DAY_TZINFO[d] = first
+        return aware
+    return naive.replace(tzinfo=tzi)
+
+class FastFormats:
+    """
+    แทนลูป strptime: regex คอมไพล์ไว้ต่อฟอร์แม็ต และจำฟอร์แม็ตที่ match ล่าสุด (ต่อคอลัมน์)
+    ไว้ลองก่อน — แถวในคอลัมน์เดียวกันมักใช้ฟอร์แม็ตเดียวกันทั้งหมด
+    """
+
+    def __init__(self, *formats):
+        self._formats = [(re.compile(rx), order) for rx, order in formats]
+        self._last = 0
+
+    def match(self, s: str) -> Optional[Tuple[int, ...]]:
+        """คืนตัวเลข (ตามลำดับ Y, m, d, H, M, S) หรือ None"""
+        n = len(self._formats)
+        for i in range(n):
+            j = (self._last + i) % n
+            rx, order = self._formats[j]
+            m = rx.match(s)
+            if m:
+                self._last = j
+                g = m.groups()
+                return tuple(int(g[k]) if g[k] else 0 for k in order)
+        return None
+
+# เทียบเท่า "%Y-%m-%d", "%d/%m/%Y", "%d-%m-%Y", "%Y/%m/%d"
+DATE_FORMATS = FastFormats(
+    (r"^(\d{4})-(\d{1,2})-(\d{1,2})$", (0, 1, 2)),
+    (r"^(\d{1,2})/(\d{1,2})/(\d{4})$", (2, 1, 0)),
+    (r"^(\d{1,2})-(\d{1,2})-(\d{4})$", (2, 1, 0)),
+    (r"^(\d{4})/(\d{1,2})/(\d{1,2})$", (0, 1, 2)),
+)
+# เทียบเท่า "%d/%m/%Y[,] %H:%M[:%S]" และ "%Y-%m-%d %H:%M[:%S]"
+KILL_DT_FORMATS = FastFormats(
+    (r"^(\d{1,2})/(\d{1,2})/(\d{4}),?\s+(\d{1,2}):(\d{1,2})(?::(\d{1,2}))?$", (2, 1, 0, 3, 4, 5)),
+    (r"^(\d{4})-(\d{1,2})-(\d{1,2})\s+(\d{1,2}):(\d{1,2})(?::(\d{1,2}))?$", (0, 1, 2, 3, 4, 5)),
+)
+
 def parse_gsheet_date(raw) -> Optional[date]:
     if raw is None: return None
+    # serial number
+    if isinstance(raw, (int, float)):
+        try:
+            return (SERIAL_BASE + timedelta(days=float(raw))).date()
+        except (OverflowError, ValueError):
+            return None
     s = str(raw).strip()
     if s in BAD_TOKENS: return None
-    # serial number
-    try:
-        if isinstance(raw, (int, float)):
-            base = datetime(1899,12,30)
-            return (base + timedelta(days=float(raw))).date()
-    except Exception:
-        pass
     # text date
-    for fmt in ("%Y-%m-%d","%d/%m/%Y","%d-%m-%Y","%Y/%m/%d"):
-        try:
-            return datetime.strptime(s, fmt).date()
-        except Exception:
-            continue
-    return None
+    parts = DATE_FORMATS.match(s)
+    if not parts: return None
+    try:
+        return date(*parts)
+    except ValueError:
+        return None
 
 def parse_kill_dt(raw) -> Optional[datetime]:
     """แปลงค่า kill_dt จากชีตเป็น datetime (รองรับ serial และสตริงหลายฟอร์แม็ต)"""
     if raw is None:
         return None
+    # serial (Google Sheets)
+    if isinstance(raw, (int, float)):
+        try:
+            return localize(SERIAL_BASE + timedelta(days=float(raw)))
+        except (OverflowError, ValueError):
+            return None
     s = str(raw).strip()
     if s in BAD_TOKENS:
         return None
-    # serial (Google Sheets)
-    try:
-        if isinstance(raw, (int, float)):
-            base = datetime(1899, 12, 30)
-            return tz.localize(base + timedelta(days=float(raw)))
-    except Exception:
-        pass
     # หลายฟอร์แม็ตที่พบบ่อย
-    for fmt in (
-        "%d/%m/%Y, %H:%M:%S", "%d/%m/%Y %H:%M:%S",
-        "%d/%m/%Y, %H:%M",    "%d/%m/%Y %H:%M",
-        "%Y-%m-%d %H:%M:%S",  "%Y-%m-%d %H:%M",
-    ):
-        try:
-            return tz.localize(datetime.strptime(s, fmt))
-        except Exception:
-            continue
-    return None
+    parts = KILL_DT_FORMATS.match(s)
+    if not parts:
+        return None
+    try:
+        return localize(datetime(*parts))
+    except ValueError:
+        return None
 
 def near_same_minute(a: Optional[datetime], b: Optional[datetime], tol_min: int = 2) -> bool:
     """ตรวจว่าเวลาสองค่าใกล้กันภายใน tol_min นาที (ใช้จับกรณี next/date = เวลา kill)"""
@@ -208,7 +762,7 @@ def near_same_minute(a: Optional[datetime], b: Optional[datetime], tol_min: int
 def next_from_weekday_time(day_name: str, hh: int, mm: int, now_dt: datetime) -> datetime:
     wd = WEEKDAY_MAP.get(day_name)
     if wd is None: raise ValueError(f"ไม่รู้จักชื่อวัน: {day_name}")
-    base = tz.localize(datetime(now_dt.year, now_dt.month, now_dt.day, hh, mm))
+    base = localize(datetime(now_dt.year, now_dt.month, now_dt.day, hh, mm))
     cand = base + timedelta(days=(wd - now_dt.weekday()) % 7)
     if cand <= now_dt: cand += timedelta(days=7)
     return cand
@@ -224,20 +778,24 @@ def compute_next_interval(kill_dt: Optional[datetime], hours: Optional[int], now
         dt = kill_dt + timedelta(hours=hours * steps)
     return dt
 
-def parse_weekly_pairs(detail: str) -> List[Tuple[str,str]]:
-    """อ่านรูปแบบ 'อังคาร 10:30; พฤหัส 18:00' หรือ 'อาทิตย์ 16:00-19:00' (ใช้ต้นหน้าต่าง)"""
-    if not detail: return []
-    parts = [p.strip() for p in str(detail).split(";") if p.strip()]
+# ชื่อวันเรียงยาว→สั้น ให้ "พฤหัสบดี" ชนะ "พฤหัส"
+WEEKDAY_PREFIX_RE = re.compile("|".join(sorted(map(re.escape, WEEKDAY_MAP), key=len, reverse=True)))
+
+@functools.lru_cache(maxsize=1024)
+def parse_weekly_pairs(detail: str) -> Tuple[Tuple[str,str], ...]:
+    """อ่านรูปแบบ 'อังคาร 10:30; พฤหัส 18:00' หรือ 'อาทิตย์ 16:00-19:00' (ใช้ต้นหน้าต่าง) — cache ตามสตริง"""
+    if not detail: return ()
     out = []
-    for p in parts:
-        for day_th in WEEKDAY_MAP.keys():
-            if p.startswith(day_th):
-                rest = p[len(day_th):].strip()
-                m = WINDOW_RE.search(rest)
-                t = (m.group(1) if m else rest).strip()
-                out.append((day_th, t))
-                break
-    return out
+    for p in str(detail).split(";"):
+        p = p.strip()
+        m = WEEKDAY_PREFIX_RE.match(p)
+        if not m:
+            continue
+        day_th = m.group(0)
+        rest = p[m.end():].strip()
+        w = WINDOW_RE.search(rest)
+        out.append((day_th, (w.group(1) if w else rest).strip()))
+    return tuple(out)
 
 def _norm_header(s: str) -> str:
     # ล้างช่องว่างแปลก ๆ แล้วแปลงเป็นตัวพิมพ์เล็ก
@@ -291,329 +849,2726 @@ FIXED_WEEKLY_TIMES = {
 # เวิลด์บอส: ทุกวัน 10:00 และ 19:00
 WORLD_DAILY_TIMES = ["10:00", "19:00"]
 
-def fixed_bosses_next(now_dt: datetime) -> List[Tuple[str,str,datetime,str,str]]:
-    """คืนรายการ fixed + world รอบถัดไป"""
+HEADER_RANGE = "A1:Z1"
+NEEDED_COLS  = ("name", "spawn_type", "next_spawn", "date_spawn")
+
+# แท็บที่เลือกแล้ว + colmap ต่อ tenant: tenant key → {"title", "header", "col"}
+WS_CACHE = {}
+
+def _batch_values(ss, ranges: list) -> list:
+    """values_batch_get แล้วคืน values ของแต่ละช่วงตามลำดับ (ช่วงว่าง → [])"""
+    with METRICS.timer("l9_sheet_read_seconds"):
+        res = ss.values_batch_get(ranges)
+    SHEET_STATS["api_calls"] += 1
+    return [vr.get("values", []) for vr in res.get("valueRanges", [])]
+
+def choose_ws(ss, t: "Tenant") -> str:
+    """เลือกแท็บที่หัวคอลัมน์ครบของตารางใหม่เป็นอันดับแรก (cache ไว้ใน WS_CACHE)"""
+    hit = WS_CACHE.get(t.key)
+    if hit:
+        return hit["title"]
+
+    # สแกนครั้งเดียว: worksheets() 1 ครั้ง + หัวคอลัมน์ทุกแท็บใน batch เดียว
+    titles = [ws.title for ws in ss.worksheets()]
+    SHEET_STATS["api_calls"] += 1
+    try:
+        heads = _batch_values(ss, [f"'{title}'!{HEADER_RANGE}" for title in titles])
+    except Exception as e:
+        log(f"[WARN] {t.tag}อ่านหัวคอลัมน์ทุกแท็บไม่สำเร็จ: {e}")
+        heads = []
+
+    for title, head_vals in zip(titles, heads):
+        if not head_vals:
+            continue
+        col = build_col_idx(head_vals[0])
+        if all(col.get(k) is not None for k in NEEDED_COLS):
+            log(f"[AUTO] {t.tag}เลือกแท็บ '{title}' (หัวคอลัมน์ครบ)")
+            WS_CACHE[t.key] = {"title": title, "header": head_vals[0], "col": col}
+            return title
+
+    # ไม่พบ → fallback (พร้อมเตือน) — ไม่ cache เพื่อให้สแกนใหม่รอบหน้า
+    if t.primary_ws in titles:
+        log(f"[WARN] {t.tag}ไม่พบแท็บหัวคอลัมน์ครบ ใช้ '{t.primary_ws}' แทน")
+        return t.primary_ws
+    if t.fallback_ws in titles:
+        log(f"[WARN] {t.tag}ไม่พบแท็บหัวคอลัมน์ครบ ใช้ '{t.fallback_ws}' (interval จะไม่ถูกอ่าน)")
+        return t.fallback_ws
+
+    raise RuntimeError("ไม่พบแท็บที่รองรับตารางใหม่ (ต้องมี name/spawn_type/next_spawn/date_spawn)")
+
+def _is_missing_range(e: Exception) -> bool:
+    """APIError 400 'Unable to parse range' = แท็บถูกลบ/เปลี่ยนชื่อ"""
+    resp = getattr(e, "response", None)
+    return getattr(resp, "status_code", None) == 400 and "Unable to parse range" in str(e)
+
+def read_ws_rows(ss, t: "Tenant") -> Tuple[str, list, Optional[dict]]:
+    """
+    (blocking) อ่านหัวคอลัมน์ + ข้อมูลในรอบเดียว (values_batch_get)
+    คืน (ws_name, rows, col) — ล้าง WS_CACHE แล้วสแกนใหม่เมื่อแท็บหายหรือหัวคอลัมน์เปลี่ยน
+    """
+    for attempt in range(2):
+        ws_name = choose_ws(ss, t)
+        try:
+            head_vals, rows = _batch_values(ss, [f"'{ws_name}'!{HEADER_RANGE}", f"'{ws_name}'!{READ_RANGE}"])
+        except gspread.exceptions.APIError as e:
+            if attempt == 0 and _is_missing_range(e) and WS_CACHE.pop(t.key, None):
+                log(f"[WARN] {t.tag}ไม่พบแท็บ '{ws_name}' แล้ว — สแกนแท็บใหม่")
+                continue
+            raise
+
+        hit = WS_CACHE.get(t.key)
+        if hit is None:
+            return ws_name, rows, None
+        header = head_vals[0] if head_vals else []
+        if header == hit["header"]:
+            return ws_name, rows, hit["col"]
+
+        col = build_col_idx(header)
+        if all(col.get(k) is not None for k in NEEDED_COLS):
+            # ลำดับคอลัมน์เปลี่ยนแต่ยังครบ → อัปเดต cache ใช้ต่อได้เลย
+            log(f"[AUTO] {t.tag}หัวคอลัมน์ '{ws_name}' เปลี่ยน — อัปเดต colmap")
+            hit.update(header=header, col=col)
+            return ws_name, rows, col
+        log(f"[WARN] {t.tag}หัวคอลัมน์ '{ws_name}' ไม่ครบแล้ว — สแกนแท็บใหม่")
+        WS_CACHE.pop(t.key, None)
+
+    return ws_name, rows, None
+
+
+# ========= อ่านข้อมูล + คำนวณรอบถัดไป =========
+class SheetRow(NamedTuple):
+    """ข้อมูลแถวที่ parse แล้ว (ไม่ขึ้นกับเวลาปัจจุบัน → cache ได้จนกว่าชีตจะเปลี่ยน)"""
+    name: str
+    level: str
+    location: str
+    sp_type: str
+    pairs: tuple                      # fixed: ((day_th, hh, mm), ...)
+    d: Optional[date]
+    t: Optional[Tuple[int,int,int]]
+    kill_dt: Optional[datetime]
+    hours: Optional[int]              # interval: X ชั่วโมง
+    row: int = 0                      # เลขแถวในชีต (1 = หัวตาราง) ใช้เป็นคีย์ของแถว
+
+@functools.lru_cache(maxsize=1024)
+def fixed_pairs(detail: str) -> Tuple[Tuple[str,int,int], ...]:
+    """spawn_detail ของ fixed → ((day_th, hh, mm), ...) — cache ตามสตริง"""
     out = []
-    # รายสัปดาห์ตามแม็พ
+    for day_th, hhmm in parse_weekly_pairs(detail):
+        tm = parse_time_of_day(hhmm)
+        if tm:
+            out.append((day_th, tm[0], tm[1]))
+    return tuple(out)
+
+@functools.lru_cache(maxsize=256)
+def interval_hours(detail: str) -> Optional[int]:
+    m = HOURS_RE.search(detail or "")
+    return int(m.group(1)) if m else None
+
+ROW_FIELDS = ("name", "level", "location", "spawn_type", "spawn_detail", "date_spawn", "next_spawn", "kill_dt")
+
+def row_cols(col: dict) -> tuple:
+    """index คอลัมน์ที่ parse_sheet_row ใช้ ตามลำดับ ROW_FIELDS (ดึงครั้งเดียว ไม่ lookup dict ทุกช่อง)"""
+    return tuple(col.get(k) for k in ROW_FIELDS)
+
+def parse_sheet_row(r: list, cols: tuple, rownum: int = 0) -> Optional[SheetRow]:
+    """(CPU) แปลงแถวดิบ 1 แถวเป็น SheetRow — แถวว่าง/worldboss คืน None"""
+    def cell(idx):
+        if idx is None or idx >= len(r):
+            return ""
+        return r[idx]
+
+    i_name, i_level, i_loc, i_type, i_detail, i_date, i_next, i_kill = cols
+    name = (cell(i_name) or "").strip()
+    if not name or name in BAD_TOKENS:
+        return None
+
+    # worldboss ถูกคำนวณจาก fixed_sources แล้ว — ข้ามเพื่อกันซ้ำ
+    if is_world_boss(name):
+        return None
+
+    sp_type = (str(cell(i_type)) or "").strip().lower()
+    detail  = (cell(i_detail) or "").strip()
+
+    pairs, hours = (), None
+    if sp_type == "fixed":
+        # fixed: ใช้คู่วัน/เวลาใน spawn_detail
+        pairs = fixed_pairs(detail)
+    elif sp_type == "interval":
+        hours = interval_hours(detail)
+
+    return SheetRow(
+        name=name,
+        level=(str(cell(i_level)) or "").strip(),
+        location=(cell(i_loc) or "").strip(),
+        sp_type=sp_type,
+        pairs=pairs,
+        d=parse_gsheet_date(cell(i_date)),
+        t=parse_time_of_day(cell(i_next)),
+        kill_dt=parse_kill_dt(cell(i_kill)),
+        hours=hours,
+        row=rownum,
+    )
+
+def resolve_spawn(row: SheetRow, now_dt: datetime) -> Optional[datetime]:
+    """คำนวณรอบเกิดถัดไปของแถว ณ now_dt (ส่วนที่ขึ้นกับเวลา — ทำใหม่ทุกรอบ)"""
+    d, t, kill_dt, hours = row.d, row.t, row.kill_dt, row.hours
+    dt = None
+
+    if row.sp_type == "fixed":
+        cands = [next_from_weekday_time(day_th, hh, mm, now_dt) for day_th, hh, mm in row.pairs]
+        if cands:
+            dt = min(cands)
+
+    elif row.sp_type == "interval":
+        # interval: ใช้ next_spawn + date_spawn เป็นหลัก
+        if d and t:
+            cand = localize(datetime(d.year, d.month, d.day, t[0], t[1], t[2]))
+            # ถ้า cand ใกล้ kill_dt หรือ cand ย้อนอดีต → fallback เป็น kill_dt + ชั่วโมง
+            if ((kill_dt and near_same_minute(cand, kill_dt)) or cand <= now_dt) and hours:
+                dt = compute_next_interval(kill_dt, hours, now_dt)
+            else:
+                dt = cand
+
+        elif t and not d:
+            cand = localize(datetime(now_dt.year, now_dt.month, now_dt.day, t[0], t[1], t[2]))
+            if cand <= now_dt:
+                cand += timedelta(days=1)
+            if kill_dt and near_same_minute(cand, kill_dt) and hours:
+                dt = compute_next_interval(kill_dt, hours, now_dt)
+            else:
+                dt = cand
+
+        # ถ้ายังไม่มี dt และมี kill_dt+hours → ใช้เป็น fallback
+        if dt is None and hours and kill_dt:
+            dt = compute_next_interval(kill_dt, hours, now_dt)
+
+    else:
+        # ประเภทอื่น: ถ้ามี date+time ก็ใช้เลย
+        if d and t:
+            dt = localize(datetime(d.year, d.month, d.day, t[0], t[1], t[2]))
+        elif t and not d:
+            cand = localize(datetime(now_dt.year, now_dt.month, now_dt.day, t[0], t[1], t[2]))
+            if cand <= now_dt:
+                cand += timedelta(days=1)
+            dt = cand
+    return dt
+
+# ========= Change detection =========
+# ผลอ่านล่าสุดต่อ tenant: tenant key → {"modified", "ws_name", "cols", "hashes": {แถว: digest}, "rows": {แถว: SheetRow}}
+# entry ถูกแทนทั้งก้อนทุกครั้ง (ไม่แก้ในที่) เพราะอ่านได้จากหลายเธรดของ sheet_executor
+SHEET_CACHE = {}
+
+def probe_modified(ss) -> Optional[str]:
+    """ถาม Drive ว่าไฟล์แก้ไขล่าสุดเมื่อไร (1 call เล็ก ๆ) — ใช้ไม่ได้คืน None"""
+    try:
+        with METRICS.timer("l9_sheet_probe_seconds"):
+            modified = ss.get_lastUpdateTime()
+        SHEET_STATS["api_calls"] += 1
+        return modified
+    except Exception as e:
+        log(f"[DEBUG] probe modifiedTime ไม่สำเร็จ: {e}")
+        return None
+
+def row_digest(r: list) -> bytes:
+    """
+    hash ของแถวดิบที่คงที่ข้ามโปรเซส (เก็บลง snapshot แล้วใช้ diff ต่อหลังรีสตาร์ทได้)
+    API คืนทุกช่องเป็น str (map(str) ไม่เปลี่ยน hash เดิม) แต่ตัวเลข/None จาก webhook หรือเทสต์ต้องไม่ทำให้ล้ม
+    """
+    return hashlib.blake2b("\x1f".join(map(str, r)).encode("utf-8"), digest_size=8).digest()
+
+def diff_rows(raw: list, cols: tuple, prev: Optional[dict]) -> Tuple[dict, dict, dict]:
+    """
+    (CPU) เทียบแถวดิบกับรอบก่อนด้วย hash ต่อแถว แล้ว parse เฉพาะแถวที่ hash เปลี่ยน
+    คืน (hashes, rows, changed) — changed: เลขแถว → SheetRow ใหม่ หรือ None = แถวหาย/ใช้ไม่ได้แล้ว
+    prev=None → parse ทุกแถว
+    """
+    old_hashes, old_rows = (prev["hashes"], prev["rows"]) if prev else ({}, {})
+    rows = dict(old_rows)
+    hashes, changed = {}, {}
+    # ข้ามหัวตารางแถวแรก (READ_RANGE เริ่ม A1 → raw[k] คือแถว k+1 ของชีต)
+    for n, r in enumerate(raw[1:], start=2):
+        h = row_digest(r)
+        hashes[n] = h
+        if old_hashes.get(n) != h:
+            row = parse_sheet_row(r, cols, n)
+            # แถวที่ใช้ไม่ได้ทั้งก่อนและหลัง (แถวว่าง/worldboss) ไม่นับเป็นการเปลี่ยนแปลง
+            if row is not None or n in old_rows:
+                changed[n] = row
+    for n in old_hashes.keys() - hashes.keys():
+        if n in old_rows:
+            changed[n] = None
+
+    for n, row in changed.items():
+        if row is None:
+            del rows[n]
+        else:
+            rows[n] = row
+    return hashes, rows, changed
+
+def load_sheet_rows(ss, t: "Tenant") -> Tuple[str, dict, Optional[dict]]:
+    """
+    (blocking) คืน (ws_name, rows, changed) โดยทำงานตามจำนวนแถวที่ถูกแก้ ไม่ใช่ขนาดชีต:
+    - rows: เลขแถว → SheetRow ของทั้งชีต
+    - changed: เลขแถว → SheetRow/None เฉพาะแถวที่ต่างจากรอบก่อน
+      (None ทั้งก้อน = ต้องแทนที่ทั้งหมด: โหลดครั้งแรก/เปลี่ยนแท็บ/หัวคอลัมน์เปลี่ยน)
+    1) modifiedTime เท่าเดิม → ไม่อ่าน changed = {}
+    2) อ่านแล้วเทียบ hash ทีละแถว → parse เฉพาะแถวที่เปลี่ยน
+    """
+    prev = SHEET_CACHE.get(t.key)
+    modified = probe_modified(ss)
+    if prev and modified and prev["modified"] == modified:
+        SHEET_STATS["probe_hits"] += 1
+        return prev["ws_name"], prev["rows"], {}
+
+    ws_name, raw, col = read_ws_rows(ss, t)
+    if not raw or len(raw) < 2:
+        log(f"[WARN] {t.tag}'{ws_name}' ว่าง")
+    col = col or build_col_idx(raw[0] if raw else [])
+    cols = row_cols(col)
+    if prev and (prev["ws_name"] != ws_name or prev["cols"] != cols):
+        prev = None
+    if prev is None:
+        log(f"[DEBUG] {t.tag}ใช้แท็บ: {ws_name} colmap: {col}")
+
+    with METRICS.timer("l9_parse_seconds"):
+        hashes, rows, changed = diff_rows(raw, cols, prev)
+    if changed:
+        SHEET_STATS["parse_runs"] += 1
+        METRICS.inc("l9_rows_parsed_total", len(changed))
+
+    SHEET_CACHE[t.key] = {"modified": modified, "ws_name": ws_name, "cols": cols, "hashes": hashes, "rows": rows}
+    if changed or prev is None:
+        sheet_executor.submit(save_snapshot, t)   # เขียนไฟล์แยกงาน ไม่ถ่วงรอบอ่านนี้
+    return ws_name, rows, (changed if prev is not None else None)
+
+
+# ========= Warm-start snapshot =========
+# แถวที่ parse แล้ว + แท็บ/colmap + hash ต่อแถว เขียนลงไฟล์ทุกครั้งที่อ่านชีตสำเร็จ
+# ตอนบูตโหลดกลับได้ทันที (ไม่ต้องรอ Google) แล้วค่อยกระทบยอดกับชีตจริงเบื้องหลัง
+SNAPSHOT_VERSION = 1
+
+def _row_to_json(r: SheetRow) -> list:
+    kill = r.kill_dt.replace(tzinfo=None).isoformat() if r.kill_dt else None
+    return [r.name, r.level, r.location, r.sp_type, r.pairs, r.d.toordinal() if r.d else None,
+            r.t, kill, r.hours, r.row]
+
+def _row_from_json(a: list) -> SheetRow:
+    name, level, location, sp_type, pairs, d, t, kill, hours, row = a
+    return SheetRow(
+        name=name, level=level, location=location, sp_type=sp_type,
+        pairs=tuple(tuple(p) for p in pairs),
+        d=date.fromordinal(d) if d else None,
+        t=tuple(t) if t else None,
+        kill_dt=localize(datetime.fromisoformat(kill)) if kill else None,
+        hours=hours, row=row,
+    )
+
+def snapshot_path(t: "Tenant") -> str:
+    """ไฟล์ snapshot ของ tenant: tenant หลักใช้ SHEET_SNAPSHOT_PATH ตรง ๆ ตัวอื่นเติม .<key> ก่อนนามสกุล"""
+    if not SHEET_SNAPSHOT_PATH or t.key == DEFAULT_TENANT:
+        return SHEET_SNAPSHOT_PATH
+    root, ext = os.path.splitext(SHEET_SNAPSHOT_PATH)
+    return f"{root}.{t.key}{ext}"
+
+def save_snapshot(t: "Tenant"):
+    """(blocking) เขียน SHEET_CACHE + WS_CACHE ของ tenant นี้ลง snapshot_path() แบบ atomic"""
+    entry, ws = SHEET_CACHE.get(t.key), WS_CACHE.get(t.key)
+    path = snapshot_path(t)
+    if not path or entry is None or ws is None or ws["title"] != entry["ws_name"]:
+        return
+    data = {
+        "v": SNAPSHOT_VERSION,
+        "spreadsheet_id": t.spreadsheet_id,
+        "saved_at": clock.time(),
+        "modified": entry["modified"],
+        "ws_name": entry["ws_name"],
+        "header": ws["header"],
+        "col": ws["col"],
+        "hashes": {n: h.hex() for n, h in entry["hashes"].items()},
+        "rows": [_row_to_json(r) for r in entry["rows"].values()],
+    }
+    tmp = path + ".tmp"
+    try:
+        body = json.dumps(data, ensure_ascii=False, separators=(",", ":"))   # dumps ครั้งเดียวเร็วกว่า dump ทีละชิ้นหลายเท่า
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(body)
+        os.replace(tmp, path)
+    except OSError as e:
+        log(f"[WARN] {t.tag}เขียน snapshot ไม่สำเร็จ: {e}")
+
+def restore_snapshot(t: "Tenant") -> Optional[Tuple[str, dict, float]]:
+    """
+    (blocking) โหลด snapshot เข้า WS_CACHE/SHEET_CACHE แล้วคืน (ws_name, rows, saved_at)
+    ไม่มีไฟล์/คนละไฟล์ชีต/เวอร์ชันไม่ตรง/อ่านไม่ได้ → None (บูตแบบเดิม)
+    """
+    path = snapshot_path(t)
+    if not path:
+        return None
+    try:
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("v") != SNAPSHOT_VERSION or data.get("spreadsheet_id") != t.spreadsheet_id:
+            return None
+        rows = {r.row: r for r in map(_row_from_json, data["rows"])}
+        col = data["col"]
+        ws_name = data["ws_name"]
+        hashes = {int(n): bytes.fromhex(h) for n, h in data["hashes"].items()}
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        log(f"[WARN] {t.tag}อ่าน snapshot ไม่ได้ ({type(e).__name__}: {e}) — โหลดจากชีตแทน")
+        return None
+
+    WS_CACHE.setdefault(t.key, {"title": ws_name, "header": data["header"], "col": col})
+    SHEET_CACHE.setdefault(t.key, {
+        "modified": data["modified"], "ws_name": ws_name, "cols": row_cols(col),
+        "hashes": hashes, "rows": rows,
+    })
+    return ws_name, rows, data["saved_at"]
+
+
+# ========= Boss record =========
+_NAME_IDS = {}                  # ชื่อ (intern) → id เล็ก ๆ ใช้ทำคีย์
+_name_counter = itertools.count()
+
+def name_id(name: str) -> int:
+    nid = _NAME_IDS.get(name)
+    if nid is None:
+        nid = _NAME_IDS.setdefault(name, next(_name_counter))   # ปลอดภัยข้ามเธรด (id อาจข้ามเลขได้)
+    return nid
+
+class Boss:
+    """
+    รอบเกิด 1 รอบ — ชื่อ intern, เวลาเป็น epoch วินาที, flag เวิลด์บอสคิดครั้งเดียวตอนสร้าง
+    เท่ากัน/hash ตาม (name_id, นาที) = กติกากันซ้ำ "ชื่อ+นาทีเดียวกัน" เดิม
+    """
+    __slots__ = ("ws", "name", "name_id", "epoch", "level", "location", "world", "src", "_dt")
+
+    def __init__(self, ws: str, name: str, epoch: int, level: str = "", location: str = "", src=None):
+        self.ws = ws
+        self.name = sys.intern(name)
+        self.name_id = name_id(self.name)
+        self.epoch = int(epoch)
+        self.level = level
+        self.location = location
+        self.world = is_world_boss(name)
+        self.src = src
+        self._dt = None
+
+    @property
+    def spawn_dt(self) -> datetime:
+        if self._dt is None:
+            self._dt = datetime.fromtimestamp(self.epoch, tz)
+        return self._dt
+
+    @property
+    def minute(self) -> int:
+        return self.epoch // 60
+
+    def __hash__(self):
+        return hash((self.name_id, self.epoch // 60))
+
+    def __eq__(self, other):
+        return (isinstance(other, Boss) and self.name_id == other.name_id
+                and self.epoch // 60 == other.epoch // 60)
+
+    def __lt__(self, other):
+        return (self.epoch, self.name_id) < (other.epoch, other.name_id)
+
+    def __repr__(self):
+        return f"Boss({self.ws!r}, {self.name!r}, {self.spawn_dt:%Y-%m-%d %H:%M})"
+
+_epoch_of = operator.attrgetter("epoch")
+_name_id_of = operator.attrgetter("name_id")
+
+def _sort_spawns(lst: list):
+    """เรียงตาม (epoch, name_id) เหมือน Boss.__lt__ — sort คีย์ int สองรอบ (stable) ไม่ต้องสร้าง tuple ต่อรายการ"""
+    lst.sort(key=_name_id_of)
+    lst.sort(key=_epoch_of)
+
+def _remove_sorted(lst: list, b: "Boss"):
+    """ลบ b (ตัวเดิม ไม่ใช่แค่เท่ากัน) ออกจาก list ที่เรียงแล้ว"""
+    i = bisect.bisect_left(lst, b)
+    while lst[i] is not b:
+        i += 1
+    del lst[i]
+
+
+# ========= Spawn timeline =========
+def weekly_between(day_th: str, hh: int, mm: int, start: datetime, end: datetime):
+    """รอบรายสัปดาห์ทั้งหมดในช่วง (start, end]"""
+    dt = next_from_weekday_time(day_th, hh, mm, start)
+    while dt <= end:
+        yield dt
+        dt += timedelta(days=7)
+
+def series_between(anchor: datetime, period: Optional[timedelta], start: datetime, end: datetime):
+    """anchor + k*period ทั้งหมดในช่วง (start, end] (period=None → ครั้งเดียว)"""
+    if period is None:
+        if start < anchor <= end:
+            yield anchor
+        return
+    if anchor <= start:
+        anchor += period * (int((start - anchor) / period) + 1)
+    while anchor <= end:
+        yield anchor
+        anchor += period
+
+def _weekly_gen(tms):
+    def gen(start, end):
+        for day_th, hh, mm in tms:
+            yield from weekly_between(day_th, hh, mm, start, end)
+    return gen
+
+def _daily_gen(tms):
+    def gen(start, end):
+        for hh, mm in tms:
+            anchor = localize(datetime(start.year, start.month, start.day, hh, mm))
+            yield from series_between(anchor, timedelta(days=1), start, end)
+    return gen
+
+def _series_gen(anchor, period):
+    return lambda start, end: series_between(anchor, period, start, end)
+
+def fixed_sources() -> dict:
+    """แหล่งรอบเกิดจากโค้ด: src → ((ws, name, level, location), gen(start, end))"""
+    out = {}
     for name, pairs in FIXED_WEEKLY_TIMES.items():
-        cands = []
+        tms = []
         for day_th, hhmm in pairs:
             t = parse_time_of_day(hhmm)
-            if not t: continue
-            cands.append(next_from_weekday_time(day_th, t[0], t[1], now_dt))
-        if cands:
-            out.append(("Fixed", name, min(cands), "", ""))
-
-    # เวิลด์บอส
-    wcands = []
-    for t in WORLD_DAILY_TIMES:
-        hh, mm, _ = parse_time_of_day(t)
-        dt = tz.localize(datetime(now_dt.year, now_dt.month, now_dt.day, hh, mm))
-        if dt <= now_dt: dt += timedelta(days=1)
-        wcands.append(dt)
-    w_dt = min(wcands)
+            if t:
+                tms.append((day_th, t[0], t[1]))
+        if tms:
+            out[("Fixed", name)] = (("Fixed", name, "", ""), _weekly_gen(tms))
+
+    world_tms = [parse_time_of_day(t)[:2] for t in WORLD_DAILY_TIMES]
     for name in WORLD_BOSSES:
-        out.append(("Fixed", name, w_dt, "", ""))
+        out[("Fixed", name)] = (("Fixed", name, "", ""), _daily_gen(world_tms))
     return out
 
-def choose_ws(ss) -> str:
-    """เลือกแท็บที่หัวคอลัมน์ครบของตารางใหม่เป็นอันดับแรก"""
-    titles = [ws.title for ws in ss.worksheets()]
-
-    # สแกนทุกแท็บหาแท็บที่มีหัวคอลัมน์ครบ
-    for ws in ss.worksheets():
-        try:
-            head_vals = ss.values_get(f"'{ws.title}'!A1:Z1").get("values", [])
-            if not head_vals:
-                continue
-            col = build_col_idx(head_vals[0])
-            needed = ("name", "spawn_type", "next_spawn", "date_spawn")
-            if all(col.get(k) is not None for k in needed):
-                log(f"[AUTO] เลือกแท็บ '{ws.title}' (หัวคอลัมน์ครบ)")
-                return ws.title
-        except Exception:
+def sheet_sources(ws_name: str, rows: List[SheetRow], now_dt: datetime) -> dict:
+    """
+    แหล่งรอบเกิดจากชีต 1 แถว = 1 src (คีย์ตามเลขแถวในชีต → แก้ทีละแถวได้)
+    - fixed: ทุกคู่วัน/เวลาใน spawn_detail ทุกสัปดาห์
+    - interval: เริ่มจากรอบถัดไป (resolve_spawn) แล้วบวกทีละ X ชั่วโมง
+    - มีแต่เวลาไม่มีวันที่: ทุกวันเวลาเดิม / มีวันที่+เวลา: ครั้งเดียว
+    """
+    out = {}
+    for row in rows:
+        meta = (ws_name, row.name, row.level, row.location)
+        if row.sp_type == "fixed":
+            if row.pairs:
+                out[("sheet", ws_name, row.row)] = (meta, _weekly_gen(row.pairs))
             continue
+        anchor = resolve_spawn(row, now_dt)
+        if not anchor or anchor <= now_dt:
+            continue
+        if row.sp_type == "interval" and row.hours:
+            period = timedelta(hours=row.hours)
+        elif row.t and not row.d:
+            period = timedelta(days=1)
+        else:
+            period = None
+        out[("sheet", ws_name, row.row)] = (meta, _series_gen(anchor, period))
+    return out
 
-    # ไม่พบ → fallback (พร้อมเตือน)
-    if PRIMARY_WS in titles:
-        log(f"[WARN] ไม่พบแท็บหัวคอลัมน์ครบ ใช้ '{PRIMARY_WS}' แทน")
-        return PRIMARY_WS
-    if FALLBACK_WS in titles:
-        log(f"[WARN] ไม่พบแท็บหัวคอลัมน์ครบ ใช้ '{FALLBACK_WS}' (interval จะไม่ถูกอ่าน)")
-        return FALLBACK_WS
+def gen_entries(sources: dict, start: datetime, end: datetime) -> List[Boss]:
+    """สร้าง Boss ของทุก src ในช่วง (start, end]"""
+    out = []
+    for src, ((ws, name, level, location), gen) in sources.items():
+        for dt in gen(start, end):
+            out.append(Boss(ws, name, int(dt.timestamp()), level, location, src))
+    return out
 
-    raise RuntimeError("ไม่พบแท็บที่รองรับตารางใหม่ (ต้องมี name/spawn_type/next_spawn/date_spawn)")
+def _dedup(entries, limit: Optional[int] = None) -> List[Boss]:
+    """กันซ้ำชื่อ+นาทีเดียวกัน (เช่น fixed ในโค้ดกับแถว fixed ในชีต)"""
+    out, seen = [], set()
+    for b in entries:
+        if b not in seen:
+            seen.add(b)
+            out.append(b)
+            if limit is not None and len(out) >= limit:
+                break
+    return out
 
+class TimelineEvent(NamedTuple):
+    """การเปลี่ยนแปลงของ src จากชีต 1 แถว ที่ส่งให้ผู้ใช้ไทม์ไลน์ (คิวแจ้งเตือน ฯลฯ)"""
+    kind: str          # "add" | "update" | "remove" | "reset" (แทนที่ทั้งชีต — old/new ว่าง)
+    src: tuple
+    old: List[Boss]    # รอบเดิมของ src ก่อนเปลี่ยน
+    new: List[Boss]
 
-# ========= อ่านข้อมูล + คำนวณรอบถัดไป =========
-def get_boss_from_sheet(max_retry=3):
+class SpawnTimeline:
+    """
+    รอบเกิดทุกรอบล่วงหน้า TIMELINE_HORIZON_DAYS วัน เรียงตามเวลา + index ตาม src และชื่อ
+    advance() ต่อท้ายเฉพาะช่วงเวลาใหม่และตัดรอบที่ผ่านไปแล้ว ไม่สร้างใหม่ทั้งหมด
+    แถวชีตที่เปลี่ยนถูกแก้ทีละ src แล้วแจ้ง TimelineEvent ให้ listener (ไม่ส่งรายการใหม่ทั้งก้อน)
+    ใช้จาก event loop เท่านั้น (งานหนักของชีตสร้าง entry ใน executor แล้วค่อย merge)
     """
-    คืน [(ws_name, name, spawn_dt, level, location)]
+
+    def __init__(self, horizon_days: int = TIMELINE_HORIZON_DAYS):
+        self.horizon = timedelta(days=horizon_days)
+        self._entries = []    # [Boss] เรียงตามเวลา
+        self._by_src = {}     # src → [Boss]
+        self._by_name = {}    # name → [Boss]
+        self._sources = {}    # src → (meta, gen)
+        self._until = None    # สร้างรอบไว้ถึงเวลานี้แล้ว
+        self._sheet_rows = None   # เลขแถว → SheetRow (สำเนาของไทม์ไลน์เอง แก้ได้จาก loop เท่านั้น)
+        self._listeners = []
+        self.version = 0      # เพิ่มทุกครั้งที่เนื้อหาเปลี่ยน (ให้ cache ภายนอกรู้ว่าต้อง render ใหม่)
+        self._sources.update(fixed_sources())
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def until(self) -> Optional[datetime]:
+        return self._until
+
+    @property
+    def sheet_loaded(self) -> bool:
+        return self._sheet_rows is not None
+
+    def _insert(self, new: list):
+        if not new:
+            return
+        self.version += 1
+        if len(new) > 32:
+            # ก้อนใหญ่ (โหลดทั้งชีต/ต่อไทม์ไลน์) → ต่อท้ายแล้ว sort ครั้งเดียวต่อ list
+            self._entries.extend(new)
+            _sort_spawns(self._entries)
+            for idx, attr in ((self._by_src, "src"), (self._by_name, "name")):
+                touched = set()
+                for b in new:
+                    k = getattr(b, attr)
+                    idx.setdefault(k, []).append(b)
+                    touched.add(k)
+                for k in touched:
+                    _sort_spawns(idx[k])
+            return
+        for e in new:
+            bisect.insort(self._entries, e)
+        for b in new:
+            bisect.insort(self._by_src.setdefault(b.src, []), b)
+            bisect.insort(self._by_name.setdefault(b.name, []), b)
+
+    def _drop_sources(self, srcs: set):
+        if not srcs:
+            return
+        self.version += 1
+        dropped = []
+        for src in srcs:
+            self._sources.pop(src, None)
+            dropped.extend(self._by_src.pop(src, ()))
+        if len(dropped) > 64:
+            self._entries = [b for b in self._entries if b.src not in srcs]
+        else:
+            # ไม่กี่รอบ (แก้ไม่กี่แถว) → หาตำแหน่งด้วย bisect ไม่ต้องกรองทั้งไทม์ไลน์
+            for b in dropped:
+                _remove_sorted(self._entries, b)
+        names = {b.name for b in dropped}
+        for name in names:
+            lst = [b for b in self._by_name.get(name, ()) if b.src not in srcs]
+            if lst:
+                self._by_name[name] = lst
+            else:
+                self._by_name.pop(name, None)
+
+    def listen(self, fn):
+        """fn([TimelineEvent]) ถูกเรียกหลังแถวชีตเปลี่ยน (บน event loop)"""
+        self._listeners.append(fn)
+
+    def _emit(self, events: List[TimelineEvent]):
+        for fn in self._listeners:
+            try:
+                fn(events)
+            except Exception as e:
+                log(f"[ERROR] timeline listener {getattr(fn, '__qualname__', fn)}: {e}")
+
+    def advance(self, now_dt: datetime):
+        """ต่อไทม์ไลน์ให้ถึง now + horizon และตัดรอบที่ <= now ทิ้ง"""
+        end = now_dt + self.horizon
+        if self._until is None or end > self._until:
+            start = now_dt if self._until is None or self._until < now_dt else self._until
+            end += TIMELINE_EXTEND_STEP
+            self._insert(gen_entries(self._sources, start, end))
+            self._until = end
+
+        key = int(now_dt.timestamp()) + 1
+        cut = bisect.bisect_left(self._entries, key, key=_epoch_of)
+        if not cut:
+            return
+        self.version += 1
+        touched_src, touched_name = set(), set()
+        for b in self._entries[:cut]:
+            touched_src.add(b.src)
+            touched_name.add(b.name)
+        del self._entries[:cut]
+        for idx, keys in ((self._by_src, touched_src), (self._by_name, touched_name)):
+            for k in keys:
+                lst = idx.get(k)
+                if lst is not None:
+                    del lst[:bisect.bisect_left(lst, key, key=_epoch_of)]
+
+    def replace_sheet(self, rows: dict, sources: dict, entries: list, built_until: datetime):
+        """แทนที่ src จากชีตทั้งหมดด้วยชุดใหม่ (entries สร้างไว้ถึง built_until ด้วย gen_entries)"""
+        self._sheet_rows = dict(rows)
+        self._drop_sources({src for src in self._sources if src[0] == "sheet"})
+        self._sources.update(sources)
+        if self._until and self._until > built_until:
+            # ไทม์ไลน์ถูกต่อไประหว่างสร้างใน executor → เติมช่วงที่ขาด
+            entries = entries + gen_entries(sources, built_until, self._until)
+        self._insert(entries)
+        self._emit([TimelineEvent("reset", ("sheet",), [], [])])
+
+    def update_rows(self, ws_name: str, changed: dict, now_dt: datetime) -> List[TimelineEvent]:
+        """
+        แก้เฉพาะ src ของแถวที่เปลี่ยน (changed: เลขแถว → SheetRow หรือ None = ลบ)
+        แถวอื่นไม่ถูกสร้างใหม่ — งานต่อครั้งขึ้นกับจำนวนแถวที่แก้ ไม่ใช่ขนาดชีต
+        """
+        if self._sheet_rows is None:
+            self._sheet_rows = {}
+        events = []
+        for n, row in changed.items():
+            src = ("sheet", ws_name, n)
+            old = self._by_src.get(src, [])
+            had = self._sheet_rows.pop(n, None) is not None
+            self._drop_sources({src})
+            new = []
+            if row is not None:
+                self._sheet_rows[n] = row
+                sources = sheet_sources(ws_name, [row], now_dt)
+                self._sources.update(sources)
+                if self._until:
+                    new = gen_entries(sources, now_dt, self._until)
+                    self._insert(new)
+            kind = "update" if had and row is not None else "add" if row is not None else "remove"
+            if had or row is not None:
+                events.append(TimelineEvent(kind, src, old, new))
+        if events:
+            self._emit(events)
+        return events
+
+    @property
+    def sheet_rows(self) -> Optional[dict]:
+        return self._sheet_rows
+
+    def has_spawn(self, name: str, minute: int) -> bool:
+        """ยังมีรอบของชื่อนี้ในนาทีนี้อยู่ไหม (จาก src ใดก็ได้)"""
+        return any(b.minute == minute for b in self._by_name.get(name, ()))
+
+    # ---- queries ----
+    def next_per_source(self) -> List[Boss]:
+        """รอบถัดไปของแต่ละ src (เทียบเท่ารายการ 'รอบถัดไป' เดิม) เรียงตามเวลา"""
+        heads = [lst[0] for lst in self._by_src.values() if lst]
+        _sort_spawns(heads)
+        return _dedup(heads)
+
+    def next_k(self, k: int) -> List[Boss]:
+        return _dedup(self._entries, limit=k)
+
+    def between(self, t1: datetime, t2: datetime) -> List[Boss]:
+        """ทุกรอบในช่วง [t1, t2)"""
+        lo = bisect.bisect_left(self._entries, int(t1.timestamp()), key=_epoch_of)
+        hi = bisect.bisect_left(self._entries, int(t2.timestamp()), key=_epoch_of)
+        return _dedup(self._entries[lo:hi])
+
+    def by_name(self, name: str) -> List[Boss]:
+        return _dedup(self._by_name.get(normalize_name(name), ()))
+
+def build_sheet_update(ws_name: str, rows: List[SheetRow], now_dt: datetime, until: datetime):
+    """(CPU, executor) สร้าง src + entry ของแถวชีตจนถึง until"""
+    sources = sheet_sources(ws_name, rows, now_dt)
+    return sources, gen_entries(sources, now_dt, until)
+
+
+async def refresh_sheet(t: "Tenant", max_retry=3) -> str:
+    """
+    อัปเดตไทม์ไลน์ของ tenant จากชีตของ tenant นั้น แล้วคืนชื่อแท็บที่ใช้ (ไม่ raise)
+
+    งานอ่าน/parse ชีตทั้งหมดรันใน sheet_executor และ retry ด้วย asyncio.sleep
+    เพื่อไม่ให้ event loop (heartbeat, คำสั่งอื่น) ค้างระหว่างรอ Google Sheets
+    ถ้าชีตไม่เปลี่ยนจะใช้แถวที่ parse ไว้แล้ว (load_sheet_rows) และไทม์ไลน์เดิม
+    ถ้าเปลี่ยนไม่กี่แถว จะแก้ไทม์ไลน์เฉพาะแถวนั้น (update_rows → TimelineEvent ให้คิวแจ้งเตือน)
+    ชีตล่ม/โดน quota → breaker ของ tenant เปิด หยุดเรียกชีตชั่วคราว และใช้แถวชุดล่าสุดที่ดีต่อ
+    โควตารวม (sheet_quota) ไม่พอ → ข้ามรอบนี้ ใช้ข้อมูลเดิม รอบหน้าได้คิวก่อน
 
     กติกา:
-    - เติม Fixed (รายสัปดาห์ + เวิลด์บอส 10:00/19:00) จาก fixed_bosses_next() ก่อน
+    - Fixed (รายสัปดาห์ + เวิลด์บอส 10:00/19:00) มาจาก fixed_sources() เสมอ
     - interval: ใช้ next_spawn + date_spawn เป็นหลัก
         * ถ้าเวลาที่ได้ใกล้ kill_dt (±2 นาที) หรือได้เวลาย้อนอดีต → fallback เป็น kill_dt + X ชั่วโมง
         * ถ้าไม่มี next/date เลย → fallback เป็น kill_dt + X ชั่วโมง (ถ้ามี)
     - fixed: คำนวณจาก spawn_detail (คู่วัน/เวลา) เพื่อรองรับ fixed ที่ไม่อยู่ในแม็พ
     - อื่นๆ: ถ้ามี date+time ให้ใช้ได้เลย
     """
-    bosses, seen = [], set()
-    now_dt = datetime.now(tz)
+    now_dt = clock.now()
+    timeline = t.timeline
+    timeline.advance(now_dt)
+    ws_name = WS_CACHE.get(t.key, {}).get("title", t.primary_ws)
 
-    # 1) เติม fixed รายสัปดาห์ + worldboss จากโค้ด
-    for ws_name, name, dt, level, location in fixed_bosses_next(now_dt):
-        k = f"{name}|{dt.strftime('%Y%m%d%H%M')}"
-        if k not in seen:
-            seen.add(k)
-            bosses.append((ws_name, name, dt, level, location))
+    for i in range(max_retry):
+        if not t.breaker.allow():
+            break   # breaker เปิด → ใช้แถวชุดล่าสุดที่ดีในไทม์ไลน์ (Fixed/เวิลด์บอสไม่ขึ้นกับชีตอยู่แล้ว)
+        if not sheet_quota.take(SHEET_CALLS_PER_POLL):
+            t.poll["force"] = True
+            break
+        try:
+            # อ่านจากชีต (map ด้วยหัวคอลัมน์จริง)
+            ss, _ = await run_blocking(sheet_session.spreadsheet, t.spreadsheet_id)
+            edits = t.webhook_edits
+            ws_name, rows, changed = await run_blocking(load_sheet_rows, ss, t)
+            t.poll["last"] = clock.time()
+            if t.webhook_edits == edits:
+                if changed is None or not timeline.sheet_loaded or len(changed) > SHEET_DIFF_MAX_ROWS:
+                    until = timeline.until
+                    sources, entries = await run_blocking(build_sheet_update, ws_name, list(rows.values()), now_dt, until)
+                    if t.webhook_edits == edits:
+                        timeline.replace_sheet(rows, sources, entries, until)
+                elif changed:
+                    events = timeline.update_rows(ws_name, changed, now_dt)
+                    if debug_enabled():
+                        log(f"[DEBUG] {t.tag}'{ws_name}' แถวเปลี่ยน {len(changed)} แถว ({', '.join(sorted({ev.kind for ev in events}))})")
+            if t.webhook_edits != edits:
+                # webhook แก้แถวระหว่างอ่าน → ผลอ่านนี้อาจเก่ากว่า ไม่ทับ ให้รอบหน้าอ่านใหม่
+                SHEET_CACHE.pop(t.key, None)
+                t.poll["force"] = True
+            kill_writes.reapply(t, now_dt)   # ผลอ่านอาจยังไม่มีเวลาตายจาก !kill ที่รอเขียน
+            t.breaker.success()
+            t.last_sheet_ok = clock.time()
+            break
 
-    # 2) อ่านจากชีต (map ด้วยหัวคอลัมน์จริง)
-    client, _ = gspread_client()
-    ss, _ = open_spreadsheet(client)
-    ws_name = choose_ws(ss)
+        except Exception as e:
+            HEALTH["last_error"] = f"sheet: {t.tag}{type(e).__name__}: {e}"
+            log(f"[ERROR] {t.tag}อ่าน '{ws_name}' ล้มเหลวครั้งที่ {i+1}: {e}")
+            if _is_quota_error(e):
+                sheet_quota.hold(SHEET_BREAKER_BASE_SEC)   # โควตาเป็นของทั้ง service account → พักทุก tenant
+            t.breaker.failure(e)
+            if i + 1 < max_retry and t.breaker.state == "closed":
+                # exponential backoff + jitter (await ไม่บล็อก heartbeat)
+                await asyncio.sleep(SHEET_RETRY_BASE_SEC * (2 ** i) * random.uniform(0.5, 1.0))
+
+    timeline.advance(clock.now())
+    return ws_name
+
+async def get_boss_from_sheet(t: "Tenant", max_retry=3) -> List[Boss]:
+    """refresh_sheet แล้วคืน 'รอบถัดไป' เป็น [Boss] เรียงตามเวลา (check_alerts ไม่ต้องใช้ → เรียก refresh_sheet ตรง)"""
+    ws_name = await refresh_sheet(t, max_retry)
+    bosses = t.timeline.next_per_source()
+    log(f"{t.tag}โหลด {len(bosses)} รายการ จากแท็บ: ['{ws_name}', 'Fixed'] (ไทม์ไลน์ {len(t.timeline)} รอบ)")
+    return bosses
 
-    for i in range(max_retry):
+
+
+# ========= วนลูปแจ้งเตือน =========
+WORLD_GROUP = "*world"   # ชื่อในคีย์ของแจ้งเตือนรวมเวิลด์บอส
+
+def alert_key(tenant: str, name: str, b: Boss, th_min: int) -> Tuple[str, str, int, int]:
+    """คีย์กันซ้ำแบบกะทัดรัด: (tenant, ชื่อ, นาที epoch ของเวลาเกิด, T) — T ติดลบ = DM ผู้ติดตามล่วงหน้า |T| นาที"""
+    return tenant, name, b.minute, th_min
+
+class AlertLedger:
+    """
+    บันทึกแจ้งเตือนที่ส่งแล้ว (SQLite) — โหลดกลับตอนเริ่ม และลบคีย์ที่เลยเวลาเกิดแล้วทิ้ง
+    ทำให้หน่วยความจำคงที่ และรีสตาร์ทกลางช่วงแจ้งเตือนไม่ส่งซ้ำ
+    """
+
+    def __init__(self, path: str):
         try:
-            rows = values_get_ws(ss, ws_name, READ_RANGE)
-            if not rows or len(rows) < 2:
-                log(f"[WARN] '{ws_name}' ว่าง")
-                break
+            self._db = sqlite3.connect(path)
+        except sqlite3.Error as e:
+            log(f"[WARN] เปิด ledger '{path}' ไม่ได้ ({e}) — ใช้ในหน่วยความจำแทน")
+            self._db = sqlite3.connect(":memory:")
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS alerts_sent ("
+            " tenant TEXT NOT NULL, name TEXT NOT NULL, spawn_min INTEGER NOT NULL, th INTEGER NOT NULL,"
+            " PRIMARY KEY (tenant, name, spawn_min, th)) WITHOUT ROWID"
+        )
+        if self._db.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'alerted'").fetchone():
+            # ledger รุ่น tenant เดียว → ย้ายเข้า DEFAULT_TENANT (รีสตาร์ทตอนอัปเกรดไม่ส่งซ้ำ)
+            with self._db:
+                self._db.execute("INSERT OR IGNORE INTO alerts_sent SELECT ?, name, spawn_min, th FROM alerted",
+                                 (DEFAULT_TENANT,))
+                self._db.execute("DROP TABLE alerted")
+        self._keys = set()
+        self.reload()
+
+    def reload(self):
+        """โหลดคีย์จากไฟล์ใหม่ (replica ที่เพิ่งรับช่วงเห็นสิ่งที่ตัวก่อนส่งไปแล้ว)"""
+        self.prune(clock.now())
+        self._keys = {(sys.intern(tenant), sys.intern(name), spawn_min, th) for tenant, name, spawn_min, th
+                      in self._db.execute("SELECT tenant, name, spawn_min, th FROM alerts_sent")}
+
+    def __contains__(self, key) -> bool:
+        return key in self._keys
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def add(self, key) -> bool:
+        """จองคีย์ก่อนส่ง — คืน False ถ้ามีแล้ว (รวมถึง replica อื่นที่ใช้ไฟล์เดียวกันจองไปก่อน)"""
+        if key in self._keys:
+            return False
+        self._keys.add(key)
+        with self._db:
+            cur = self._db.execute("INSERT OR IGNORE INTO alerts_sent VALUES (?, ?, ?, ?)", key)
+        return cur.rowcount == 1
+
+    def prune(self, now_dt: datetime) -> int:
+        """ลบคีย์ที่เวลาเกิดผ่านไปแล้ว"""
+        now_min = int(now_dt.timestamp()) // 60
+        old = [k for k in self._keys if k[2] < now_min]
+        self._keys.difference_update(old)
+        with self._db:
+            self._db.execute("DELETE FROM alerts_sent WHERE spawn_min < ?", (now_min,))
+        return len(old)
+
+alerted: Optional[AlertLedger] = None   # เปิดใน open_stores() ตอนเริ่มบอท (import สคริปต์ไม่สร้างไฟล์)
+
+def plan_alerts(t: "Tenant", bosses: List[Boss]) -> dict:
+    """แปลงรายการบอสของ tenant เป็นจุดเวลาแจ้งเตือนจริง: alert_key → entry (fire_ts = spawn - T)"""
+    plan = {}
+
+    # เวิลด์บอส: รวมเวลาตรงกัน แจ้งเฉพาะ T-5
+    world_groups = {}
+    for b in bosses:
+        if b.world and b.ws == "Fixed":
+            g = world_groups.setdefault(b.minute, {"boss": b, "names": set()})
+            g["names"].add(normalize_name(b.name))
+
+    for g in world_groups.values():
+        if g["names"] == WORLD_BOSSES:
+            b = g["boss"]
+            plan[alert_key(t.key, WORLD_GROUP, b, 5)] = {"kind": "world", "tenant": t, "boss": b, "th_min": 5,
+                                                         "fire_ts": b.epoch - 5 * 60}
+            for lead in subscriptions.leads(t.key, b, world=True):
+                plan[alert_key(t.key, WORLD_GROUP, b, -lead)] = {"kind": "world", "tenant": t, "boss": b, "th_min": lead,
+                                                                 "fire_ts": b.epoch - lead * 60, "dm": True}
+
+    # รายตัว 60/30/5 (ยกเว้นเวิลด์บอส) + DM 1 entry ต่อเวลาล่วงหน้าที่มีคนติดตาม (รายชื่อคนดูตอนส่งจริง)
+    for b in bosses:
+        if b.world:
+            continue
+        for th_min in ALERT_THRESHOLDS_MIN:
+            plan[alert_key(t.key, b.name, b, th_min)] = {"kind": "boss", "tenant": t, "boss": b, "th_min": th_min,
+                                                         "fire_ts": b.epoch - th_min * 60}
+        for lead in subscriptions.leads(t.key, b):
+            plan[alert_key(t.key, b.name, b, -lead)] = {"kind": "boss", "tenant": t, "boss": b, "th_min": lead,
+                                                        "fire_ts": b.epoch - lead * 60, "dm": True}
+    return plan
+
+def render_alert(e: dict) -> dict:
+    """แปลง entry แจ้งเตือนเป็นข้อความ: {"title", "desc", "mention" (ข้อความแท็กยศ/None), "log"}"""
+    t, b, th_min = e["tenant"], e["boss"], e["th_min"]
+    if e["kind"] == "world":
+        return {
+            "title": f"{WORLD_EMOJI} Worldboss: ลาตัน, พาร์โต, เนดร้า",
+            "desc": f"⏰ จะเกิดในอีก {th_min} นาที",
+            "mention": t.mention,
+            "log": f"{t.tag}[WorldBoss] แจ้งรวม T-5m",
+        }
+    spawn_dt = b.spawn_dt
+    desc = []
+    if b.location: desc.append(f"📍 {b.location}")
+    desc.append(f"🕘 รอบต่อไป: {spawn_dt.strftime('%H:%M')} ({weekday_th(spawn_dt)} {spawn_dt.strftime('%d/%m')})")
+    desc.append(f"⏰ แจ้งเตือนล่วงหน้า {th_min} นาที")
+    return {
+        "title": f"📅 ตารางแน่นอน: {b.name}" + (f" Lv.{b.level}" if b.level else ""),
+        "desc": "\n".join(desc),
+        "mention": t.mention if th_min == 5 else None,
+        "log": f"{t.tag}[{b.ws}] แจ้ง {b.name} T-{th_min}m",
+    }
 
-            header = rows[0]
-            col = build_col_idx(header)
-            log(f"[DEBUG] ใช้แท็บ: {ws_name}")
-            log(f"[DEBUG] header: {header}")
-            log(f"[DEBUG] colmap: {col}")
-
-            def cell(row, key):
-                idx = col.get(key)
-                if idx is None or idx >= len(row):
-                    return ""
-                return row[idx]
-
-            # ข้ามหัวตารางแถวแรก
-            for r in rows[1:]:
-                name = (cell(r, "name") or "").strip()
-                if not name or name in BAD_TOKENS:
-                    continue
+async def fire_alert(key: tuple, e: dict):
+    """ส่งแจ้งเตือน 1 รายการเข้าคิวของห้องตาม tenant (กันซ้ำด้วย alerted)"""
+    if key in alerted or not alerted.add(key):
+        METRICS.inc("l9_alerts_deduped_total")
+        return
+    if e.get("dm"):
+        users = subscriptions.users(e["tenant"].key, e["boss"], e["th_min"], world=e["kind"] == "world")
+        dm_fanout.submit(users, render_alert(e))
+        return
+    alert_dispatcher.submit(e["tenant"].channel_for(e["boss"].ws), render_alert(e))
 
-                # worldboss ถูกคำนวณจาก fixed_bosses_next แล้ว — ข้ามเพื่อกันซ้ำ
-                if is_world_boss(name):
+def pack_embeds(items: List[dict]) -> List[List[discord.Embed]]:
+    """
+    รวมแจ้งเตือนเป็นข้อความให้น้อยที่สุด: 1 รายการ = embed หน้าตาเดิม
+    หลายรายการ = 1 field ต่อรายการ (≤25 field/embed, ≤10 embed และ ≤6000 ตัวอักษร/ข้อความ)
+    """
+    if len(items) == 1:
+        it = items[0]
+        return [[discord.Embed(title=it["title"], description=it["desc"], color=DEFAULT_EMBED_COLOR)]]
+
+    messages, embeds, chars = [], [], 0
+    embed = None
+    for it in items:
+        name, value = it["title"][:256], it["desc"][:1024]
+        size = len(name) + len(value)
+        if embed is None or len(embed.fields) >= EMBED_MAX_FIELDS or chars + size > MESSAGE_MAX_CHARS:
+            if embeds and (len(embeds) >= MESSAGE_MAX_EMBEDS or chars + size > MESSAGE_MAX_CHARS):
+                messages.append(embeds)
+                embeds, chars = [], 0
+            embed = discord.Embed(color=DEFAULT_EMBED_COLOR)
+            if not embeds:
+                embed.title = f"⏰ แจ้งเตือนบอส {len(items)} รายการ"
+                chars += len(embed.title)
+            embeds.append(embed)
+        embed.add_field(name=name, value=value, inline=False)
+        chars += size
+    if embeds:
+        messages.append(embeds)
+    return messages
+
+DISPATCH_STATS = {"alerts": 0, "messages": 0, "rate_limited": 0, "errors": 0}
+
+class AlertDispatcher:
+    """
+    คิวส่งข้อความต่อห้อง: รอ DISPATCH_COALESCE_SEC เพื่อรวมแจ้งเตือนที่มาใกล้กันเป็นข้อความเดียว
+    cache channel object และเว้นจังหวะตาม CHANNEL_SEND_RATE กันโดน 429
+    """
+
+    def __init__(self):
+        self._queues = {}     # channel_id → asyncio.Queue
+        self._workers = {}    # channel_id → Task
+        self._channels = {}   # channel_id → channel (resolve ครั้งเดียว)
+        self._sent = {}       # channel_id → deque เวลาส่งล่าสุด
+
+    def submit(self, channel_id: int, item: dict):
+        q = self._queues.get(channel_id)
+        if q is None:
+            q = self._queues[channel_id] = asyncio.Queue()
+        w = self._workers.get(channel_id)
+        if w is None or w.done():
+            self._workers[channel_id] = asyncio.create_task(self._worker(channel_id, q))
+        q.put_nowait(item)
+
+    async def channel(self, channel_id: int):
+        ch = self._channels.get(channel_id) or bot.get_channel(channel_id)
+        if ch is None:
+            ch = await bot.fetch_channel(channel_id)
+        self._channels[channel_id] = ch
+        return ch
+
+    async def pace(self, channel_id: int):
+        """รอให้อยู่ในโควตาส่ง/แก้ข้อความของห้อง (ใช้ร่วมกับบอร์ด)"""
+        n, per = CHANNEL_SEND_RATE
+        sent = self._sent.setdefault(channel_id, deque(maxlen=n))
+        if len(sent) == n:
+            wait = per - (time.monotonic() - sent[0])
+            if wait > 0:
+                await asyncio.sleep(wait)
+        sent.append(time.monotonic())
+
+    async def _worker(self, channel_id: int, q: asyncio.Queue):
+        while True:
+            batch = [await q.get()]
+            await asyncio.sleep(DISPATCH_COALESCE_SEC)
+            while not q.empty():
+                batch.append(q.get_nowait())
+            # แยกชุดที่ต้องแท็กยศ (T-5) กับชุดเงียบ
+            mentions = sorted({it["mention"] for it in batch}, key=lambda m: m is None)
+            for mention in mentions:
+                items = [it for it in batch if it["mention"] == mention]
+                if not items:
+                    continue
+                for embeds in pack_embeds(items):
+                    await self._send(channel_id, embeds, mention)
+                for it in items:
+                    log(it["log"])
+                DISPATCH_STATS["alerts"] += len(items)
+
+    async def _send(self, channel_id: int, embeds: List[discord.Embed], mention: Optional[str]) -> bool:
+        content = mention
+        for attempt in range(3):
+            await self.pace(channel_id)
+            try:
+                ch = await self.channel(channel_id)
+                with METRICS.timer("l9_discord_send_seconds"):
+                    await ch.send(content=content, embeds=embeds)
+                DISPATCH_STATS["messages"] += 1
+                return True
+            except discord.HTTPException as ex:
+                if ex.status == 429:
+                    DISPATCH_STATS["rate_limited"] += 1
+                    await asyncio.sleep(getattr(ex, "retry_after", None) or 2 ** attempt)
                     continue
+                DISPATCH_STATS["errors"] += 1
+                log(f"[ERROR] ส่งแจ้งเตือนห้อง {channel_id}: {ex}")
+                return False
+            except Exception as ex:
+                self._channels.pop(channel_id, None)
+                DISPATCH_STATS["errors"] += 1
+                log(f"[ERROR] ส่งแจ้งเตือนห้อง {channel_id}: {ex}")
+                return False
+        log(f"[ERROR] ส่งแจ้งเตือนห้อง {channel_id}: โดน rate limit ซ้ำ")
+        return False
 
-                level     = (str(cell(r, "level")) or "").strip()
-                location  = (cell(r, "location") or "").strip()
-                sp_type   = (str(cell(r, "spawn_type")) or "").strip().lower()
-                detail    = (cell(r, "spawn_detail") or "").strip()
-                raw_date  = cell(r, "date_spawn")
-                raw_next  = cell(r, "next_spawn")
-                kill_dt   = parse_kill_dt(cell(r, "kill_dt"))
-
-                d  = parse_gsheet_date(raw_date)
-                t  = parse_time_of_day(raw_next)
-                dt = None
-
-                if sp_type == "fixed":
-                    # fixed: ใช้คู่วัน/เวลาใน spawn_detail
-                    pairs = parse_weekly_pairs(detail)
-                    cands = []
-                    for day_th, hhmm in pairs:
-                        tm = parse_time_of_day(hhmm)
-                        if not tm:
-                            continue
-                        cands.append(next_from_weekday_time(day_th, tm[0], tm[1], now_dt))
-                    if cands:
-                        dt = min(cands)
-
-                elif sp_type == "interval":
-                    # interval: ใช้ next_spawn + date_spawn เป็นหลัก
-                    m = HOURS_RE.search(detail or "")
-                    hours = int(m.group(1)) if m else None
-
-                    if d and t:
-                        cand = tz.localize(datetime(d.year, d.month, d.day, t[0], t[1], t[2]))
-                        # ถ้า cand ใกล้ kill_dt หรือ cand ย้อนอดีต → fallback เป็น kill_dt + ชั่วโมง
-                        if ((kill_dt and near_same_minute(cand, kill_dt)) or cand <= now_dt) and hours:
-                            dt = compute_next_interval(kill_dt, hours, now_dt)
-                        else:
-                            dt = cand
-
-                    elif t and not d:
-                        cand = tz.localize(datetime(now_dt.year, now_dt.month, now_dt.day, t[0], t[1], t[2]))
-                        if cand <= now_dt:
-                            cand += timedelta(days=1)
-                        if kill_dt and near_same_minute(cand, kill_dt) and hours:
-                            dt = compute_next_interval(kill_dt, hours, now_dt)
-                        else:
-                            dt = cand
-
-                    # ถ้ายังไม่มี dt และมี kill_dt+hours → ใช้เป็น fallback
-                    if dt is None and hours and kill_dt:
-                        dt = compute_next_interval(kill_dt, hours, now_dt)
+alert_dispatcher = AlertDispatcher()
 
-                else:
-                    # ประเภทอื่น: ถ้ามี date+time ก็ใช้เลย
-                    if d and t:
-                        dt = tz.localize(datetime(d.year, d.month, d.day, t[0], t[1], t[2]))
-                    elif t and not d:
-                        cand = tz.localize(datetime(now_dt.year, now_dt.month, now_dt.day, t[0], t[1], t[2]))
-                        if cand <= now_dt:
-                            cand += timedelta(days=1)
-                        dt = cand
-
-                # กรองค่าไม่ได้/ย้อนหลัง
-                if not dt or dt <= now_dt:
-                    continue
+class AlertScheduler:
+    """
+    คิวแจ้งเตือนแบบ min-heap ตามเวลาส่งจริง — หลับจนถึงรายการถัดไปพอดี
+    ตัวเดียวรวมทุก tenant (key[0] = tenant) — sync() เทียบแผนใหม่ของ tenant กับของเดิม แล้วเพิ่ม/ลบเฉพาะที่เปลี่ยน
+    """
+
+    def __init__(self):
+        self._heap = []       # (fire_ts, seq, key) — รายการที่ถูกแทน/ลบจะถูกทิ้งตอน pop
+        self._entries = {}    # tenant key → {key → entry ที่ยังรอส่ง}
+        self._seq = itertools.count()
+        self._wake = asyncio.Event()
+        self._task = None
+
+    def __len__(self):
+        return sum(map(len, self._entries.values()))
+
+    def sync(self, t: "Tenant", bosses: List[Boss], now_dt: datetime) -> int:
+        """อัปเดตคิวของ tenant จากรายการบอสล่าสุด คืนจำนวนรายการที่ถูกเพิ่ม/ลบ/เลื่อน"""
+        plan = plan_alerts(t, bosses)
+        now_ts = now_dt.timestamp()
+        entries = self._entries.setdefault(t.key, {})
+        changed = 0
+        for key in [k for k in entries if k not in plan]:
+            del entries[key]
+            changed += 1
+
+        for key, e in plan.items():
+            changed += self._put(key, e, now_ts)
+
+        if changed:
+            self._wake.set()
+        return changed
+
+    def _put(self, key: tuple, e: dict, now_ts: float) -> int:
+        if key in alerted:
+            return 0
+        if now_ts - e["fire_ts"] > ALERT_WINDOW_SEC:
+            return 0   # เลยจุดแจ้งเตือนไปนานแล้ว
+        entries = self._entries.setdefault(key[0], {})
+        cur = entries.get(key)
+        if cur is not None and cur["fire_ts"] == e["fire_ts"]:
+            cur.update(e)   # เวลาเดิม แค่ level/location อาจเปลี่ยน
+            return 0
+        entries[key] = e
+        heapq.heappush(self._heap, (e["fire_ts"], next(self._seq), key))
+        return 1
+
+    def on_timeline(self, t: "Tenant", events: List[TimelineEvent]):
+        """
+        listener ของไทม์ไลน์ tenant: แก้คิวเฉพาะรอบของแถวที่เปลี่ยน (ในช่วง ALERT_LOOKAHEAD)
+        "reset" (แทนทั้งชีต) → sync ทั้งช่วงของ tenant นั้นแทน
+        """
+        now_dt = clock.now()
+        if any(ev.kind == "reset" for ev in events):
+            resync_alerts(t, now_dt)
+            return
+        now_ts = now_dt.timestamp()
+        end_ts = now_ts + ALERT_LOOKAHEAD.total_seconds()
+        in_window = lambda attr: [b for ev in events for b in getattr(ev, attr) if now_ts <= b.epoch < end_ts]
+        old, new = plan_alerts(t, in_window("old")), plan_alerts(t, in_window("new"))
+
+        changed = 0
+        entries = self._entries.setdefault(t.key, {})
+        for key in old.keys() - new.keys():
+            _, name, minute, _ = key
+            if t.timeline.has_spawn(name, minute):
+                continue   # รอบเดียวกันยังมีจาก src อื่น
+            if entries.pop(key, None) is not None:
+                changed += 1
+        for key, e in new.items():
+            changed += self._put(key, e, now_ts)
+        if changed:
+            log(f"[SCHED] {t.tag}แถวชีตเปลี่ยน → คิวเปลี่ยน {changed} รายการ (รอส่ง {len(self)})")
+            self._wake.set()
+
+    def _pop_due(self, now_ts: float) -> list:
+        due = []
+        while self._heap and self._heap[0][0] <= now_ts:
+            ts, _, key = heapq.heappop(self._heap)
+            entries = self._entries.get(key[0], {})
+            e = entries.get(key)
+            if e is None or e["fire_ts"] != ts:
+                continue
+            del entries[key]
+            if now_ts - ts <= ALERT_WINDOW_SEC:   # loop ค้างนานเกิน → ถือว่าพลาดรอบ
+                due.append((key, e))
+        return due
+
+    def _next_ts(self) -> Optional[float]:
+        while self._heap:
+            ts, _, key = self._heap[0]
+            e = self._entries.get(key[0], {}).get(key)
+            if e is not None and e["fire_ts"] == ts:
+                return ts
+            heapq.heappop(self._heap)
+        return None
+
+    async def run(self):
+        while True:
+            self._wake.clear()
+            timeout = SCHED_MAX_SLEEP_SEC
+            if not lease.leader():
+                # standby: คิวอุ่นไว้แต่ไม่ส่ง ทิ้งเฉพาะที่เลยหน้าต่างไปแล้ว ที่เหลือส่งตอนรับช่วง (lease ปลุก _wake)
+                self._pop_due(clock.time() - ALERT_WINDOW_SEC)
+                nxt = None
+            else:
+                for key, e in self._pop_due(clock.time()):
+                    try:
+                        await fire_alert(key, e)
+                    except Exception as ex:
+                        log(f"[ERROR] scheduler ส่ง {key}: {ex}")
+                nxt = self._next_ts()
+            if nxt is not None:
+                timeout = min(timeout, max(0.0, nxt - clock.time()))
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run())
+
+alert_scheduler = AlertScheduler()
+
+# ========= ติดตามบอสรายคน (!sub → DM) =========
+class Subscription(NamedTuple):
+    id: int
+    tenant: str
+    user_id: int
+    kind: str        # "name" | "level" | "world"
+    name: str        # kind == "name"
+    lv_min: int      # kind == "level" (รวมปลายทั้งสองข้าง)
+    lv_max: int
+    lead_min: int    # DM ก่อนเกิดกี่นาที
+
+def boss_level(b: Boss) -> Optional[int]:
+    lv = b.level.strip()
+    return int(lv) if lv.isdigit() else None
+
+class SubscriptionStore:
+    """
+    การติดตามของแต่ละคน (SQLite ไฟล์เดียวกับ ledger) + index ในหน่วยความจำตามบอส:
+    (tenant, ชื่อ) / tenant (เวิลด์บอส) → {เวลาล่วงหน้า: Counter(user_id)}
+    หาผู้รับของแจ้งเตือน 1 จุด = O(จำนวนคนที่ติดตามบอสนั้น) ไม่ต้องไล่ทุก subscription
+    ช่วงเลเวลเก็บเป็นช่วงเดียว (ไม่แตกรายเลเวล) ต่อ (tenant, เวลาล่วงหน้า) เรียงตาม lv_min
+    → หน่วยความจำไม่ขึ้นกับความกว้างของช่วง หาผู้รับไล่เฉพาะช่วงที่เริ่มไม่เกินเลเวลของบอส
+    """
+
+    def __init__(self, path: str):
+        try:
+            self._db = sqlite3.connect(path)
+        except sqlite3.Error:
+            self._db = sqlite3.connect(":memory:")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS subscriptions ("
+            " id INTEGER PRIMARY KEY, tenant TEXT NOT NULL, user_id INTEGER NOT NULL, kind TEXT NOT NULL,"
+            " name TEXT NOT NULL DEFAULT '', lv_min INTEGER NOT NULL DEFAULT 0, lv_max INTEGER NOT NULL DEFAULT 0,"
+            " lead_min INTEGER NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS subscriptions_by_boss ON subscriptions (tenant, kind, name)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS subscriptions_by_user ON subscriptions (tenant, user_id)")
+        self._subs = {}       # id → Subscription
+        self._index = {}      # ("name", tenant, ชื่อ) | ("world", tenant) → {lead: Counter(user_id)}
+        self._levels = {}     # tenant → {lead: [(lv_min, lv_max, user_id, id)] เรียงตาม lv_min}
+        for row in self._db.execute("SELECT id, tenant, user_id, kind, name, lv_min, lv_max, lead_min FROM subscriptions"):
+            self._link(Subscription(*row))
+
+    def __len__(self):
+        return len(self._subs)
+
+    @staticmethod
+    def _slots(s: Subscription) -> list:
+        if s.kind == "name":
+            return [("name", s.tenant, s.name)]
+        return [("world", s.tenant)]
+
+    def _link(self, s: Subscription):
+        self._subs[s.id] = s
+        if s.kind == "level":
+            bisect.insort(self._levels.setdefault(s.tenant, {}).setdefault(s.lead_min, []),
+                          (s.lv_min, s.lv_max, s.user_id, s.id))
+            return
+        for slot in self._slots(s):
+            self._index.setdefault(slot, {}).setdefault(s.lead_min, Counter())[s.user_id] += 1
+
+    def _unlink(self, s: Subscription):
+        del self._subs[s.id]
+        if s.kind == "level":
+            by_lead = self._levels[s.tenant]
+            by_lead[s.lead_min].remove((s.lv_min, s.lv_max, s.user_id, s.id))
+            if not by_lead[s.lead_min]:
+                del by_lead[s.lead_min]
+            if not by_lead:
+                del self._levels[s.tenant]
+            return
+        for slot in self._slots(s):
+            by_lead = self._index[slot]
+            users = by_lead[s.lead_min]
+            users[s.user_id] -= 1
+            if users[s.user_id] <= 0:
+                del users[s.user_id]
+            if not users:
+                del by_lead[s.lead_min]
+            if not by_lead:
+                del self._index[slot]
+
+    def _boss_slots(self, tenant: str, b: Boss, world: bool) -> list:
+        if world:
+            return [self._index.get(("world", tenant))]
+        return [self._index.get(("name", tenant, b.name))]
+
+    def _level_users(self, tenant: str, b: Boss, lead_min: int):
+        """user_id ที่ติดตามช่วงเลเวลที่ครอบบอสนี้ (ซ้ำได้ถ้าคนเดียวมีหลายช่วง)"""
+        lv = boss_level(b)
+        ivs = self._levels.get(tenant, {}).get(lead_min) if lv is not None else None
+        if not ivs:
+            return
+        for _, hi, uid, _ in itertools.islice(ivs, bisect.bisect_right(ivs, (lv, float("inf")))):
+            if hi >= lv:
+                yield uid
+
+    def leads(self, tenant: str, b: Boss, world: bool = False) -> set:
+        """เวลาล่วงหน้า (นาที) ที่มีคนติดตามรอบนี้ — plan_alerts เรียกทุกรอบต่อบอสในช่วง lookahead จึงต้องถูก"""
+        out = set()
+        for by_lead in self._boss_slots(tenant, b, world):
+            if by_lead:
+                out.update(by_lead)
+        if not world:
+            out.update(lead for lead in self._levels.get(tenant, ())
+                       if lead not in out and any(self._level_users(tenant, b, lead)))
+        return out
+
+    def users(self, tenant: str, b: Boss, lead_min: int, world: bool = False) -> set:
+        """user_id ที่ต้อง DM สำหรับรอบนี้ที่เวลาล่วงหน้านี้ (ติดตามทั้งชื่อและเลเวล → ได้ครั้งเดียว)"""
+        out = set()
+        for by_lead in self._boss_slots(tenant, b, world):
+            if by_lead and lead_min in by_lead:
+                out.update(by_lead[lead_min])
+        if not world:
+            out.update(self._level_users(tenant, b, lead_min))
+        return out
+
+    def for_user(self, tenant: str, user_id: int) -> List[Subscription]:
+        return sorted((s for s in self._subs.values() if s.tenant == tenant and s.user_id == user_id),
+                      key=operator.attrgetter("id"))
+
+    def add(self, tenant: str, user_id: int, kind: str, name: str = "", lv_min: int = 0, lv_max: int = 0,
+            lead_min: int = SUB_DEFAULT_LEAD_MIN) -> Subscription:
+        with self._db:
+            cur = self._db.execute(
+                "INSERT INTO subscriptions (tenant, user_id, kind, name, lv_min, lv_max, lead_min) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (tenant, user_id, kind, name, lv_min, lv_max, lead_min))
+        s = Subscription(cur.lastrowid, tenant, user_id, kind, name, lv_min, lv_max, lead_min)
+        self._link(s)
+        return s
+
+    def remove(self, tenant: str, user_id: int, ids: Optional[set] = None) -> int:
+        """ลบการติดตามของคนนี้ (ids=None → ทั้งหมด) คืนจำนวนที่ลบ"""
+        gone = [s for s in self.for_user(tenant, user_id) if ids is None or s.id in ids]
+        if gone:
+            with self._db:
+                self._db.executemany("DELETE FROM subscriptions WHERE id = ?", [(s.id,) for s in gone])
+            for s in gone:
+                self._unlink(s)
+        return len(gone)
+
+subscriptions: Optional[SubscriptionStore] = None   # open_stores()
+
+DM_STATS = {"alerts": 0, "queued": 0, "messages": 0, "rate_limited": 0, "forbidden": 0, "errors": 0, "dropped": 0}
+
+class DMFanout:
+    """
+    ส่ง DM ผู้ติดตาม: คิวเดียว (จำกัด DM_QUEUE_MAX คน) + worker DM_CONCURRENCY ตัว เว้นจังหวะรวมตาม DM_SEND_RATE
+    แยกจาก alert_dispatcher ทั้งคิวและโควตา → คนติดตามหลักพันไม่ทำให้แจ้งเตือนห้องช้า
+    คนเดียวมีหลายรายการที่รอส่งอยู่ → รวมเป็นข้อความเดียว (pack_embeds)
+    ปิดรับ DM (403) → ข้ามคนนั้นจนรีสตาร์ท
+    """
 
-                k = f"{name}|{dt.strftime('%Y%m%d%H%M')}"
-                if k in seen:
+    def __init__(self):
+        self._queue = None      # asyncio.Queue ของ user_id (สร้างตอนใช้ครั้งแรกบน loop)
+        self._pending = {}      # user_id → [item] ที่รอส่ง
+        self._workers = []
+        self._channels = {}     # user_id → DMChannel
+        self._blocked = set()
+        self._sent = deque(maxlen=DM_SEND_RATE[0])
+        self._pace_lock = None
+
+    def __len__(self):
+        return len(self._pending)
+
+    def submit(self, user_ids, item: dict):
+        DM_STATS["alerts"] += 1
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=DM_QUEUE_MAX)
+            self._pace_lock = asyncio.Lock()
+        for uid in user_ids:
+            if uid in self._blocked:
+                continue
+            items = self._pending.get(uid)
+            if items is not None:
+                items.append(item)
+                continue
+            try:
+                self._queue.put_nowait(uid)
+            except asyncio.QueueFull:
+                DM_STATS["dropped"] += 1
+                continue
+            self._pending[uid] = [item]
+            DM_STATS["queued"] += 1
+        self._workers = [w for w in self._workers if not w.done()]
+        while len(self._workers) < DM_CONCURRENCY and self._pending:
+            self._workers.append(asyncio.create_task(self._worker()))
+
+    async def _worker(self):
+        while True:
+            uid = await self._queue.get()
+            items = self._pending.pop(uid, [])
+            for embeds in pack_embeds(items):
+                if not await self._send(uid, embeds):
+                    break
+
+    async def pace(self):
+        n, per = DM_SEND_RATE
+        async with self._pace_lock:
+            if len(self._sent) == n:
+                wait = per - (time.monotonic() - self._sent[0])
+                if wait > 0:
+                    await asyncio.sleep(wait)
+            self._sent.append(time.monotonic())
+
+    async def channel(self, user_id: int):
+        ch = self._channels.get(user_id)
+        if ch is None:
+            user = bot.get_user(user_id) or await bot.fetch_user(user_id)
+            ch = self._channels[user_id] = user.dm_channel or await user.create_dm()
+        return ch
+
+    async def _send(self, user_id: int, embeds: List[discord.Embed]) -> bool:
+        for attempt in range(3):
+            await self.pace()
+            try:
+                ch = await self.channel(user_id)
+                with METRICS.timer("l9_dm_send_seconds"):
+                    await ch.send(embeds=embeds)
+                DM_STATS["messages"] += 1
+                return True
+            except discord.Forbidden:
+                self._blocked.add(user_id)
+                DM_STATS["forbidden"] += 1
+                log(f"[DEBUG] DM ผู้ใช้ {user_id} ไม่ได้ (ปิดรับ DM) — ข้ามจนรีสตาร์ท")
+                return False
+            except discord.HTTPException as ex:
+                if ex.status == 429:
+                    DM_STATS["rate_limited"] += 1
+                    await asyncio.sleep(getattr(ex, "retry_after", None) or 2 ** attempt)
                     continue
-                seen.add(k)
-                bosses.append((ws_name, name, dt, level, location))
-            break
+                DM_STATS["errors"] += 1
+                log(f"[ERROR] DM ผู้ใช้ {user_id}: {ex}")
+                return False
+            except Exception as ex:
+                self._channels.pop(user_id, None)
+                DM_STATS["errors"] += 1
+                log(f"[ERROR] DM ผู้ใช้ {user_id}: {ex}")
+                return False
+        log(f"[ERROR] DM ผู้ใช้ {user_id}: โดน rate limit ซ้ำ")
+        return False
 
-        except Exception as e:
-            log(f"[ERROR] อ่าน '{ws_name}' ล้มเหลวครั้งที่ {i+1}: {e}")
-            time.sleep(2)
+dm_fanout = DMFanout()
 
-    bosses.sort(key=lambda x: x[2])
-    log(f"โหลด {len(bosses)} รายการ จากแท็บ: ['{ws_name}', 'Fixed']")
-    return bosses
+# ========= Tenants (หลายกิลด์/หลายชีต ในโปรเซสเดียว) =========
+class Tenant:
+    """
+    กิลด์ 1 กิลด์: ไฟล์ชีต แท็บ ห้อง และยศของตัวเอง + ไทม์ไลน์ breaker และรอบโพลแยกกัน
+    ใช้ร่วมกันทั้งโปรเซส: sheet_session (auth/connection pool), sheet_quota, alert_scheduler, alerted, alert_dispatcher,
+    subscriptions (คีย์ด้วย tenant), dm_fanout
+    """
+
+    def __init__(self, key: str, guild_id: Optional[int] = None, spreadsheet_id: str = "",
+                 worksheet: str = PRIMARY_WS, fallback_worksheet: str = FALLBACK_WS,
+                 channel_id: int = CHANNEL_ID_DEFAULT, channels: Optional[dict] = None,
+                 roles: tuple = (ROLE_ID_1, ROLE_ID_2)):
+        self.key = sys.intern(str(key))
+        self.guild_id = int(guild_id) if guild_id else None
+        self.spreadsheet_id = spreadsheet_id
+        self.primary_ws = worksheet
+        self.fallback_ws = fallback_worksheet
+        self.channel_id = int(channel_id)
+        self.channel_map = {ws: int(cid) for ws, cid in (channels or {}).items()}   # แท็บ/"Fixed" → ห้อง
+        self.mention = " ".join(f"<@&{r}>" for r in roles) or None
+        self.tag = ""   # "[key] " นำหน้า log เมื่อมีหลาย tenant
+        self.timeline = SpawnTimeline()
+        self.breaker = CircuitBreaker(SHEET_BREAKER_FAILURES, SHEET_BREAKER_BASE_SEC, SHEET_BREAKER_MAX_SEC,
+                                      ss_id=spreadsheet_id)
+        # รอบการอ่านชีตเต็ม — มี webhook แล้วอ่านแค่ทุก SHEET_RECONCILE_SEC (หรือเมื่อถูกบังคับ)
+        self.poll = {"last": None, "force": False}
+        self.last_sheet_ok = None   # epoch ที่อ่านชีตสำเร็จล่าสุด
+        self.webhook_edits = 0      # จำนวนครั้งที่ webhook แก้ไทม์ไลน์ของ tenant นี้ (refresh_sheet ใช้ตรวจว่าอ่านชนกับ webhook)
+        self._snapshot = None
+        self._feed = None
+        self.timeline.listen(functools.partial(alert_scheduler.on_timeline, self))
+
+    def __repr__(self):
+        return f"Tenant({self.key!r})"
+
+    def channel_for(self, ws: str) -> int:
+        return self.channel_map.get(ws, self.channel_id)
+
+    def channels(self) -> set:
+        return set(self.channel_map.values()) | {self.channel_id}
+
+    @property
+    def snapshot(self) -> "BossSnapshot":
+        if self._snapshot is None:
+            self._snapshot = BossSnapshot(self)
+        return self._snapshot
+
+    @property
+    def feed(self) -> "ScheduleFeed":
+        if self._feed is None:
+            self._feed = ScheduleFeed(self)
+        return self._feed
+
+    def health(self) -> dict:
+        return {
+            "guild_id": self.guild_id,
+            "spreadsheet_id": self.spreadsheet_id,
+            "worksheet": WS_CACHE.get(self.key, {}).get("title", self.primary_ws),
+            "last_sheet_ok_age_sec": _age(self.last_sheet_ok),
+            "stale": sheet_is_stale(self),
+            "breaker": self.breaker.state,
+            "consecutive_failures": self.breaker.failures,
+            "retry_in_sec": self.breaker.retry_in(),
+            "rows": len(self.timeline.sheet_rows or ()),
+        }
+
+def _is_id(v) -> bool:
+    return (isinstance(v, int) and not isinstance(v, bool)) or (isinstance(v, str) and v.isdigit())
+
+# คีย์ของแถวใน TENANTS_FILE → (ต้องมี, ตรวจค่า, คำอธิบายที่แสดงเมื่อผิด)
+TENANT_ROW_KEYS = {
+    "key":                (True,  lambda v: isinstance(v, str) and v.strip() != "", "ข้อความไม่ว่าง"),
+    "spreadsheet_id":     (True,  lambda v: isinstance(v, str) and v.strip() != "", "ข้อความไม่ว่าง"),
+    "guild_id":           (False, lambda v: v is None or _is_id(v), "ไอดีตัวเลข"),
+    "worksheet":          (False, lambda v: isinstance(v, str), "ข้อความ"),
+    "fallback_worksheet": (False, lambda v: isinstance(v, str), "ข้อความ"),
+    "channel_id":         (False, _is_id, "ไอดีตัวเลข"),
+    "channels":           (False, lambda v: isinstance(v, dict) and all(_is_id(c) for c in v.values()),
+                           '{"ชื่อแท็บ": ไอดีห้อง}'),
+    "roles":              (False, lambda v: isinstance(v, list) and all(_is_id(r) for r in v), "list ของไอดียศ"),
+}
 
+def tenant_from_row(i: int, row) -> Tenant:
+    """ตรวจแถวของ TENANTS_FILE ก่อนสร้าง Tenant — ผิด → RuntimeError บอกแถว/tenant และคีย์ที่ผิด"""
+    if not isinstance(row, dict):
+        raise RuntimeError(f"TENANTS_FILE แถวที่ {i + 1} ต้องเป็น object ได้ {type(row).__name__}")
+    name = f"แถวที่ {i + 1}" + (f" ({row['key']!r})" if "key" in row else "")
+    unknown = sorted(set(row) - set(TENANT_ROW_KEYS))
+    if unknown:
+        raise RuntimeError(f"TENANTS_FILE {name}: ไม่รู้จักคีย์ {', '.join(unknown)}")
+    for k, (required, ok, expect) in TENANT_ROW_KEYS.items():
+        if k not in row:
+            if required:
+                raise RuntimeError(f"TENANTS_FILE {name}: ไม่มีคีย์ '{k}'")
+        elif not ok(row[k]):
+            raise RuntimeError(f"TENANTS_FILE {name}: '{k}' ต้องเป็น{expect} ได้ {row[k]!r}")
+    return Tenant(**row)
+
+def load_tenants() -> List[Tenant]:
+    """
+    TENANTS_FILE = JSON list แถวละ 1 กิลด์ (เพิ่มกิลด์ = เพิ่มแถว ไม่ต้องเพิ่มโปรเซส) เช่น
+      [{"key": "l9", "guild_id": 123, "spreadsheet_id": "1Ps_...", "worksheet": "boss_timer",
+        "channel_id": 456, "channels": {"Fixed": 789}, "roles": [111, 222]}]
+    ไม่ตั้ง → tenant เดียว (DEFAULT_TENANT) จาก SPREADSHEET_ID / CHANNEL_ID_DEFAULT / SHEET_CHANNEL_MAP / ROLE_ID_*
+    """
+    if not TENANTS_FILE:
+        return [Tenant(DEFAULT_TENANT, spreadsheet_id=SPREADSHEET_ID, channels=SHEET_CHANNEL_MAP)]
+    with open(TENANTS_FILE, encoding="utf-8") as f:
+        rows = json.load(f)
+    if not isinstance(rows, list):
+        raise RuntimeError(f"TENANTS_FILE ต้องเป็น JSON list ได้ {type(rows).__name__}")
+    tenants = [tenant_from_row(i, row) for i, row in enumerate(rows)]
+    keys = [t.key for t in tenants]
+    guilds = [t.guild_id for t in tenants if t.guild_id]
+    if not tenants or len(set(keys)) != len(keys) or len(set(guilds)) != len(guilds):
+        raise RuntimeError(f"TENANTS_FILE ต้องมีอย่างน้อย 1 แถว และ key/guild_id ห้ามซ้ำ: {keys}")
+    if len(tenants) > 1:
+        for t in tenants:
+            t.tag = t.breaker.tag = f"[{t.key}] "
+    return tenants
+
+TENANTS = load_tenants()
+
+def tenant_for(guild) -> Optional[Tenant]:
+    """tenant ของกิลด์ (รับ Guild หรือ id) — มี tenant เดียวที่ไม่ผูกกิลด์ → ใช้ตัวนั้นกับทุกกิลด์"""
+    gid = getattr(guild, "id", guild)
+    for t in TENANTS:
+        if t.guild_id == gid and gid is not None:
+            return t
+    if len(TENANTS) == 1 and TENANTS[0].guild_id is None:
+        return TENANTS[0]
+    return None
 
+def tenant_for_channel(channel_id: int) -> Optional[Tenant]:
+    for t in TENANTS:
+        if channel_id in t.channels():
+            return t
+    return None
 
-# ========= วนลูปแจ้งเตือน =========
-alerted = set()
+# ========= Leader lease (หลาย replica ไม่แจ้งซ้ำ) =========
+LEASE_STATS = {"acquired": 0, "lost": 0, "errors": 0}
+
+class LeaderLease:
+    """
+    lease แถวเดียวใน SQLite ที่ทุก replica ใช้ร่วมกัน: (name, holder, expires, epoch)
+    ผู้ถือต่ออายุทุก LEASE_RENEW_SEC (หมดใน LEASE_TTL_SEC) — standby ลองยึดทุกรอบเดียวกัน ยึดได้เมื่อหมดอายุ/ถูกปล่อย
+    epoch เพิ่มทุกครั้งที่เปลี่ยนมือ (ไว้ดูใน /healthz ว่ารับช่วงกี่ครั้ง)
+    เวลาเป็นนาฬิกาจริง (time.time) เพราะเทียบข้ามโปรเซส ไม่ใช่ clock ที่ simulate.py ตรึงได้
+    path ว่าง → ปิด: เป็น leader เสมอ (ตัวเดียว/simulate.py)
+    lease กันงานซ้ำ (อ่านชีต แก้บอร์ด ตอบคำสั่ง) ส่วนแจ้งเตือนกันซ้ำอีกชั้นด้วย INSERT ใน ledger ไฟล์เดียวกัน (alerted.add)
+    """
+
+    def __init__(self, path: str, name: str = "alerts", ttl: int = LEASE_TTL_SEC):
+        self.path = path
+        self.name = name
+        self.ttl = ttl
+        self.holder = f"{socket.gethostname()}:{os.getpid()}:{random.getrandbits(32):08x}"
+        self.epoch = 0
+        self.held_until = 0.0
+        self.other = None     # (holder, expires) ของผู้ถือคนอื่นล่าสุดที่เห็น
+        self._task = None
+        self._db = None
+        if path:
+            self._db = sqlite3.connect(path, timeout=LEASE_RENEW_SEC, isolation_level=None, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS leases ("
+                " name TEXT PRIMARY KEY, holder TEXT NOT NULL, expires REAL NOT NULL, epoch INTEGER NOT NULL)"
+            )
+
+    def leader(self) -> bool:
+        # เผื่อ 1 วินาที: หยุดก่อน lease หมดจริง ไม่ทับช่วงที่อีกตัวเริ่มถือ
+        return self._db is None or time.time() < self.held_until - 1
+
+    def try_acquire(self) -> bool:
+        """(blocking) ต่อ/ยึด lease ในทรานแซกชันเดียว คืนว่าถืออยู่หรือไม่ — DB ใช้ไม่ได้ → ถือต่อได้แค่จนหมดอายุเดิม"""
+        if self._db is None:
+            return True
+        now = time.time()
+        try:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._db.execute("SELECT holder, expires, epoch FROM leases WHERE name = ?", (self.name,)).fetchone()
+                if row is None or row[0] == self.holder or row[1] <= now:
+                    epoch = (row[2] if row else 0) + (0 if row and row[0] == self.holder else 1)
+                    self._db.execute("INSERT OR REPLACE INTO leases VALUES (?, ?, ?, ?)",
+                                     (self.name, self.holder, now + self.ttl, epoch))
+                    self.held_until, self.epoch, self.other = now + self.ttl, epoch, None
+                else:
+                    self.held_until, self.epoch, self.other = 0.0, row[2], (row[0], row[1])
+            finally:
+                self._db.execute("COMMIT")
+        except sqlite3.Error as e:
+            LEASE_STATS["errors"] += 1
+            log(f"[WARN] lease: {e}")
+        return self.leader()
+
+    def release(self):
+        """ปล่อย lease ตอนปิด (SIGTERM) → standby รับช่วงในรอบถัดไปไม่ต้องรอหมดอายุ"""
+        if self._db is None or not self.held_until:
+            return
+        self.held_until = 0.0
+        try:
+            self._db.execute("UPDATE leases SET expires = 0 WHERE name = ? AND holder = ?", (self.name, self.holder))
+            log(f"[LEASE] ปล่อย lease '{self.name}' แล้ว")
+        except sqlite3.Error as e:
+            log(f"[WARN] ปล่อย lease ไม่สำเร็จ: {e}")
+
+    def status(self) -> dict:
+        return {
+            "leader": self.leader(),
+            "holder": self.holder if self.leader() else (self.other or (None,))[0],
+            "epoch": self.epoch,
+            "expires_in_sec": round((self.held_until if self.leader() else (self.other or (0, 0))[1]) - time.time(), 1)
+                              if self._db is not None else None,
+        }
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            was = self.leader()
+            # default executor ไม่ใช่ sheet_executor: อ่านชีตช้า/ค้างต้องไม่ทำให้ต่อ lease ไม่ทัน
+            now = await loop.run_in_executor(None, self.try_acquire)
+            if now and not was:
+                on_lease_acquired()
+            elif was and not now:
+                on_lease_lost()
+            await asyncio.sleep(LEASE_RENEW_SEC)
+
+    async def start(self):
+        """ลองยึดครั้งแรกก่อนเริ่มงาน (ตัวเดียว → เป็น leader ทันที) แล้วต่ออายุเบื้องหลัง"""
+        if self.try_acquire():
+            LEASE_STATS["acquired"] += 1
+            log(f"[LEASE] {self.holder} เป็น leader (epoch {self.epoch})")
+        elif self.other:
+            log(f"[LEASE] standby — leader คือ {self.other[0]}")
+        else:
+            log("[LEASE] standby — ไม่รู้ว่าใครเป็น leader (อ่าน lease ไม่ได้)")
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run())
+
+def on_lease_acquired():
+    """รับช่วงจาก replica อื่น: ledger โหลดใหม่ก่อนส่ง (ไม่ส่งซ้ำ) อ่านชีตทันที แล้วปลุก scheduler ที่คิวอุ่นไว้แล้ว"""
+    LEASE_STATS["acquired"] += 1
+    alerted.reload()
+    for t in TENANTS:
+        t.poll["force"] = True
+    alert_scheduler._wake.set()
+    log(f"[LEASE] {lease.holder} รับช่วงเป็น leader (epoch {lease.epoch}, รอส่ง {len(alert_scheduler)}, ledger {len(alerted)})")
+
+def on_lease_lost():
+    LEASE_STATS["lost"] += 1
+    log(f"[LEASE] เสีย lease ให้ {lease.other[0] if lease.other else '?'} — เป็น standby (หยุดส่ง/อ่านชีต)")
+
+lease: Optional[LeaderLease] = None   # open_stores()
+
+# ========= รอบอ่านชีต + วางคิว =========
+def sheet_poll_interval() -> int:
+    return SHEET_RECONCILE_SEC if SHEET_WEBHOOK_SECRET else int(check_alerts.seconds)
+
+def sheet_is_stale(t: Tenant) -> bool:
+    """ข้อมูลชีตในไทม์ไลน์เก่ากว่าที่ควร (breaker ไม่ปิด หรืออ่านสำเร็จล่าสุดนานเกิน 2 รอบโพล)"""
+    last = t.last_sheet_ok
+    return (t.breaker.state != "closed" or last is None
+            or clock.time() - last > 2 * sheet_poll_interval() + 60)
+
+def sheet_poll_due(t: Tenant) -> bool:
+    if not SHEET_WEBHOOK_SECRET or t.poll["force"] or not t.timeline.sheet_loaded:
+        return True
+    last = t.poll["last"]
+    return last is None or clock.time() - last >= SHEET_RECONCILE_SEC
+
+async def poll_sheets():
+    """
+    อ่านชีตของทุก tenant ที่ถึงรอบพร้อมกัน (ขนานได้ SHEET_IO_WORKERS ไฟล์) ภายในโควตารวม sheet_quota
+    ตัวที่ถูกบังคับ/ไม่ได้อ่านนานที่สุดได้โควตาก่อน
+    """
+    due = sorted((t for t in TENANTS if sheet_poll_due(t)),
+                 key=lambda t: (not t.poll["force"], t.poll["last"] or 0.0))
+    for t in due:
+        t.poll["force"] = False
+    await asyncio.gather(*(refresh_sheet(t) for t in due))
+
+def resync_alerts(t: Tenant, now_dt: datetime):
+    """วางคิวแจ้งเตือนของ tenant ใหม่จากไทม์ไลน์ปัจจุบัน (เพิ่ม/ลบเฉพาะที่เปลี่ยน)"""
+    changed = alert_scheduler.sync(t, t.timeline.between(now_dt, now_dt + ALERT_LOOKAHEAD), now_dt)
+    if changed:
+        log(f"[SCHED] {t.tag}อัปเดตคิว {changed} รายการ (รอส่ง {len(alert_scheduler)})")
+    return changed
 
 @tasks.loop(seconds=60)
 async def check_alerts():
+    """ดึงชีตของ tenant ที่ถึงรอบ แล้วอัปเดตคิวแจ้งเตือนของทุก tenant (การส่งจริงอยู่ใน alert_scheduler)"""
+    t0 = time.perf_counter()
+    tick = next(TICK_SEQ)
+    TICK_ID.set(tick)
     try:
-        now = datetime.now(tz)
-        bosses = get_boss_from_sheet()
-
-        # เวิลด์บอส: รวมเวลาตรงกัน แจ้งเฉพาะ T-5
-        world_groups = {}
-        for ws, name, spawn_dt, *_ in bosses:
-            if is_world_boss(name) and ws == "Fixed":
-                key = spawn_dt.strftime("%Y%m%d-%H%M")
-                world_groups.setdefault(key, {"dt": spawn_dt, "names": set(), "ws": ws})
-                world_groups[key]["names"].add(normalize_name(name))
-
-        for key, info in world_groups.items():
-            if info["names"] == WORLD_BOSSES:
-                spawn_dt = info["dt"]
-                delta = (spawn_dt - now).total_seconds()
-                th_sec = 5 * 60
-                alert_key = f"group:{key}_T5"
-                if (th_sec - ALERT_WINDOW_SEC) < delta <= (th_sec + ALERT_WINDOW_SEC) and alert_key not in alerted:
-                    alerted.add(alert_key)
-                    channel_id = SHEET_CHANNEL_MAP.get(info["ws"], CHANNEL_ID_DEFAULT)
-                    ch = bot.get_channel(channel_id) or await bot.fetch_channel(channel_id)
-                    embed = discord.Embed(
-                        title=f"{WORLD_EMOJI} Worldboss: ลาตัน, พาร์โต, เนดร้า",
-                        description="⏰ จะเกิดในอีก 5 นาที",
-                        color=DEFAULT_EMBED_COLOR
-                    )
-                    mention = f"<@&{ROLE_ID_1}> <@&{ROLE_ID_2}>"
-                    try:
-                        await ch.send(content=mention, embed=embed)
-                        log("[WorldBoss] แจ้งรวม T-5m")
-                    except Exception as e:
-                        log(f"[ERROR] ส่งแจ้งเตือนรวมบอสโลก T-5: {e}")
-
-        # รายตัว 60/30/5 (ยกเว้นเวิลด์บอส)
-        for ws, name, spawn_dt, level, location in bosses:
-            if is_world_boss(name):
-                continue
-            delta = (spawn_dt - now).total_seconds()
-            if delta <= 0:
-                continue
-            for th_min in ALERT_THRESHOLDS_MIN:
-                th_sec = th_min * 60
-                key = f"{ws}:{name}_{spawn_dt.strftime('%Y%m%d-%H%M')}_T{th_min}"
-                if (th_sec - ALERT_WINDOW_SEC) < delta <= (th_sec + ALERT_WINDOW_SEC) and key not in alerted:
-                    alerted.add(key)
-                    channel_id = SHEET_CHANNEL_MAP.get(ws, CHANNEL_ID_DEFAULT)
-                    ch = bot.get_channel(channel_id) or await bot.fetch_channel(channel_id)
-                    title = f"📅 ตารางแน่นอน: {name}" + (f" Lv.{level}" if level else "")
-                    desc = []
-                    if location: desc.append(f"📍 {location}")
-                    desc.append(f"🕘 รอบต่อไป: {spawn_dt.strftime('%H:%M')} ({weekday_th(spawn_dt)} {spawn_dt.strftime('%d/%m')})")
-                    desc.append(f"⏰ แจ้งเตือนล่วงหน้า {th_min} นาที")
-                    embed = discord.Embed(title=title, description="\n".join(desc), color=DEFAULT_EMBED_COLOR)
-                    try:
-                        if th_min == 5:
-                            mention = f"<@&{ROLE_ID_1}> <@&{ROLE_ID_2}>"
-                            await ch.send(content=mention, embed=embed)
-                        else:
-                            await ch.send(embed=embed)
-                        log(f"[{ws}] แจ้ง {name} T-{th_min}m")
-                    except Exception as e:
-                        log(f"[ERROR] ส่งแจ้งเตือน {name} T-{th_min}: {e}")
+        if lease.leader():
+            await poll_sheets()
+        else:
+            # standby ไม่ใช้โควตาชีต: ตาม snapshot ที่ leader เขียน → ไทม์ไลน์/คิวพร้อมรับช่วง
+            for t in TENANTS:
+                await follow_snapshot(t)
     except Exception as e:
+        # ชีตมีปัญหาไม่ทำให้ทั้งรอบหลุด — Fixed/เวิลด์บอสและแถวชุดล่าสุดยังวางคิวต่อด้านล่าง
+        HEALTH["last_error"] = f"sheet: {type(e).__name__}: {e}"
+        log(f"[ERROR] check_alerts อ่านชีต: {e}")
+    try:
+        now = clock.now()
+        for t in TENANTS:
+            t.timeline.advance(now)
+            resync_alerts(t, now)
+        alerted.prune(now)
+        HEALTH["last_tick_ok"] = clock.time()
+    except Exception as e:
+        HEALTH["last_error"] = f"tick: {type(e).__name__}: {e}"
         log(f"[ERROR] check_alerts crash: {e}")
+    finally:
+        dt = time.perf_counter() - t0
+        METRICS.observe("l9_tick_seconds", dt)
+        log(f"[DEBUG] tick {tick}", duration_ms=round(dt * 1000, 1), pending=len(alert_scheduler))
+
+METRICS.gauge("l9_alert_ledger_size", "Keys in the alert ledger", lambda: len(alerted))
+METRICS.gauge("l9_alerts_pending", "Alerts waiting in the scheduler", lambda: len(alert_scheduler))
+METRICS.gauge("l9_timeline_entries", "Spawns held in all tenant timelines", lambda: sum(len(t.timeline) for t in TENANTS))
+METRICS.gauge("l9_tenants", "Tenants served by this process", lambda: len(TENANTS))
+METRICS.gauge("l9_sheet_breaker_state", "Worst Sheets breaker across tenants: 0 closed, 1 half-open, 2 open",
+              lambda: max(("closed", "half_open", "open").index(t.breaker.state) for t in TENANTS))
+METRICS.gauge("l9_sheet_stale", "Tenants whose alerts run on the last good sheet snapshot",
+              lambda: sum(sheet_is_stale(t) for t in TENANTS))
+METRICS.gauge("l9_leader", "1 if this replica holds the alert lease", lambda: int(lease.leader()))
+METRICS.gauge("l9_subscriptions", "Per-user boss subscriptions", lambda: len(subscriptions))
+METRICS.gauge("l9_dm_queue", "Users waiting for a DM", lambda: len(dm_fanout))
+METRICS.gauge("l9_sheet_quota_tokens", "Sheets read calls left in the shared budget", lambda: int(sheet_quota.tokens))
+
+# ========= Sheet webhook (Apps Script onEdit) =========
+WEBHOOK_STATS = {"received": 0, "applied": 0, "rejected": 0, "ignored": 0}
+
+def sign_webhook_body(body: bytes, secret: str = None) -> str:
+    """ลายเซ็น hex ของ body (HMAC-SHA256) — ฝั่ง Apps Script ต้องคำนวณแบบเดียวกัน"""
+    return hmac.new((secret or SHEET_WEBHOOK_SECRET).encode("utf-8"), body, hashlib.sha256).hexdigest()
+
+def webhook_tenant(ss_id: Optional[str], ws_name: str) -> Optional[Tenant]:
+    """tenant ที่ payload นี้หมายถึง: ตาม spreadsheet_id ก่อน ถ้ายังกำกวม (ไฟล์เดียวหลายแท็บ) ดูชื่อแท็บ"""
+    cands = [t for t in TENANTS if ss_id in (None, t.spreadsheet_id)]
+    if len(cands) > 1:
+        cands = [t for t in cands if WS_CACHE.get(t.key, {}).get("title", t.primary_ws) == ws_name]
+    return cands[0] if len(cands) == 1 else None
+
+def apply_sheet_edits(t: Tenant, ws_name: str, edits: list, now_dt: datetime) -> Optional[int]:
+    """
+    แก้แถวในไทม์ไลน์ของ tenant ตาม edits [{"row": n, "values": [...]}] โดยไม่อ่านชีต
+    คืนจำนวนแถวที่แก้ หรือ None ถ้าต้องอ่านชีตเต็มแทน (ยังไม่เคยโหลด/คนละแท็บ/แก้หัวตาราง)
+    """
+    cache = WS_CACHE.get(t.key)
+    if not t.timeline.sheet_loaded or cache is None or cache["title"] != ws_name:
+        return None
+    cols = row_cols(cache["col"])
+
+    changed = {}
+    for ed in edits:
+        n = int(ed["row"])
+        if n <= 1:
+            return None   # หัวตารางเปลี่ยน → colmap อาจเปลี่ยน
+        values = ed.get("values") or []
+        if not isinstance(values, list):
+            raise ValueError(f"values ของแถว {n} ต้องเป็น list")
+        # เซลล์จาก Apps Script อาจเป็นตัวเลข/null ถ้าไม่ได้ใช้ getDisplayValues() — parse_sheet_row รับแต่ข้อความ
+        changed[n] = parse_sheet_row(["" if v is None else str(v) for v in values], cols, n)
+
+    t.timeline.update_rows(ws_name, changed, now_dt)   # คิวแจ้งเตือนอัปเดตผ่าน TimelineEvent
+    t.webhook_edits += 1
+    kill_writes.reapply(t, now_dt)   # คนแก้แถวที่ !kill รอเขียนอยู่ → คนชนะ
+    prev = SHEET_CACHE.get(t.key)
+    if prev is not None:
+        # probe ครั้งหน้าห้ามใช้ผลเดิม (แถวใน cache เก่ากว่าไทม์ไลน์แล้ว) — แทนทั้ง entry ไม่แก้ในที่
+        SHEET_CACHE[t.key] = {**prev, "modified": None}
+    return len(changed)
+
+async def handle_sheet_webhook(request):
+    """
+    POST /sheet-webhook — header X-Signature: hex HMAC-SHA256(SHEET_WEBHOOK_SECRET, body)
+    body: {"spreadsheet_id": "<ไอดีไฟล์>", "sheet": "<ชื่อแท็บ>", "ts": <unix วินาที>, "rows": [{"row": 5, "values": ["ชื่อ", ...]}]}
+    values คือทั้งแถวตั้งแต่คอลัมน์ A ตามที่แสดงในชีต (Apps Script: range.getDisplayValues())
+    spreadsheet_id (SpreadsheetApp.getActive().getId()) ไม่ใส่ได้ถ้ามี tenant เดียว
+    ทดสอบในเครื่อง: ส่ง body เดียวกันกับลายเซ็นจาก sign_webhook_body()
+    """
+    if not SHEET_WEBHOOK_SECRET:
+        return web.json_response({"ok": False, "error": "webhook disabled"}, status=404)
+    body = await request.read()
+    WEBHOOK_STATS["received"] += 1
+    sig = request.headers.get("X-Signature", "")
+    if not hmac.compare_digest(sig, sign_webhook_body(body)):
+        WEBHOOK_STATS["rejected"] += 1
+        return web.json_response({"ok": False, "error": "bad signature"}, status=401)
+    try:
+        payload = json.loads(body)
+        ts = float(payload["ts"])
+        ws_name = str(payload["sheet"])
+        ss_id = payload.get("spreadsheet_id")
+        edits = payload["rows"]
+        if not isinstance(edits, list):
+            raise ValueError("rows must be a list")
+    except (ValueError, KeyError, TypeError) as e:
+        WEBHOOK_STATS["rejected"] += 1
+        return web.json_response({"ok": False, "error": f"bad payload: {e}"}, status=400)
+    if abs(time.time() - ts) > WEBHOOK_MAX_SKEW_SEC:   # เทียบกับนาฬิกาจริงของผู้ส่ง
+        WEBHOOK_STATS["rejected"] += 1
+        return web.json_response({"ok": False, "error": "stale"}, status=401)
+
+    t = webhook_tenant(ss_id, ws_name)
+    if t is None:
+        WEBHOOK_STATS["rejected"] += 1
+        return web.json_response({"ok": False, "error": "unknown spreadsheet"}, status=404)
+
+    now = clock.now()
+    try:
+        n = apply_sheet_edits(t, ws_name, edits, now)
+    except (ValueError, KeyError, TypeError) as e:
+        WEBHOOK_STATS["rejected"] += 1
+        return web.json_response({"ok": False, "error": f"bad row: {e}"}, status=400)
+    if n is None:
+        # แก้ที่ต่ออย่างเดียวไม่ได้ → ให้ check_alerts รอบถัดไปอ่านชีตเต็ม
+        WEBHOOK_STATS["ignored"] += 1
+        t.poll["force"] = True
+        log(f"[HOOK] {t.tag}'{ws_name}' แก้ทีละแถวไม่ได้ — จะอ่านชีตเต็มรอบถัดไป")
+        return web.json_response({"ok": True, "applied": 0, "reload": True}, status=202)
+
+    WEBHOOK_STATS["applied"] += 1
+    log(f"[HOOK] {t.tag}'{ws_name}' แก้ {n} แถว (รอส่ง {len(alert_scheduler)})")
+    return web.json_response({"ok": True, "applied": n})
+
+
+# ========= !kill (เขียนเวลาตายกลับชีตแบบ write-behind) =========
+KILL_STATS = {"queued": 0, "written": 0, "batches": 0, "conflicts": 0, "retries": 0, "dropped": 0}
+KILL_ARG_DATE_RE = re.compile(r"^(\d{1,2})/(\d{1,2})(?:/(\d{4}))?$")
+
+class KillWrite(NamedTuple):
+    """เวลาตาย 1 แถวที่รอเขียนลงชีต"""
+    tenant: "Tenant"
+    row: int
+    name: str
+    kill: datetime              # เวลาตายที่จะเขียน
+    base: Optional[datetime]    # kill_dt ในชีตตอนรับคำสั่ง — ชีตต่างจากนี้ (และจาก kill) = มีคนแก้พร้อมกัน
+    channel_id: Optional[int]   # ห้องที่สั่ง (แจ้งกลับเมื่อชน)
+    tries: int = 0
+    written: bool = False       # เขียนแล้ว รอรอบอ่านชีตยืนยัน
+
+def parse_kill_args(args: tuple, now_dt: datetime) -> Tuple[str, datetime]:
+    """'<ชื่อบอส> [dd/mm[/yyyy]] [HH:MM]' → (ชื่อ, เวลาตาย) — ไม่ระบุเวลา = ตอนนี้, ระบุแต่เวลาที่ยังไม่ถึง = เมื่อวาน"""
+    args = list(args)
+    tm = parse_time_of_day(args[-1]) if len(args) > 1 else None
+    if tm:
+        args.pop()
+    m = KILL_ARG_DATE_RE.match(args[-1]) if len(args) > 1 else None
+    if m:
+        args.pop()
+    name = " ".join(args).strip()
+    if not name:
+        raise ValueError("ต้องระบุชื่อบอส")
+    if tm is None:
+        if m:
+            raise ValueError("ระบุวันที่แล้วต้องระบุเวลาด้วย เช่น 18/10 12:30")
+        return name, now_dt.replace(second=0, microsecond=0)
+    try:
+        day = date(int(m.group(3) or now_dt.year), int(m.group(2)), int(m.group(1))) if m else now_dt.date()
+    except ValueError:
+        raise ValueError(f"วันที่ไม่ถูกต้อง: {m.group(0)}") from None
+    kill = localize(datetime(day.year, day.month, day.day, tm[0], tm[1], tm[2]))
+    if kill > now_dt + timedelta(minutes=1):
+        if m:
+            raise ValueError("เวลาตายอยู่ในอนาคต")
+        day -= timedelta(days=1)
+        kill = localize(datetime(day.year, day.month, day.day, tm[0], tm[1], tm[2]))
+    return name, kill
+
+def resolve_kill_row(t: "Tenant", query: str) -> Tuple[int, SheetRow]:
+    """หาแถว interval ของบอสตามชื่อ (ตรงทั้งชื่อก่อน แล้วค่อยส่วนของชื่อ) หรือ '#เลขแถว' — ไม่เจอ/กำกวม → ValueError"""
+    rows = t.timeline.sheet_rows or {}
+    cands = [(n, r) for n, r in rows.items() if r.sp_type == "interval" and r.hours]
+    if query.startswith("#") and query[1:].isdigit():
+        hits = [(n, r) for n, r in cands if n == int(query[1:])]
+    else:
+        key = normalize_name(query)
+        hits = ([(n, r) for n, r in cands if normalize_name(r.name) == key]
+                or [(n, r) for n, r in cands if key in normalize_name(r.name)])
+    if not hits:
+        raise ValueError(f"ไม่พบบอส interval ชื่อ '{query}' ในชีต")
+    if len(hits) > 1:
+        opts = ", ".join(f"#{n} {r.name}" + (f" ({r.location})" if r.location else "") for n, r in sorted(hits)[:10])
+        raise ValueError(f"เจอหลายแถว ระบุด้วยเลขแถว เช่น !kill #{hits[0][0]} — {opts}")
+    return hits[0]
+
+def kill_cells(ws_name: str, col: dict, n: int, kill: datetime) -> List[dict]:
+    """ช่อง kill_time / date_kill / kill_dt ของแถว n (รูปแบบ ISO ให้ชีต parse เป็นวันเวลาได้ทุก locale)"""
+    vals = {"kill_time": kill.strftime("%H:%M"), "date_kill": kill.strftime("%Y-%m-%d"),
+            "kill_dt": kill.strftime("%Y-%m-%d %H:%M:%S")}
+    return [{"range": f"'{ws_name}'!{gspread.utils.rowcol_to_a1(n, col[k] + 1)}", "values": [[v]]}
+            for k, v in vals.items() if col.get(k) is not None]
+
+def write_kills(ss, ws_name: str, col: dict, batch: List[KillWrite]) -> Tuple[list, dict]:
+    """
+    (blocking) อ่านแถวปัจจุบันของทุกแถวใน batch (1 call) เทียบว่าไม่มีใครแก้ชื่อ/เวลาตายไปก่อน
+    แล้วเขียนเฉพาะแถวที่ไม่ชนใน values_batch_update ครั้งเดียว
+    คืน (แถวที่เขียน, {แถวที่ชน: SheetRow ปัจจุบันในชีต หรือ None})
+    """
+    cols = row_cols(col)
+    last = max(c for c in col.values() if c is not None) + 1
+    current = _batch_values(ss, [f"'{ws_name}'!A{w.row}:{gspread.utils.rowcol_to_a1(w.row, last)}" for w in batch])
+    data, written, conflicts = [], [], {}
+    for w, vals in zip(batch, current):
+        row = parse_sheet_row(vals[0] if vals else [], cols, w.row)
+        if row is None or normalize_name(row.name) != normalize_name(w.name) or row.kill_dt not in (w.base, w.kill):
+            conflicts[w.row] = row
+            continue
+        data += kill_cells(ws_name, col, w.row, w.kill)
+        written.append(w.row)
+    if data:
+        with METRICS.timer("l9_sheet_write_seconds"):
+            ss.values_batch_update({"valueInputOption": "USER_ENTERED", "data": data})
+        SHEET_STATS["api_calls"] += 1
+    return written, conflicts
+
+class KillWriteBuffer:
+    """
+    !kill อัปเดตไทม์ไลน์ (และคิวแจ้งเตือน) ทันที แล้วพักเวลาตายไว้ที่นี่
+    flush ทุก KILL_FLUSH_SEC: ต่อไฟล์ชีต = อ่านแถวที่เกี่ยวข้อง 1 call + values_batch_update 1 call ไม่ว่าจะกี่คำสั่ง
+    - สั่งแถวเดิมซ้ำก่อน flush → เขียนค่าล่าสุดค่าเดียว
+    - แถวในชีตถูกคนแก้ชื่อ/เวลาตายไปก่อน → ไม่เขียนทับ ใช้ค่าจากชีต แจ้งกลับห้องที่สั่ง
+    - เขียนไม่สำเร็จ → retry แบบ backoff (ผ่าน breaker/sheet_quota ของ tenant) ครบ KILL_WRITE_MAX_TRIES → ทิ้ง แล้วอ่านชีตใหม่
+    - เขียนแล้วเก็บไว้จนรอบอ่านชีตเห็นค่าเดียวกัน (reapply) กันผลอ่านที่เริ่มก่อนเขียนทับค่าใหม่ในไทม์ไลน์
+    """
+
+    def __init__(self):
+        self._pending = {}      # (tenant key, แถว) → KillWrite
+        self._retry_at = {}     # tenant key → epoch ที่ลองเขียนใหม่ได้
+        self._wake = asyncio.Event()
+        self._task = None
+
+    def __len__(self):
+        return sum(1 for w in self._pending.values() if not w.written)
+
+    def _overlay(self, t: "Tenant", w: KillWrite, now_dt: datetime):
+        row = (t.timeline.sheet_rows or {}).get(w.row)
+        ws_name = SHEET_CACHE.get(t.key, {}).get("ws_name") or WS_CACHE.get(t.key, {}).get("title", t.primary_ws)
+        # ล้าง next_spawn/date_spawn เดิม → resolve_spawn ใช้ kill_dt + X ชั่วโมง
+        t.timeline.update_rows(ws_name, {w.row: row._replace(kill_dt=w.kill, d=None, t=None)}, now_dt)
+
+    def submit(self, t: "Tenant", n: int, row: SheetRow, kill: datetime, channel_id: Optional[int] = None):
+        """รับ !kill: แก้ไทม์ไลน์ทันที แล้วพักไว้รอ flush (คนละคำสั่งแถวเดียวกัน → base เดิม ค่าใหม่ล่าสุด)"""
+        prev = self._pending.get((t.key, n))
+        base = row.kill_dt if prev is None else prev.kill if prev.written else prev.base
+        w = KillWrite(t, n, row.name, kill, base, channel_id)
+        self._pending[(t.key, n)] = w
+        KILL_STATS["queued"] += 1
+        self._overlay(t, w, clock.now())
+        self._wake.set()
+
+    def reapply(self, t: "Tenant", now_dt: datetime):
+        """หลังไทม์ไลน์ของ t ถูกแก้จากชีต (อ่าน/webhook): ใส่เวลาตายที่ยังไม่ถึงชีตกลับ ทิ้งที่ชีตยืนยันแล้วหรือถูกคนแก้"""
+        rows = t.timeline.sheet_rows or {}
+        for key, w in [(k, w) for k, w in self._pending.items() if k[0] == t.key]:
+            cur = rows.get(w.row)
+            if cur is not None and normalize_name(cur.name) == normalize_name(w.name):
+                if cur.kill_dt == w.kill:
+                    sheet = SHEET_CACHE.get(t.key, {}).get("rows", {}).get(w.row)
+                    if w.written and sheet is not None and sheet.kill_dt == w.kill:
+                        del self._pending[key]   # ชีตมีค่าเดียวกันแล้ว
+                    continue
+                if cur.kill_dt == w.base:
+                    self._overlay(t, w, now_dt)   # ผลอ่านเก่ากว่าคำสั่ง
+                    continue
+            del self._pending[key]
+            if not w.written:
+                KILL_STATS["conflicts"] += 1
+                log(f"[WARN] {t.tag}!kill {w.name} (แถว {w.row}) ไม่เขียน — แถวในชีตถูกแก้ไปก่อน ใช้ค่าจากชีต")
+
+    async def flush(self):
+        """เขียนทุกแถวที่รออยู่: ต่อ tenant = อ่านตรวจ 1 call + เขียน 1 call"""
+        by_tenant = {}
+        for w in self._pending.values():
+            if not w.written:
+                by_tenant.setdefault(w.tenant.key, []).append(w)
+        now = clock.time()
+        for key, batch in by_tenant.items():
+            t = batch[0].tenant
+            hit = WS_CACHE.get(t.key)
+            if self._retry_at.get(key, 0) > now or hit is None or not t.breaker.allow():
+                continue
+            if not sheet_quota.take(2):   # อ่านตรวจ + เขียน
+                continue
+            try:
+                ss, _ = await run_blocking(sheet_session.spreadsheet, t.spreadsheet_id)
+                written, conflicts = await run_blocking(write_kills, ss, hit["title"], hit["col"], batch)
+            except Exception as e:
+                log(f"[ERROR] {t.tag}เขียนเวลาตาย {len(batch)} แถวลงชีตไม่สำเร็จ: {e}")
+                if _is_quota_error(e):
+                    sheet_quota.hold(SHEET_BREAKER_BASE_SEC)
+                t.breaker.failure(e)
+                self._retry(t, batch)
+                continue
+            t.breaker.success()
+            self._retry_at.pop(key, None)
+            KILL_STATS["batches"] += 1
+            KILL_STATS["written"] += len(written)
+            self._settle(t, batch, written, conflicts)
+
+    def _retry(self, t: "Tenant", batch: List[KillWrite]):
+        tries = 0
+        for w in batch:
+            if self._pending.get((t.key, w.row)) is not w:
+                continue   # มีคำสั่งใหม่กว่ามาแทนระหว่างเขียน
+            if w.tries + 1 >= KILL_WRITE_MAX_TRIES:
+                del self._pending[(t.key, w.row)]
+                KILL_STATS["dropped"] += 1
+                t.poll["force"] = True   # ไทม์ไลน์มีค่าที่ไม่ถึงชีต → อ่านชีตใหม่ให้ตรงกัน
+                log(f"[ERROR] {t.tag}ทิ้ง !kill {w.name} (แถว {w.row}) หลังเขียนไม่สำเร็จ {KILL_WRITE_MAX_TRIES} ครั้ง")
+                continue
+            self._pending[(t.key, w.row)] = w._replace(tries=w.tries + 1)
+            tries = max(tries, w.tries + 1)
+            KILL_STATS["retries"] += 1
+        self._retry_at[t.key] = clock.time() + KILL_FLUSH_SEC * (2 ** tries) * random.uniform(0.5, 1.0)
+
+    def _settle(self, t: "Tenant", batch: List[KillWrite], written: list, conflicts: dict):
+        now_dt = clock.now()
+        for w in batch:
+            if self._pending.get((t.key, w.row)) is not w:
+                continue   # มีคำสั่งใหม่กว่ามาแทนระหว่างเขียน → เขียนรอบหน้า (base = ค่าที่เพิ่งเขียน)
+            if w.row in written:
+                self._pending[(t.key, w.row)] = w._replace(written=True)
+        if written:
+            log(f"[SHEET] {t.tag}เขียนเวลาตาย {len(written)} แถวใน batch เดียว (รอ {len(self)})")
+            t.poll["force"] = True   # อ่านรอบหน้ายืนยันค่าที่เขียน (เปิด webhook ก็ไม่ต้องรอ reconcile)
+        if not conflicts:
+            return
+        ws_name = SHEET_CACHE.get(t.key, {}).get("ws_name") or WS_CACHE[t.key]["title"]
+        for w in batch:
+            if w.row not in conflicts:
+                continue
+            if self._pending.get((t.key, w.row)) is w:
+                del self._pending[(t.key, w.row)]
+            row = conflicts[w.row]
+            n = w.row
+            KILL_STATS["conflicts"] += 1
+            log(f"[WARN] {t.tag}!kill {w.name} (แถว {n}) ชนกับการแก้ในชีต — ไม่เขียนทับ ใช้ค่าจากชีต")
+            if w.channel_id:
+                asyncio.create_task(self._notify(w, row))
+        t.timeline.update_rows(ws_name, conflicts, now_dt)   # ไทม์ไลน์ตามชีตจริง
+
+    async def _notify(self, w: KillWrite, row: Optional[SheetRow]):
+        now = f"{row.name} ตาย {row.kill_dt:%d/%m %H:%M}" if row and row.kill_dt else "แถวถูกแก้/ย้าย"
+        try:
+            ch = await alert_dispatcher.channel(w.channel_id)
+            await ch.send(f"⚠️ ไม่ได้บันทึก {w.name} ตาย {w.kill:%H:%M} ลงชีต — มีคนแก้ชีตพร้อมกัน (ในชีตตอนนี้: {now})")
+        except Exception as e:
+            log(f"[WARN] แจ้งชน !kill ไม่สำเร็จ: {e}")
+
+    async def run(self):
+        """รอคำสั่งแรก → รออีก KILL_FLUSH_SEC ให้คำสั่งที่ตามมาได้ batch เดียวกัน → flush"""
+        while True:
+            await self._wake.wait()
+            await asyncio.sleep(KILL_FLUSH_SEC)
+            self._wake.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                log(f"[ERROR] kill_writes.flush: {e}")
+            if len(self):
+                # ยังมีค้าง (retry/quota/breaker) → ลองใหม่เมื่อถึงเวลา backoff ที่ใกล้สุด
+                wait = min(self._retry_at.values(), default=clock.time()) - clock.time()
+                await asyncio.sleep(max(0.0, wait))
+                self._wake.set()
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run())
+
+kill_writes = KillWriteBuffer()
+
+# ========= Schedule feed (/schedule.json, /schedule.ics) =========
+FEED_STATS = {"requests": 0, "not_modified": 0, "builds": 0}
+
+def ics_escape(s: str) -> str:
+    # \r เดี่ยวก็ตัดบรรทัดในปฏิทินได้ → ทำทุกแบบเป็น \n ก่อน escape
+    s = s.replace("\r\n", "\n").replace("\r", "\n")
+    return s.replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,").replace("\n", "\\n")
+
+def ics_fold(line: str) -> str:
+    """RFC 5545: บรรทัดยาวเกิน 75 octet ต้องตัดแล้วขึ้นบรรทัดใหม่ด้วยช่องว่าง (ไม่ตัดกลางตัวอักษร UTF-8)"""
+    if len(line.encode("utf-8")) <= 75:
+        return line
+    out, cur, size = [], "", 0
+    for ch in line:
+        n = len(ch.encode("utf-8"))
+        if size + n > 75:
+            out.append(cur)
+            cur, size = " ", 1
+        cur += ch
+        size += n
+    out.append(cur)
+    return "\r\n".join(out)
+
+@functools.lru_cache(maxsize=4096)
+def name_id_stable(name: str) -> str:
+    """id ของชื่อที่เหมือนเดิมข้ามรีสตาร์ท (name_id() เรียงตามลำดับที่เจอ ใช้ทำ UID ของปฏิทินไม่ได้)"""
+    return hashlib.sha1(name.encode("utf-8")).hexdigest()[:12]
+
+class ScheduleFeed:
+    """
+    ตารางเกิดของ tenant ช่วง SCHEDULE_FEED_DAYS วันข้างหน้า แบบ JSON และ iCalendar
+    body ถูก serialize ไว้แล้วต่อ version ของไทม์ไลน์ — คำขอที่ตารางไม่เปลี่ยนแค่ส่ง bytes เดิม (หรือ 304)
+    ETag = hash ของรายการรอบเกิด → version ขยับแต่รายการเหมือนเดิม (เช่นต่อไทม์ไลน์) ETag/Last-Modified ไม่เปลี่ยน
+    """
+
+    def __init__(self, t: Tenant):
+        self.t = t
+        self._version = None
+        self._digest = None
+        self._lock = asyncio.Lock()  # คำขอพร้อมกันตอนตารางเพิ่งเปลี่ยน → serialize ครั้งเดียว
+        self.etag = None
+        self.last_modified = None    # datetime (UTC) ที่เนื้อหาเปลี่ยนล่าสุด
+        self.bodies = {}             # "json" | "ics" → bytes
+
+    def _kind(self, b: Boss) -> str:
+        if b.world:
+            return "world"
+        if b.ws == "Fixed":
+            return "fixed"
+        row = (self.t.timeline.sheet_rows or {}).get(b.src[2]) if b.src else None
+        return row.sp_type if row and row.sp_type else "sheet"
+
+    async def refresh(self, now_dt: datetime):
+        timeline = self.t.timeline
+        timeline.advance(now_dt)   # ตัดรอบที่ผ่านไปแล้ว (ถูก ไม่ยิงชีต)
+        if self._version == timeline.version:
+            return
+        async with self._lock:
+            version = timeline.version
+            if self._version == version:
+                return
+            # เก็บรายการบน loop (ไทม์ไลน์แก้ได้จาก loop เท่านั้น) แล้ว hash/serialize ใน executor
+            items = [(b, self._kind(b)) for b in timeline.between(now_dt, now_dt + timedelta(days=SCHEDULE_FEED_DAYS))]
+            built = await run_blocking(self._build, items, timeline.sheet_loaded, self._digest)
+            self._version = version
+            if built is None:
+                return
+            self._digest, self.last_modified, self.bodies = built
+            self.etag = f'"{self._digest[:32]}"'
+            FEED_STATS["builds"] += 1
+
+    def _build(self, items: list, sheet_loaded: bool, prev_digest: Optional[str]):
+        """(CPU, executor) คืน (digest, last_modified, bodies) หรือ None ถ้ารายการเหมือนเดิม"""
+        t0 = time.perf_counter()
+        h = hashlib.sha256(repr(sheet_loaded).encode())
+        for b, kind in items:
+            h.update(f"{b.epoch}\x1f{b.ws}\x1f{b.name}\x1f{b.level}\x1f{b.location}\x1f{kind}\x1e".encode("utf-8"))
+        digest = h.hexdigest()
+        if digest == prev_digest:
+            return None
+        stamp = clock.now().astimezone(pytz.utc).replace(microsecond=0)
+        bodies = {"json": self._json(items, sheet_loaded, stamp), "ics": self._ics(items, stamp)}
+        METRICS.observe("l9_feed_build_seconds", time.perf_counter() - t0)
+        return digest, stamp, bodies
+
+    def _json(self, items: list, sheet_loaded: bool, stamp: datetime) -> bytes:
+        payload = {
+            "tenant": self.t.key,
+            "timezone": str(tz),
+            "updated": stamp.isoformat(),
+            "sheet_loaded": sheet_loaded,
+            "bosses": [
+                {"name": b.name, "sheet": b.ws, "kind": kind, "level": b.level, "location": b.location,
+                 "spawn": b.spawn_dt.isoformat(), "epoch": b.epoch}
+                for b, kind in items
+            ],
+        }
+        return json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+    def _ics(self, items: list, stamp: datetime) -> bytes:
+        dtstamp = stamp.strftime("%Y%m%dT%H%M%SZ")
+        lines = ["BEGIN:VCALENDAR", "VERSION:2.0", "PRODID:-//L9 Boss Timer//schedule//TH",
+                 "CALSCALE:GREGORIAN", "METHOD:PUBLISH", f"X-WR-CALNAME:{ics_escape('L9 Boss ' + self.t.key)}",
+                 f"X-WR-TIMEZONE:{tz}"]
+        for b, kind in items:
+            summary = (WORLD_EMOJI if kind == "world" else NORMAL_EMOJI) + " " + b.name + (f" Lv.{b.level}" if b.level else "")
+            lines += ["BEGIN:VEVENT",
+                      f"UID:{b.minute}-{name_id_stable(b.name)}-{self.t.key}@l9-boss-timer",
+                      f"DTSTAMP:{dtstamp}",
+                      "DTSTART:" + time.strftime("%Y%m%dT%H%M%SZ", time.gmtime(b.epoch)),
+                      "DTEND:" + time.strftime("%Y%m%dT%H%M%SZ", time.gmtime(b.epoch + 300)),
+                      f"SUMMARY:{ics_escape(summary)}",
+                      f"CATEGORIES:{kind}"]
+            if b.location:
+                lines.append(f"LOCATION:{ics_escape(b.location)}")
+            lines.append("END:VEVENT")
+        lines.append("END:VCALENDAR")
+        return ("\r\n".join(ics_fold(l) for l in lines) + "\r\n").encode("utf-8")
+
+
+def feed_tenant(request) -> Optional[Tenant]:
+    """?tenant=<key> หรือ ?guild=<id> — มี tenant เดียวไม่ต้องระบุ"""
+    key = request.query.get("tenant")
+    if key is not None:
+        return next((t for t in TENANTS if t.key == key), None)
+    guild = request.query.get("guild")
+    if guild is not None:
+        return tenant_for(int(guild)) if guild.isdigit() else None
+    return TENANTS[0] if len(TENANTS) == 1 else None
+
+def etag_matches(header: str, etag: str) -> bool:
+    """If-None-Match: เทียบแบบ weak (ตัด W/) ตาม RFC 9110 รองรับหลายค่าและ *"""
+    for tag in header.split(","):
+        tag = tag.strip()
+        if tag == "*" or (tag[2:] if tag.startswith("W/") else tag) == etag:
+            return True
+    return False
+
+async def serve_feed(request, fmt: str, content_type: str):
+    FEED_STATS["requests"] += 1
+    t = feed_tenant(request)
+    if t is None:
+        return web.json_response({"ok": False, "error": "unknown tenant",
+                                  "tenants": [x.key for x in TENANTS]}, status=404)
+    feed = t.feed
+    await feed.refresh(clock.now())
+    headers = {"ETag": feed.etag,
+               "Last-Modified": feed.last_modified.strftime("%a, %d %b %Y %H:%M:%S GMT"),
+               "Cache-Control": f"public, max-age={SCHEDULE_FEED_MAX_AGE}"}
+    inm = request.headers.get("If-None-Match")
+    if inm is not None:
+        fresh = etag_matches(inm, feed.etag)
+    else:
+        ims = request.if_modified_since    # ใช้เมื่อไม่มี If-None-Match เท่านั้น
+        fresh = ims is not None and feed.last_modified <= ims
+    if fresh:
+        FEED_STATS["not_modified"] += 1
+        return web.Response(status=304, headers=headers)
+    return web.Response(body=feed.bodies[fmt], headers=headers, content_type=content_type, charset="utf-8")
+
+async def handle_schedule_json(request):
+    return await serve_feed(request, "json", "application/json")
+
+async def handle_schedule_ics(request):
+    return await serve_feed(request, "ics", "text/calendar")
 
 # ========= Commands =========
 @bot.command()
 async def ping(ctx):
     await ctx.send("✅ บอทยังทำงานอยู่")
 
+async def ctx_tenant(ctx) -> Optional[Tenant]:
+    """tenant ของกิลด์ที่สั่ง — ยังไม่ได้ลงทะเบียนตอบกลับแล้วคืน None"""
+    t = tenant_for(ctx.guild)
+    if t is None:
+        await ctx.send("❌ กิลด์นี้ยังไม่ได้ตั้งค่าตารางบอส", delete_after=10)
+    return t
+
+class BossSnapshot:
+    """
+    ข้อมูลสำหรับ !boss จากไทม์ไลน์ของ tenant ในหน่วยความจำ (check_alerts รีเฟรชเบื้องหลัง)
+    ข้อความแต่ละบรรทัด render ไว้แล้วต่อ version ของไทม์ไลน์ ตอนตอบเติมแค่ 'อีก N นาที'
+    """
+
+    def __init__(self, t: Tenant):
+        self.t = t
+        self._version = None
+        self._fields = []         # [(field_name, value_prefix, epoch)] เรียงตามเวลา
+        self._loading = None      # Task โหลดชีตครั้งแรก — คำขอพร้อมกันรอ Task เดียวกัน
+
+    async def ensure_loaded(self):
+        if self.t.timeline.sheet_loaded:
+            return
+        if self._loading is None or self._loading.done():
+            self._loading = asyncio.create_task(get_boss_from_sheet(self.t))
+        try:
+            await asyncio.shield(self._loading)
+        except Exception as e:
+            log(f"[ERROR] โหลดตารางสำหรับ !boss: {e}")
+
+    def _render(self):
+        timeline = self.t.timeline
+        if self._version == timeline.version:
+            return
+        bosses = timeline.next_per_source()
+
+        # รวม worldboss เวลาเดียวกันให้เหลือ 1 บรรทัด
+        world_groups, used = {}, set()
+        for b in bosses:
+            if b.world and b.ws == "Fixed":
+                world_groups.setdefault(b.minute, set()).add(normalize_name(b.name))
+
+        fields = []
+        for b in bosses:
+            spawn_dt = b.spawn_dt
+            when = f"{spawn_dt.strftime('%H:%M')} ({weekday_th(spawn_dt)} {spawn_dt.strftime('%d/%m')})"
+            if b.world and b.ws == "Fixed":
+                if b.minute in used or world_groups.get(b.minute) != WORLD_BOSSES:
+                    continue
+                used.add(b.minute)
+                fields.append((f"{WORLD_EMOJI} Worldboss", f"{when} • ลาตัน • พาร์โต • เนดร้า", b.epoch))
+                continue
+            title = f"{NORMAL_EMOJI} {b.name}" + (f" • Lv.{b.level}" if b.level else "")
+            if b.location: when += f" • {b.location}"
+            fields.append((title, when, b.epoch))
+
+        self._fields = fields
+        self._version = timeline.version
+
+    def _build(self, now_dt: datetime, title: str, when) -> Tuple[discord.Embed, int]:
+        self.t.timeline.advance(now_dt)   # ตัดรอบที่ผ่านไปแล้ว (ถูก ไม่ยิงชีต)
+        self._render()
+        now_ts = now_dt.timestamp()
+        embed = discord.Embed(title=title, color=0x00ccff)
+        count = 0
+        for name, prefix, epoch in self._fields:
+            delta_m = int((epoch - now_ts) // 60)
+            if delta_m <= 0:
+                continue
+            embed.add_field(name=name, value=f"{prefix} • {when(epoch, delta_m)}", inline=False)
+            count += 1
+            if count >= 25:
+                break
+        if count == 0:
+            embed.description = "❌ ยังไม่มีบอสที่จะเกิดถัดไป"
+        return embed, count
+
+    def embed(self, now_dt: datetime) -> discord.Embed:
+        embed, _ = self._build(now_dt, "🕒 ตารางเกิดถัดไป", lambda epoch, delta_m: f"อีก {delta_m} นาที")
+        embed.set_footer(text="อัปเดตเมื่อ " + now_dt.strftime("%d/%m/%Y %H:%M") + self._stale_note())
+        return embed
+
+    def _stale_note(self) -> str:
+        if not sheet_is_stale(self.t):
+            return ""
+        last = self.t.last_sheet_ok
+        if last is None:
+            return " • ⚠️ ยังอ่านชีตไม่ได้ (แสดงเฉพาะบอส Fixed)"
+        return f" • ⚠️ อ่านชีตไม่ได้ ใช้ข้อมูลเมื่อ {datetime.fromtimestamp(last, tz):%d/%m %H:%M}"
+
+    def board_embed(self, now_dt: datetime) -> discord.Embed:
+        """แบบบอร์ด: นับถอยหลังด้วย <t:...:R> ให้ Discord แสดงเอง → เนื้อหาเปลี่ยนเฉพาะตอนตารางเปลี่ยน"""
+        embed, _ = self._build(now_dt, "📌 ตารางเกิดถัดไป", lambda epoch, delta_m: f"<t:{epoch}:R>")
+        embed.set_footer(text="อัปเดตอัตโนมัติ" + self._stale_note())
+        return embed
+
 @bot.command()
 async def boss(ctx):
-    """แสดงเฉพาะ 'รอบถัดไป' แบบข้ามวัน (รวม Fixed + ชีตตามกติกาใหม่)"""
-    now = datetime.now(tz)
-    bosses = get_boss_from_sheet()
-    embed = discord.Embed(title="🕒 ตารางเกิดถัดไป", color=0x00ccff)
-
-    # รวม worldboss เวลาเดียวกันให้เหลือ 1 บรรทัด
-    world_groups, used = {}, set()
-    for ws, name, spawn_dt, *_ in bosses:
-        if is_world_boss(name) and ws == "Fixed":
-            key = spawn_dt.strftime("%Y%m%d-%H%M")
-            world_groups.setdefault(key, {"dt": spawn_dt, "names": set()})
-            world_groups[key]["names"].add(normalize_name(name))
-
-    count = 0
-    for ws, name, spawn_dt, level, location in bosses:
-        delta_m = int((spawn_dt - now).total_seconds()//60)
-        if delta_m <= 0:
-            continue
+    """แสดงเฉพาะ 'รอบถัดไป' แบบข้ามวัน (รวม Fixed + ชีตตามกติกาใหม่) ของกิลด์นี้ จาก snapshot ในหน่วยความจำ"""
+    t = await ctx_tenant(ctx)
+    if t is None:
+        return
+    await t.snapshot.ensure_loaded()
+    await ctx.send(embed=t.snapshot.embed(clock.now()))
 
-        if is_world_boss(name) and ws == "Fixed":
-            key = spawn_dt.strftime("%Y%m%d-%H%M")
-            if key in used: 
+@bot.command()
+async def kill(ctx, *args):
+    """!kill <ชื่อบอส|#แถว> [dd/mm] [HH:MM] — บันทึกเวลาตาย (ไม่ระบุเวลา = ตอนนี้) ตารางและแจ้งเตือนอัปเดตทันที ชีตตามมาภายในไม่กี่วินาที"""
+    t = await ctx_tenant(ctx)
+    if t is None:
+        return
+    if not args:
+        await ctx.send("ใช้: `!kill <ชื่อบอส> [dd/mm] [HH:MM]` เช่น `!kill คลาแมนทีส 12:30`", delete_after=15)
+        return
+    await t.snapshot.ensure_loaded()
+    now = clock.now()
+    hit = WS_CACHE.get(t.key)
+    try:
+        if hit is None or hit["col"].get("kill_dt") is None:
+            raise ValueError("ชีตยังไม่มีคอลัมน์ kill_dt (หรือยังอ่านชีตไม่ได้)")
+        query, kill_dt = parse_kill_args(args, now)
+        n, row = resolve_kill_row(t, query)
+    except ValueError as e:
+        await ctx.send(f"❌ {e}", delete_after=15)
+        return
+    kill_writes.submit(t, n, row, kill_dt, ctx.channel.id)
+    nxt = compute_next_interval(kill_dt, row.hours, now)
+    log(f"[SHEET] {t.tag}!kill {row.name} (แถว {n}) {kill_dt:%d/%m %H:%M} โดย {ctx.author} (รอเขียน {len(kill_writes)})")
+    await ctx.send(f"✅ {row.name} ตาย {kill_dt:%H:%M} ({weekday_th(kill_dt)} {kill_dt:%d/%m}) → เกิดถัดไป "
+                   f"{nxt:%H:%M} ({weekday_th(nxt)} {nxt:%d/%m}) • บันทึกลงชีตภายใน ~{int(KILL_FLUSH_SEC)} วินาที")
+
+SUB_LEVEL_RE = re.compile(r"^(\d{1,3})(?:-(\d{1,3}))?$")
+
+def known_boss_names(t: Tenant) -> set:
+    names = set(FIXED_WEEKLY_TIMES) | WORLD_BOSSES
+    names.update(r.name for r in (t.timeline.sheet_rows or {}).values())
+    return names
+
+def parse_sub_args(t: Tenant, args: tuple) -> dict:
+    """'<ชื่อบอส> [นาที]' | 'lv <ต่ำ>[-<สูง>] [นาที]' | 'world [นาที]' → kwargs ของ subscriptions.add (ผิด → ValueError)"""
+    args = list(args)
+    lead = SUB_DEFAULT_LEAD_MIN
+    if len(args) > 1 and args[-1].isdigit():
+        lead = int(args.pop())
+    if not 1 <= lead <= SUB_MAX_LEAD_MIN:
+        raise ValueError(f"เวลาแจ้งล่วงหน้าต้องอยู่ระหว่าง 1-{SUB_MAX_LEAD_MIN} นาที")
+    head = args[0].lower() if args else ""
+    if head in ("world", "เวิลด์", "worldboss"):
+        return {"kind": "world", "lead_min": lead}
+    if head in ("lv", "level", "เลเวล"):
+        m = SUB_LEVEL_RE.match("".join(args[1:]))
+        if not m:
+            raise ValueError("ระบุช่วงเลเวล เช่น `!sub lv 40-60 15`")
+        lo, hi = int(m.group(1)), int(m.group(2) or m.group(1))
+        if lo > hi or hi > SUB_MAX_LEVEL:
+            raise ValueError(f"ช่วงเลเวลไม่ถูกต้อง: {lo}-{hi}")
+        return {"kind": "level", "lv_min": lo, "lv_max": hi, "lead_min": lead}
+    query = normalize_name(" ".join(args))
+    names = known_boss_names(t)
+    hits = [query] if query in names else sorted(n for n in names if query and query in n)
+    if len(hits) != 1:
+        raise ValueError(f"ไม่พบบอสชื่อ '{query}'" if not hits else f"ชื่อกำกวม: {', '.join(hits[:10])}")
+    if is_world_boss(hits[0]):
+        return {"kind": "world", "lead_min": lead}   # เวิลด์บอสแจ้งรวมกันทั้งสามตัวอยู่แล้ว
+    return {"kind": "name", "name": hits[0], "lead_min": lead}
+
+def describe_sub(s: Subscription) -> str:
+    what = {"name": s.name, "level": f"Lv.{s.lv_min}-{s.lv_max}", "world": "Worldboss"}[s.kind]
+    return f"`#{s.id}` {what} • ก่อนเกิด {s.lead_min} นาที"
+
+@bot.command()
+async def sub(ctx, *args):
+    """!sub <ชื่อบอส> [นาที] | !sub lv <ต่ำ>-<สูง> [นาที] | !sub world [นาที] — DM เตือนก่อนเกิด (ค่าเริ่มต้น 10 นาที)"""
+    t = await ctx_tenant(ctx)
+    if t is None:
+        return
+    if not args:
+        await ctx.send("ใช้: `!sub <ชื่อบอส> [นาที]`, `!sub lv 40-60 [นาที]`, `!sub world [นาที]` • ดู `!subs` • เลิก `!unsub <#id|all>`",
+                       delete_after=20)
+        return
+    mine = subscriptions.for_user(t.key, ctx.author.id)
+    try:
+        spec = parse_sub_args(t, args)
+        if len(mine) >= SUB_MAX_PER_USER:
+            raise ValueError(f"ติดตามได้ไม่เกิน {SUB_MAX_PER_USER} รายการ (`!unsub` ก่อน)")
+        spec = {"name": "", "lv_min": 0, "lv_max": 0, **spec}
+        if any(s._replace(id=0, tenant="", user_id=0) == Subscription(0, "", 0, **spec) for s in mine):
+            raise ValueError("ติดตามแบบนี้ไว้แล้ว")
+    except ValueError as e:
+        await ctx.send(f"❌ {e}", delete_after=15)
+        return
+    s = subscriptions.add(t.key, ctx.author.id, **spec)
+    resync_alerts(t, clock.now())   # รอบที่อยู่ในช่วง lookahead แล้วได้ DM ทันที
+    log(f"[SCHED] {t.tag}{ctx.author} ติดตาม {describe_sub(s)} (รวม {len(subscriptions)})")
+    await ctx.send(f"🔔 ติดตามแล้ว {describe_sub(s)} — จะส่งทาง DM (ต้องเปิดรับ DM จากสมาชิกเซิร์ฟเวอร์)")
+
+@bot.command()
+async def subs(ctx):
+    """รายการที่ตัวเองติดตามในกิลด์นี้"""
+    t = await ctx_tenant(ctx)
+    if t is None:
+        return
+    mine = subscriptions.for_user(t.key, ctx.author.id)
+    if not mine:
+        await ctx.send("ยังไม่ได้ติดตามบอสใด — `!sub <ชื่อบอส> [นาที]`", delete_after=15)
+        return
+    await ctx.send("🔔 ติดตามอยู่:\n" + "\n".join(describe_sub(s) for s in mine))
+
+@bot.command()
+async def unsub(ctx, *args):
+    """!unsub <#id ...|all> — เลิกติดตาม"""
+    t = await ctx_tenant(ctx)
+    if t is None:
+        return
+    if not args:
+        await ctx.send("ใช้: `!unsub <#id ...>` หรือ `!unsub all` (ดู id ด้วย `!subs`)", delete_after=15)
+        return
+    ids = None if args[0].lower() == "all" else {int(a.lstrip("#")) for a in args if a.lstrip("#").isdigit()}
+    n = subscriptions.remove(t.key, ctx.author.id, ids)
+    if n:
+        resync_alerts(t, clock.now())
+    await ctx.send(f"🔕 เลิกติดตาม {n} รายการ" if n else "❌ ไม่พบรายการที่ระบุ (ดูด้วย `!subs`)", delete_after=15)
+
+# === บอร์ดตาราง (ปักหมุด แก้ในที่เดิม) ===
+def discord_error_reason(e: discord.HTTPException) -> str:
+    """ข้อความสั้นๆ ให้คนสั่งรู้ว่าต้องแก้อะไร"""
+    if isinstance(e, discord.Forbidden):
+        return "บอทไม่มีสิทธิ์ในห้องนี้ (ต้องมี Send Messages, Embed Links และ Manage Messages สำหรับปักหมุด)"
+    if isinstance(e, discord.NotFound):
+        return "ไม่พบห้อง/ข้อความ"
+    return f"Discord ตอบ {e.status}: {e.text or type(e).__name__}"
+
+class ScheduleBoard:
+    """
+    ข้อความตาราง 1 ข้อความต่อห้อง ปักหมุดไว้แล้ว edit ในที่เดิมเฉพาะตอนเนื้อหาเปลี่ยน
+    message id เก็บใน SQLite ไฟล์เดียวกับ ledger เพื่อใช้ข้อความเดิมหลังรีสตาร์ท
+    """
+
+    def __init__(self, path: str):
+        try:
+            self._db = sqlite3.connect(path)
+        except sqlite3.Error:
+            self._db = sqlite3.connect(":memory:")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS boards (channel_id INTEGER PRIMARY KEY, message_id INTEGER)"
+        )
+        self._msg_ids = dict(self._db.execute("SELECT channel_id, message_id FROM boards"))
+        self._digest = {}   # channel_id → hash เนื้อหาที่แสดงอยู่
+        self.pin_errors = {}   # channel_id → เหตุที่ปักหมุดไม่ได้ครั้งล่าสุด (!board แจ้งคนสั่ง)
+
+    def channels(self) -> set:
+        chans = set(self._msg_ids)
+        if BOARD_ENABLED:
+            for t in TENANTS:
+                chans |= set(t.channel_map.values())
+        return chans
+
+    def message_id(self, channel_id: int) -> Optional[int]:
+        return self._msg_ids.get(channel_id)
+
+    def _save(self, channel_id: int, message_id: Optional[int]):
+        self._msg_ids[channel_id] = message_id
+        with self._db:
+            self._db.execute("INSERT OR REPLACE INTO boards VALUES (?, ?)", (channel_id, message_id))
+
+    def refresh(self, channel_id: int):
+        """update ครั้งถัดไปต้อง edit/ส่งจริงแม้เนื้อหาเหมือนเดิม (ห้องจะอยู่ใน channels() เมื่อส่งสำเร็จแล้วเท่านั้น)"""
+        self._digest.pop(channel_id, None)
+
+    async def update(self, channel_id: int, embed: discord.Embed) -> bool:
+        """edit บอร์ดถ้าเนื้อหาต่างจากที่แสดงอยู่ (ไม่มีข้อความ/ถูกลบ → ส่งใหม่แล้วปักหมุด)"""
+        digest = hashlib.blake2b(json.dumps(embed.to_dict(), sort_keys=True, ensure_ascii=False).encode("utf-8"),
+                                 digest_size=16).digest()
+        if self._digest.get(channel_id) == digest:
+            return False
+
+        await alert_dispatcher.pace(channel_id)
+        ch = await alert_dispatcher.channel(channel_id)
+        mid = self._msg_ids.get(channel_id)
+        if mid:
+            try:
+                with METRICS.timer("l9_discord_send_seconds"):
+                    await ch.get_partial_message(mid).edit(embed=embed)
+                self._digest[channel_id] = digest
+                return True
+            except discord.NotFound:
+                log(f"[BOARD] ข้อความบอร์ดห้อง {channel_id} หาย — สร้างใหม่")
+
+        msg = await ch.send(embed=embed)
+        try:
+            await msg.pin()
+            self.pin_errors.pop(channel_id, None)
+        except discord.HTTPException as e:
+            self.pin_errors[channel_id] = discord_error_reason(e)
+            log(f"[WARN] ปักหมุดบอร์ดห้อง {channel_id} ไม่ได้: {e}")
+        self._save(channel_id, msg.id)
+        self._digest[channel_id] = digest
+        return True
+
+    async def update_all(self, now_dt: datetime):
+        embeds = {}   # tenant key → embed (render ครั้งเดียวต่อ tenant)
+        for cid in self.channels():
+            t = tenant_for_channel(cid)
+            if t is None or not t.timeline.sheet_loaded:   # รอโหลดชีตรอบแรกก่อน ไม่งั้นจะ edit ซ้ำทันทีที่ชีตมา
                 continue
-            if world_groups.get(key, {}).get("names") == WORLD_BOSSES:
-                embed.add_field(
-                    name=f"{WORLD_EMOJI} Worldboss",
-                    value=f"{spawn_dt.strftime('%H:%M')} ({weekday_th(spawn_dt)} {spawn_dt.strftime('%d/%m')}) • ลาตัน • พาร์โต • เนดร้า • อีก {delta_m} นาที",
-                    inline=False
-                )
-                used.add(key)
-                count += 1
-            continue
+            if t.key not in embeds:
+                embeds[t.key] = t.snapshot.board_embed(now_dt)
+            try:
+                if await self.update(cid, embeds[t.key]):
+                    log(f"[BOARD] อัปเดตบอร์ดห้อง {cid}")
+            except Exception as e:
+                log(f"[ERROR] อัปเดตบอร์ดห้อง {cid}: {e}")
 
-        title = f"{NORMAL_EMOJI} {name}" + (f" • Lv.{level}" if level else "")
-        line  = f"{spawn_dt.strftime('%H:%M')} ({weekday_th(spawn_dt)} {spawn_dt.strftime('%d/%m')})"
-        if location: line += f" • {location}"
-        line += f" • อีก {delta_m} นาที"
-        embed.add_field(name=title, value=line, inline=False)
-        count += 1
-        if count >= 25:
-            break
+schedule_board: Optional[ScheduleBoard] = None   # open_stores()
+
+@tasks.loop(seconds=BOARD_EDIT_SEC)
+async def update_boards():
+    if lease.leader():
+        await schedule_board.update_all(clock.now())
 
-    if count == 0:
-        embed.description = "❌ ยังไม่มีบอสที่จะเกิดถัดไป"
-    embed.set_footer(text="อัปเดตเมื่อ " + now.strftime("%d/%m/%Y %H:%M"))
-    await ctx.send(embed=embed)
+@bot.command()
+@has_permissions(manage_messages=True)
+async def board(ctx):
+    """สร้าง/รีเฟรชบอร์ดตารางที่ปักหมุดในห้องนี้"""
+    t = await ctx_tenant(ctx)
+    if t is None:
+        return
+    if ctx.channel.id not in t.channels():
+        await ctx.send("❌ ใช้ได้เฉพาะในห้องแจ้งเตือนบอสเท่านั้น", delete_after=10)
+        return
+    await t.snapshot.ensure_loaded()
+    cid = ctx.channel.id
+    schedule_board.refresh(cid)
+    try:
+        await schedule_board.update(cid, t.snapshot.board_embed(clock.now()))
+    except discord.HTTPException as e:
+        # ส่งครั้งแรกไม่สำเร็จ → ยังไม่บันทึกห้อง (update_all จะไม่วนลองห้องนี้ซ้ำทุกรอบ)
+        log(f"[ERROR] {t.tag}!board ห้อง {cid} โดย {ctx.author}: {e}")
+        with contextlib.suppress(discord.HTTPException):   # ห้องที่ส่งไม่ได้ก็ตอบไม่ได้เช่นกัน
+            await ctx.send(f"❌ สร้างบอร์ดไม่ได้: {discord_error_reason(e)}", delete_after=15)
+        return
+    reason = schedule_board.pin_errors.get(cid)
+    if reason:
+        await ctx.send(f"⚠️ สร้างบอร์ดแล้วแต่ปักหมุดไม่ได้: {reason}", delete_after=15)
 
 # === ลบข้อความทั้งหมดในห้อง ===
+BULK_DELETE_MAX_AGE   = timedelta(days=14) - timedelta(minutes=10)   # bulk delete รับเฉพาะข้อความอายุ < 14 วัน (เผื่อเวลาไว้)
+BULK_DELETE_CHUNK     = 100
+PURGE_OLD_CONCURRENCY = 3      # ข้อความเก่าต้องลบทีละข้อความ — จำกัดจำนวนที่ลบพร้อมกัน
+PURGE_PROGRESS_SEC    = 3.0
+
+async def purge_channel(channel, skip_ids=(), progress=None) -> dict:
+    """
+    ลบทุกข้อความในห้อง: อายุ < 14 วันใช้ bulk delete ทีละ 100, ที่เก่ากว่าลบทีละข้อความ
+    พร้อมกันไม่เกิน PURGE_OLD_CONCURRENCY (discord.py รอตาม rate limit bucket ให้เอง)
+    คืน {"deleted", "failed", "errors": {ชื่อ exception: จำนวน}} และเรียก progress(result) เป็นระยะ
+    """
+    result = {"deleted": 0, "failed": 0, "errors": {}}
+    cutoff = discord.utils.utcnow() - BULK_DELETE_MAX_AGE
+    last_report = time.monotonic()
+
+    def failed(ex: Exception, n: int = 1):
+        result["failed"] += n
+        name = type(ex).__name__
+        result["errors"][name] = result["errors"].get(name, 0) + n
+
+    async def report(force: bool = False):
+        nonlocal last_report
+        if progress and (force or time.monotonic() - last_report >= PURGE_PROGRESS_SEC):
+            last_report = time.monotonic()
+            try:
+                await progress(result)
+            except Exception:
+                pass
+
+    async def delete_one(msg):
+        try:
+            await msg.delete()
+            result["deleted"] += 1
+        except discord.NotFound:
+            pass   # ถูกลบไปแล้ว
+        except Exception as ex:
+            failed(ex)
+
+    async def bulk(batch):
+        try:
+            await channel.delete_messages(batch)
+            result["deleted"] += len(batch)
+        except discord.HTTPException as ex:
+            # บางข้อความหายไปแล้ว/อายุเกินระหว่างลบ → ลบทีละข้อความแทน
+            log(f"[WARN] bulk delete ไม่สำเร็จ ({ex}) — ลบทีละข้อความ")
+            for msg in batch:
+                await delete_one(msg)
+        except Exception as ex:
+            failed(ex, len(batch))
+        await report()
+
+    old_q = asyncio.Queue(maxsize=PURGE_OLD_CONCURRENCY * 2)
+
+    async def old_worker():
+        while True:
+            msg = await old_q.get()
+            try:
+                if msg is None:
+                    return
+                await delete_one(msg)
+                await report()
+            finally:
+                old_q.task_done()
+
+    workers = [asyncio.create_task(old_worker()) for _ in range(PURGE_OLD_CONCURRENCY)]
+    chunk = []
+    try:
+        # history เรียงใหม่→เก่า: เจอข้อความเก่าแล้วที่เหลือก็เก่าหมด
+        async for msg in channel.history(limit=None):
+            if msg.id in skip_ids:
+                continue
+            if msg.created_at > cutoff:
+                chunk.append(msg)
+                if len(chunk) >= BULK_DELETE_CHUNK:
+                    await bulk(chunk)
+                    chunk = []
+            else:
+                await old_q.put(msg)
+    except Exception as ex:
+        failed(ex)
+        log(f"[ERROR] อ่านประวัติห้อง {getattr(channel, 'id', '?')}: {ex}")
+    finally:
+        if chunk:
+            await bulk(chunk)   # ที่เก็บไว้แล้วต้องลบด้วย แม้ history ล้มกลางทาง
+        for _ in workers:
+            await old_q.put(None)
+        await asyncio.gather(*workers, return_exceptions=True)
+
+    await report(force=True)
+    return result
+
 @bot.command()
 @has_permissions(manage_messages=True)
 async def deleteall(ctx):
-    allowed_channels = set(SHEET_CHANNEL_MAP.values()) | {CHANNEL_ID_DEFAULT}
-    if ctx.channel.id not in allowed_channels:
+    t = await ctx_tenant(ctx)
+    if t is None:
+        return
+    if ctx.channel.id not in t.channels():
         await ctx.send("❌ ใช้ได้เฉพาะในห้องแจ้งเตือนบอสเท่านั้น", delete_after=10)
         return
 
@@ -623,16 +3578,25 @@ async def deleteall(ctx):
             if interaction.user != ctx.author:
                 await interaction.response.send_message("⛔ คุณไม่ใช่ผู้สั่งลบ", ephemeral=True)
                 return
-            deleted = 0
-            async for msg in ctx.channel.history(limit=None):
-                try:
-                    await msg.delete()
-                    deleted += 1
-                    await asyncio.sleep(0.3)
-                except:
-                    pass
-            await interaction.channel.send(f"🧹 ลบข้อความทั้งหมดแล้ว ({deleted} ข้อความ)", delete_after=10)
             self.stop()
+            await interaction.response.edit_message(content="🧹 กำลังลบ...", view=None)
+            prompt = interaction.message
+
+            async def progress(r):
+                await prompt.edit(content=f"🧹 กำลังลบ... {r['deleted']} ข้อความ")
+
+            # ไม่ลบข้อความยืนยัน (ใช้แสดงความคืบหน้า แล้วค่อยลบทิ้งตอนจบ) และบอร์ดตาราง
+            skip = {prompt.id, schedule_board.message_id(ctx.channel.id)}
+            r = await purge_channel(ctx.channel, skip_ids=skip, progress=progress)
+            summary = f"🧹 ลบข้อความทั้งหมดแล้ว ({r['deleted']} ข้อความ)"
+            if r["failed"]:
+                errs = ", ".join(f"{k}×{v}" for k, v in r["errors"].items())
+                summary += f" • ลบไม่สำเร็จ {r['failed']} ({errs})"
+            log(f"[PURGE] ห้อง {ctx.channel.id}: {r}")
+            try:
+                await prompt.edit(content=summary, delete_after=10)
+            except Exception:
+                await interaction.channel.send(summary, delete_after=10)
 
         @discord.ui.button(label="ยกเลิก", style=discord.ButtonStyle.secondary)
         async def cancel(self, interaction: Interaction, button: Button):
@@ -647,25 +3611,108 @@ async def deleteall(ctx):
 # ========= Debug =========
 def debug_list_tabs():
     try:
-        client, creds = gspread_client()
-        ss, how = open_spreadsheet(client)
-        tabs = [ws.title for ws in ss.worksheets()]
+        _, creds = gspread_client()
         sa_email = getattr(creds, "_service_account_email", "(unknown)")
-        log(f"[DEBUG] Opened by {how}. Worksheets: {tabs}")
         log(f"[DEBUG] Service Account email (แชร์สิทธิ์ไฟล์ให้บัญชีนี้): {sa_email}")
-    except gspread.exceptions.SpreadsheetNotFound:
-        log("[DEBUG] SpreadsheetNotFound: เปิดไฟล์ไม่สำเร็จ — ตรวจ ID/URL/NAME และการแชร์สิทธิ์")
     except Exception as e:
-        log(f"[DEBUG] list tabs error: {type(e).__name__}: {e}")
+        log(f"[DEBUG] auth error: {type(e).__name__}: {e}")
+        return
+    for t in TENANTS:
+        try:
+            ss, how = sheet_session.spreadsheet(t.spreadsheet_id)
+            tabs = [ws.title for ws in ss.worksheets()]
+            log(f"[DEBUG] {t.tag}Opened by {how}. Worksheets: {tabs}")
+            choose_ws(ss, t)   # สแกนเลือกแท็บครั้งแรกตอนเริ่ม แล้ว cache ไว้
+        except gspread.exceptions.SpreadsheetNotFound:
+            log(f"[DEBUG] {t.tag}SpreadsheetNotFound: เปิดไฟล์ไม่สำเร็จ — ตรวจ ID/URL/NAME และการแชร์สิทธิ์")
+        except Exception as e:
+            log(f"[DEBUG] {t.tag}list tabs error: {type(e).__name__}: {e}")
+    log(f"[DEBUG] sheet stats: {SHEET_STATS}")
+
+async def warm_start(t: Tenant):
+    """โหลดตารางของ tenant จาก snapshot บนดิสก์เข้าไทม์ไลน์ทันที (ไม่แตะ Google) — check_alerts กระทบยอดกับชีตทีหลัง"""
+    t0 = time.perf_counter()
+    snap = await run_blocking(restore_snapshot, t)
+    if snap is None:
+        return
+    ws_name, rows, saved_at = snap
+    now = clock.now()
+    t.timeline.advance(now)
+    until = t.timeline.until
+    sources, entries = await run_blocking(build_sheet_update, ws_name, list(rows.values()), now, until)
+    t.timeline.replace_sheet(rows, sources, entries, until)   # "reset" → คิวแจ้งเตือนวางใหม่ทันที
+    t.last_sheet_ok = saved_at
+    age = int(clock.time() - saved_at)
+    log(f"[SNAP] {t.tag}warm start '{ws_name}' {len(rows)} แถว ใน {(time.perf_counter() - t0) * 1000:.0f} ms "
+        f"(snapshot อายุ {age} วินาที, รอส่ง {len(alert_scheduler)})")
+
+SNAPSHOT_SEEN = {}   # tenant key → mtime ของ snapshot ที่โหลดแล้ว (standby)
+
+async def follow_snapshot(t: Tenant):
+    """standby: snapshot ของ tenant เปลี่ยน (leader อ่านชีตได้ของใหม่) → โหลดเข้าไทม์ไลน์"""
+    path = snapshot_path(t)
+    try:
+        mtime = os.stat(path).st_mtime if path else None
+    except OSError:
+        return
+    if mtime is None or SNAPSHOT_SEEN.get(t.key) == mtime:
+        return
+    SNAPSHOT_SEEN[t.key] = mtime
+    SHEET_CACHE.pop(t.key, None)   # ให้ restore_snapshot แทน cache ด้วยของใหม่ (ตอนรับช่วงจะ diff กับชีตจากจุดนี้)
+    await warm_start(t)
+
+def open_stores(ledger_db: str = ALERT_LEDGER_DB, lease_db: str = LEASE_DB):
+    """เปิด SQLite ของ ledger / ผู้ติดตาม / บอร์ด / lease — เรียกตอนเริ่ม (setup_hook, simulate.py) ไม่ใช่ตอน import"""
+    global alerted, subscriptions, schedule_board, lease
+    alerted = AlertLedger(ledger_db)
+    subscriptions = SubscriptionStore(ledger_db)
+    schedule_board = ScheduleBoard(ledger_db)
+    lease = LeaderLease(lease_db)
+
+async def shutdown():
+    """SIGTERM (deploy ใหม่): ปล่อย lease ให้ replica ใหม่รับช่วงทันที แล้วปิดบอท"""
+    lease.release()
+    await bot.close()
+
+@bot.event
+async def on_message(message):
+    # standby ไม่ตอบคำสั่ง (ทุก replica ได้ข้อความเดียวกันจาก gateway)
+    if lease.leader():
+        await bot.process_commands(message)
+
+@bot.event
+async def setup_hook():
+    # เริ่มครั้งเดียวต่อโปรเซส (on_ready อาจถูกเรียกซ้ำตอน reconnect)
+    open_stores()
+    await start_http_server()
+    asyncio.create_task(monitor_loop_lag())
+    log(f"[HTTP] เปิด /healthz และ /metrics ที่พอร์ต {os.getenv('PORT', '8080')}")
+    log(f"[DEBUG] tenants: {[t.key for t in TENANTS]}")
+
+    # login แล้ว (ส่งข้อความผ่าน HTTP ได้) — เริ่มแจ้งเตือนจาก snapshot โดยไม่รอ gateway/ชีต
+    await asyncio.gather(*(warm_start(t) for t in TENANTS))
+    await lease.start()
+    with contextlib.suppress(NotImplementedError):
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, lambda: asyncio.create_task(shutdown()))
+    alert_scheduler.start()
+    kill_writes.start()
+    check_alerts.start()
+    asyncio.create_task(run_blocking(debug_list_tabs))   # log อย่างเดียว ไม่ต้องรอ
 
-# ========= Lifecycle =========
 @bot.event
 async def on_ready():
     log(f"✅ Logged in as {bot.user}")
-    debug_list_tabs()
-    if not check_alerts.is_running():
-        check_alerts.start()
+    if not update_boards.is_running():
+        update_boards.start()
 
 # ========= Run =========
 if __name__ == "__main__":
-    bot.run(TOKEN)
+    if not TOKEN:
+        raise RuntimeError("ENV DISCORD_TOKEN ไม่ได้ตั้งค่า")
+    log_listener = setup_logging()
+    try:
+        bot.run(TOKEN)
+    finally:
+        if lease:
+            lease.release()
+        log_listener.stop()
@@ -0,0 +1,391 @@
+# -*- coding: utf-8 -*-
+# ===== L9 Boss Timer: จำลองหลายวันแบบเร่งเวลา (ไม่ต่อ Google/Discord) =====
+# python simulate.py --rows 200 --days 7 [--tenants N] [--subs N] [--json] [--bench]
+#
+# เดินเวลาจำลองด้วย clock ที่ตรึงไว้ ผ่านโค้ดจริงทั้งเส้นทาง (ชีต → ไทม์ไลน์ → คิว → dispatcher)
+# โดยใช้ชีต/Discord ปลอมในหน่วยความจำ — ตรวจว่าแจ้งเตือนทุกจุดส่งครั้งเดียวพอดี + วัดตัวเลข
+# แต่ละรอบโหลดสคริปต์บอทเป็นโมดูลใหม่ (load_bot) แล้วแทน singleton ของโมดูลนั้นด้วยของปลอม → รันกี่รอบในโปรเซสเดียวก็ได้
+
+import gc, os, re, sys, time, json, random, asyncio, argparse, itertools, subprocess, importlib.util
+from collections import Counter, deque
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from typing import List, Optional
+
+import gspread
+
+BOT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "l9 new boss timer.py")
+
+SIM_START    = datetime(2026, 1, 5)    # จันทร์ 00:00 — เริ่มที่เดิมทุกครั้ง ผลซ้ำได้
+SIM_TICK_SEC = 60                      # เท่ากับรอบ check_alerts
+SIM_HEADER   = ["level", "name", "location", "kill_time", "next_spawn", "date_kill",
+                "date_spawn", "spawn_type", "spawn_detail", "note", "kill_dt"]
+SIM_BENCH_ROWS = (100, 2000, 20000)
+WEEKDAY_THAI = ["จันทร์", "อังคาร", "พุธ", "พฤหัสบดี", "ศุกร์", "เสาร์", "อาทิตย์"]
+A1_RANGE_RE = re.compile(r"^'(.+)'!([A-Z]+)(\d+):([A-Z]+)(\d+)$")
+A1_CELL_RE  = re.compile(r"^'(.+)'!([A-Z]+)(\d+)$")
+
+_loads = itertools.count(1)
+
+def load_bot():
+    """โหลดสคริปต์บอทเป็นโมดูลใหม่ทุกครั้ง — singleton/สถิติ/clock ของแต่ละรอบจำลองไม่ปนกัน"""
+    spec = importlib.util.spec_from_file_location(f"l9_bot_{next(_loads)}", BOT_PATH)
+    bot = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(bot)
+    return bot
+
+# ========= ของปลอม =========
+class FakeSpreadsheet:
+    """ชีตปลอม: มีเฉพาะเมธอดที่บอทเรียกจริง (worksheets / values_batch_get / values_batch_update / get_lastUpdateTime)"""
+
+    def __init__(self, title: str, rows: list, ss_id: str):
+        self.id = ss_id
+        self.title = title
+        self.rows = rows
+        self.modified = 0
+        self.calls = 0
+
+    def worksheets(self):
+        self.calls += 1
+        return [SimpleNamespace(title=self.title)]
+
+    def values_batch_get(self, ranges: list) -> dict:
+        self.calls += 1
+        out = []
+        for rng in ranges:
+            m = A1_RANGE_RE.match(rng)
+            vals = []
+            if m and m.group(1) == self.title:
+                vals = self.rows[int(m.group(3)) - 1:int(m.group(5))]
+            out.append({"range": rng, "values": vals})
+        return {"valueRanges": out}
+
+    def values_batch_update(self, body: dict) -> dict:
+        self.calls += 1
+        for d in body["data"]:
+            m = A1_CELL_RE.match(d["range"])
+            if m and m.group(1) == self.title:
+                self.edit(int(m.group(3)), gspread.utils.a1_to_rowcol(m.group(2) + m.group(3))[1] - 1, d["values"][0][0])
+        return {"totalUpdatedCells": len(body["data"])}
+
+    def get_lastUpdateTime(self) -> str:
+        self.calls += 1
+        return f"sim-{self.modified}"
+
+    def edit(self, row_no: int, col: int, value: str):
+        self.rows[row_no - 1][col] = value
+        self.modified += 1
+
+class FakeSheetSession:
+    def __init__(self, sheets: List[FakeSpreadsheet]):
+        self._ss = {ss.id: ss for ss in sheets}
+        self._default = sheets[0].id
+
+    def spreadsheet(self, ss_id: Optional[str] = None):
+        return self._ss[ss_id or self._default], "SIM"
+
+    def reset(self, ss_id: Optional[str] = None):
+        pass
+
+class FakeChannel:
+    """ห้อง Discord ปลอม: นับข้อความที่ส่ง + เก็บล่าสุดไว้ดู (เวลาใน clock ของบอท, content, embeds) — รันเป็นเดือนก็ไม่โต"""
+
+    def __init__(self, channel_id: int, clock, keep: int = 100):
+        self.id = channel_id
+        self.clock = clock
+        self.count = 0
+        self.sent = deque(maxlen=keep)
+
+    async def send(self, content=None, embeds=None, embed=None):
+        self.count += 1
+        self.sent.append((self.clock.time(), content, embeds or [embed]))
+
+def counting_ledger(bot, since: float):
+    """ledger ในหน่วยความจำที่นับว่าแต่ละคีย์ถูกส่งกี่ครั้ง และช้ากว่าจุดแจ้งเตือนเท่าไร (นับเฉพาะจุดหลัง since)"""
+
+    class CountingLedger(bot.AlertLedger):
+        def __init__(self):
+            super().__init__(":memory:")
+            self.fired = Counter()
+            self.since = since
+            self.max_lag = 0.0
+
+        def add(self, key):
+            self.fired[key] += 1
+            _, _, spawn_min, th = key
+            fire_ts = (spawn_min - abs(th)) * 60
+            if fire_ts >= self.since:
+                self.max_lag = max(self.max_lag, bot.clock.time() - fire_ts)
+            return super().add(key)
+
+    return CountingLedger()
+
+# ========= ข้อมูลสุ่ม =========
+def sim_sheet_rows(n: int, start: datetime, seed: int = 1) -> list:
+    """แถวชีตสุ่มแบบกำหนด seed: interval 40% / fixed 30% / รายวัน 15% / ครั้งเดียว 15%"""
+    rnd = random.Random(seed)
+    names = max(1, n * 9 // 10)   # ~10% ชื่อซ้ำกัน → ผ่านเส้นทางกันซ้ำชื่อ+นาที
+    rows = [list(SIM_HEADER)]
+    for i in range(n):
+        name = "ลาตัน" if i % 50 == 49 else f"บอส{i % names}"   # แถวเวิลด์บอสในชีตต้องถูกข้าม
+        row = [str(rnd.randint(1, 90)), name, f"แผนที่{rnd.randrange(20)}"] + [""] * 8
+        kind = rnd.random()
+        if kind < 0.4:
+            hours = rnd.choice((4, 6, 8, 12, 24))
+            kill = start - timedelta(minutes=rnd.randrange(hours * 60))
+            nxt = kill + timedelta(hours=hours)
+            row[4], row[6] = nxt.strftime("%H:%M"), nxt.strftime("%Y-%m-%d")
+            row[7], row[8] = "interval", f"{hours} ชั่วโมง"
+            row[10] = kill.strftime("%d/%m/%Y %H:%M:%S")
+        elif kind < 0.7:
+            row[7] = "fixed"
+            row[8] = "; ".join(f"{d} {rnd.randrange(24):02d}:{rnd.choice((0, 30)):02d}"
+                               for d in rnd.sample(WEEKDAY_THAI, 2))
+        elif kind < 0.85:
+            row[4], row[7] = f"{rnd.randrange(24):02d}:{rnd.randrange(60):02d}", "other"
+        else:
+            dt = start + timedelta(minutes=rnd.randrange(7 * 24 * 60))
+            row[4], row[6], row[7] = dt.strftime("%H:%M"), dt.strftime("%Y-%m-%d"), "other"
+        rows.append(row)
+    return rows
+
+def sim_subscriptions(bot, n: int, names: dict, seed: int = 1):
+    """ผู้ติดตามสุ่มต่อ tenant (names: tenant key → ชื่อบอส): ตามชื่อ 60% / ช่วงเลเวล 25% / เวิลด์บอส 15% (คนละ ~2 รายการ)"""
+    rnd = random.Random(seed)
+    store = bot.SubscriptionStore(":memory:")
+    leads = (5, 10, 15, 30, 45, 60)
+    for t in bot.TENANTS:
+        names_t = names[t.key]
+        for _ in range(n):
+            uid, kind, lead = rnd.randrange(max(1, n // 2)), rnd.random(), rnd.choice(leads)
+            if kind < 0.6 and names_t:
+                store.add(t.key, uid, "name", name=rnd.choice(names_t), lead_min=lead)
+            elif kind < 0.85:
+                lo = rnd.randint(1, 80)
+                store.add(t.key, uid, "level", lv_min=lo, lv_max=lo + rnd.randint(0, 20), lead_min=lead)
+            else:
+                store.add(t.key, uid, "world", lead_min=lead)
+    return store
+
+def state_sample(bot, day: int) -> dict:
+    """ขนาดสถานะที่บอทถือไว้ ณ ต้นวัน — ใช้ดูว่ารันนาน ๆ แล้วไม่โตขึ้นเรื่อย ๆ (gc_objects: object ทั้งโปรเซสหลัง collect)"""
+    gc.collect()
+    return {
+        "day": day,
+        "ledger_keys": len(bot.alerted),
+        "ledger_rows": bot.alerted._db.execute("SELECT COUNT(*) FROM alerts_sent").fetchone()[0],
+        "timeline_entries": sum(len(t.timeline) for t in bot.TENANTS),
+        "alerts_pending": len(bot.alert_scheduler),
+        "gc_objects": len(gc.get_objects()),
+    }
+
+def _percentile(xs: list, q: float) -> float:
+    xs = sorted(xs)
+    return xs[min(len(xs) - 1, int(q * len(xs)))] if xs else 0.0
+
+# ========= เล่นซ้ำ =========
+async def run_simulation(rows_n: int = 100, days: float = 7, seed: int = 1, edit_every_h: float = 6,
+                         tenants_n: int = 1, subs_n: int = 0, sheet_rows: Optional[list] = None, bot=None) -> dict:
+    """
+    เล่นซ้ำ days วันด้วย tick ทุก SIM_TICK_SEC + ตื่นตรงจุดแจ้งเตือนทุกจุดระหว่าง tick
+    tenants_n tenant แต่ละตัวมีชีต rows_n แถว (หรือ sheet_rows ที่กำหนดเอง รวมหัวตาราง) และห้องของตัวเอง
+    ทุก edit_every_h ชั่วโมงแก้ note ของแถว fixed 1 แถวต่อ tenant (ผ่านเส้นทาง diff/event แต่เวลาเกิดและผู้ติดตามตามเลเวลไม่เปลี่ยน)
+    subs_n ผู้ติดตามสุ่มต่อ tenant → จุด DM อยู่ในคำตอบด้วย และ DM ต้องส่งหมดโดยแจ้งเตือนห้องไม่ช้าลง
+    bot: โมดูลบอทที่จะใช้ (ไม่ส่ง = load_bot() ใหม่) — หลังจบดู bot.alerted.fired ได้
+    """
+    bot = bot or load_bot()
+    if sheet_rows is not None:
+        rows_n = len(sheet_rows) - 1
+    log_counts = Counter()
+    bot.log = lambda msg, **fields: log_counts.update([msg.split(" ", 1)[0]])
+    bot.SHEET_SNAPSHOT_PATH = ""
+    bot.DISPATCH_COALESCE_SEC = 0            # แจ้งเตือนเวลาเดียวกันยังรวมกัน (เข้าคิวก่อน worker ได้รัน)
+    bot.CHANNEL_SEND_RATE = (1, 0.0)         # ไม่รอโควตาด้วยนาฬิกาจริง
+    bot.DM_SEND_RATE = (1, 0.0)
+    bot.open_stores(":memory:", "")          # ledger/ผู้ติดตาม/บอร์ดในหน่วยความจำ, lease ปิด (replica เดียว)
+    bot.READ_RANGE = f"A1:K{rows_n + 1}"     # ชีตจำลองอาจยาวกว่า 2,000 แถว
+    clock, tz = bot.clock, bot.tz
+
+    start = bot.localize(SIM_START)
+    start_ts, end_ts = start.timestamp(), start.timestamp() + days * 86400
+    clock.set(start_ts)
+    if tenants_n == 1:
+        bot.TENANTS = [bot.Tenant(bot.DEFAULT_TENANT, spreadsheet_id=bot.SPREADSHEET_ID, channels=bot.SHEET_CHANNEL_MAP)]
+    else:
+        bot.TENANTS = [bot.Tenant(f"sim{i}", guild_id=i + 1, spreadsheet_id=f"SIM{i}", channel_id=1000 + i,
+                                  roles=(2000 + i,))
+                       for i in range(tenants_n)]
+        for t in bot.TENANTS:
+            t.tag = t.breaker.tag = f"[{t.key}] "
+    tenants = bot.TENANTS
+    sheets = [FakeSpreadsheet(t.primary_ws,
+                              [list(r) for r in sheet_rows] if sheet_rows is not None else sim_sheet_rows(rows_n, start, seed + i),
+                              t.spreadsheet_id)
+              for i, t in enumerate(tenants)]
+    bot.sheet_session = FakeSheetSession(sheets)
+    alerted = bot.alerted = counting_ledger(bot, start_ts)
+    channels = {cid: FakeChannel(cid, clock) for t in tenants for cid in t.channels()}
+    bot.alert_dispatcher._channels.update(channels)
+
+    # ความเร็ว parse ทั้งชีต (เส้นทางเดียวกับโหลดครั้งแรก)
+    raw = sheets[0].rows
+    cols = bot.row_cols(bot.build_col_idx(raw[0]))
+    t0 = time.perf_counter()
+    bot.diff_rows(raw, cols, None)
+    parse_sec = time.perf_counter() - t0
+
+    names = {t.key: sorted({r.name for r in bot.diff_rows(ss.rows, cols, None)[1].values()} | set(bot.FIXED_WEEKLY_TIMES))
+             for t, ss in zip(tenants, sheets)}
+    subscriptions = bot.subscriptions = sim_subscriptions(bot, subs_n, names, seed)
+    dms = {s.user_id: FakeChannel(s.user_id, clock) for s in subscriptions._subs.values()}
+    bot.dm_fanout._channels.update(dms)
+
+    # คำตอบที่ต้องได้: ทุกจุดแจ้งเตือนในช่วงจำลอง (รวมจุด DM ของผู้ติดตาม) คำนวณจากไทม์ไลน์แยกต่อ tenant ที่สร้างครั้งเดียว
+    lookahead = timedelta(minutes=max(bot.ALERT_THRESHOLDS_MIN) + 1)
+    expected = set()
+    for t, ss in zip(tenants, sheets):
+        _, parsed, _ = bot.diff_rows(ss.rows, cols, None)
+        oracle = bot.SpawnTimeline(horizon_days=days + 1)
+        oracle._sources.update(bot.sheet_sources(t.primary_ws, list(parsed.values()), start))
+        oracle.advance(start)
+        plan = bot.plan_alerts(t, oracle.between(start, datetime.fromtimestamp(end_ts, tz) + lookahead))
+        # จุดที่เลยมาไม่เกิน ALERT_WINDOW_SEC ตอนเริ่ม ยังต้องส่ง (เหมือนบอทเพิ่งรีสตาร์ท)
+        expected.update(k for k, e in plan.items() if start_ts - bot.ALERT_WINDOW_SEC <= e["fire_ts"] <= end_ts)
+
+    # บูตแบบมี snapshot เหมือน deploy จริง (warm_start) — ไม่งั้น tenant ที่เกินโควตานาทีแรกจะเริ่มช้าไป 1 tick
+    t0 = time.perf_counter()
+    for t, ss in zip(tenants, sheets):
+        ws_name, rows, _ = bot.load_sheet_rows(ss, t)
+        t.timeline.advance(start)
+        until = t.timeline.until
+        sources, entries = bot.build_sheet_update(ws_name, list(rows.values()), start, until)
+        t.timeline.replace_sheet(rows, sources, entries, until)
+        t.last_sheet_ok = start_ts
+    boot_sec = time.perf_counter() - t0
+
+    fixed_rows = [[i + 1 for i, r in enumerate(ss.rows) if i and r[7] == "fixed"] for ss in sheets]
+    edit_rnd = random.Random(seed + 1)
+    tick_sec, sends_per_tick, submitted, daily = [], [], 0, []
+    next_tick, next_edit, next_sample = start_ts, start_ts + edit_every_h * 3600, start_ts
+    messages_seen = 0
+    wall0 = time.perf_counter()
+    try:
+        while True:
+            nxt = bot.alert_scheduler._next_ts()
+            t = next_tick if nxt is None else min(next_tick, nxt)
+            if t > end_ts:
+                break
+            clock.set(max(t, clock.time()))
+
+            if t == next_tick:
+                if t >= next_edit:
+                    for ss, rows in zip(sheets, fixed_rows):
+                        if rows:
+                            ss.edit(edit_rnd.choice(rows), 9, f"note {edit_rnd.randint(1, 90)}")
+                    next_edit += edit_every_h * 3600
+                t0 = time.perf_counter()
+                await bot.check_alerts.coro()
+                tick_sec.append(time.perf_counter() - t0)
+                next_tick += SIM_TICK_SEC
+                if t >= next_sample:
+                    daily.append(state_sample(bot, len(daily)))
+                    next_sample += 86400
+                total = sum(ch.count for ch in channels.values())
+                sends_per_tick.append(total - messages_seen)
+                messages_seen = total
+
+            for key, e in bot.alert_scheduler._pop_due(clock.time()):
+                await bot.fire_alert(key, e)
+            # ให้ worker ของ dispatcher (และ DM) ส่งให้หมดก่อนเดินเวลาต่อ
+            submitted = sum(c for k, c in alerted.fired.items() if k[3] > 0)
+            while bot.DISPATCH_STATS["alerts"] < submitted or len(bot.dm_fanout):
+                await asyncio.sleep(0)
+    finally:
+        clock.set(None)
+        bot.sheet_executor.shutdown(wait=False)
+    wall = time.perf_counter() - wall0
+
+    fired = alerted.fired
+    return {
+        "rows": rows_n,
+        "tenants": len(tenants),
+        "days": days,
+        "ticks": len(tick_sec),
+        "wall_sec": round(wall, 2),
+        "speedup": int(days * 86400 / wall) if wall else None,
+        "alerts_expected": len(expected),
+        "alerts_fired": sum(fired.values()),
+        "missing": len(expected - fired.keys()),
+        "unexpected": len(fired.keys() - expected),
+        "duplicates": sum(1 for c in fired.values() if c > 1),
+        "world_alerts": sum(1 for k in fired if k[1] == bot.WORLD_GROUP and k[3] > 0),
+        "subscriptions": len(subscriptions),
+        "dm_alerts": sum(1 for k in fired if k[3] < 0),
+        "dm_users_queued": bot.DM_STATS["queued"],
+        "dm_messages": sum(ch.count for ch in dms.values()),
+        "dm_dropped": bot.DM_STATS["dropped"],
+        "scheduler_refires": bot.METRICS._counters["l9_alerts_deduped_total"][1],
+        "max_fire_lag_sec": round(alerted.max_lag, 3),
+        "alert_window_sec": bot.ALERT_WINDOW_SEC,
+        "messages": sum(ch.count for ch in channels.values()),
+        "sends_per_tick_mean": round(sum(sends_per_tick) / max(1, len(sends_per_tick)), 3),
+        "sends_per_tick_max": max(sends_per_tick, default=0),
+        "boot_ms": round(boot_sec * 1000, 1),
+        "first_tick_ms": round(tick_sec[0] * 1000, 1) if tick_sec else None,
+        "tick_p50_ms": round(_percentile(tick_sec[1:], 0.5) * 1000, 3),
+        "tick_p99_ms": round(_percentile(tick_sec[1:], 0.99) * 1000, 3),
+        "tick_max_ms": round(max(tick_sec[1:], default=0) * 1000, 3),
+        "parse_rows_per_sec": int(rows_n / parse_sec) if parse_sec else None,
+        "sheet_api_calls": sum(ss.calls for ss in sheets),
+        "sheet_quota_deferred": bot.SHEET_STATS["quota_deferred"],
+        "sheet_edits": sum(ss.modified for ss in sheets),
+        "timeline_entries": sum(len(t.timeline) for t in tenants),
+        "daily": daily,
+    }
+
+def sim_ok(r: dict) -> bool:
+    return (r["missing"] == r["unexpected"] == r["duplicates"] == r["scheduler_refires"] == r["dm_dropped"] == 0
+            and r["max_fire_lag_sec"] <= r["alert_window_sec"])
+
+def main(argv: list) -> int:
+    ap = argparse.ArgumentParser(prog="simulate.py", description="จำลองการทำงานหลายวันแบบเร่งเวลา (ไม่ต่อ Google/Discord)")
+    ap.add_argument("--rows", type=int, default=100, help="จำนวนแถวของชีตจำลอง (ต่อ tenant)")
+    ap.add_argument("--tenants", type=int, default=1, help="จำนวนกิลด์/ชีตในโปรเซสเดียว")
+    ap.add_argument("--subs", type=int, default=0, help="จำนวนการติดตาม (!sub) สุ่มต่อ tenant")
+    ap.add_argument("--days", type=float, default=7)
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--bench", action="store_true", help=f"รันทีละขนาด {SIM_BENCH_ROWS} แถว (แยกโปรเซส)")
+    ap.add_argument("--json", action="store_true", help="พิมพ์ผลเป็น JSON บรรทัดเดียว")
+    args = ap.parse_args(argv)
+
+    if args.bench:
+        results = []
+        for n in SIM_BENCH_ROWS:
+            out = subprocess.run([sys.executable, os.path.abspath(__file__), "--json",
+                                  "--rows", str(n), "--days", str(args.days), "--seed", str(args.seed),
+                                  "--tenants", str(args.tenants), "--subs", str(args.subs)],
+                                 capture_output=True, text=True)
+            if out.returncode not in (0, 1) or not out.stdout.strip():
+                print(f"[BENCH] {n} แถว ล้มเหลว:\n{out.stderr}")
+                return 2
+            results.append(json.loads(out.stdout.strip().splitlines()[-1]))
+        cols = ("rows", "tenants", "alerts_fired", "wall_sec", "boot_ms", "tick_p50_ms", "tick_p99_ms",
+                "tick_max_ms", "parse_rows_per_sec", "sends_per_tick_mean", "sends_per_tick_max")
+        print("[BENCH] " + " | ".join(cols))
+        for r in results:
+            print("[BENCH] " + " | ".join(str(r[c]) for c in cols) + ("" if sim_ok(r) else "  ❌"))
+        return 0 if all(map(sim_ok, results)) else 1
+
+    r = asyncio.run(run_simulation(args.rows, args.days, args.seed, tenants_n=args.tenants, subs_n=args.subs))
+    if args.json:
+        print(json.dumps(r))
+    else:
+        for k, v in r.items():
+            if k == "daily":
+                v = v[-1] if v else None   # ต้นวันสุดท้าย (ทั้งชุดอยู่ใน --json)
+            print(f"[SIM] {k}: {v}")
+        print("[SIM] " + ("✅ แจ้งเตือนทุกจุดส่งครั้งเดียวพอดี" if sim_ok(r) else "❌ ผลไม่ตรงที่คาด"))
+    return 0 if sim_ok(r) else 1
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,16 @@
+# -*- coding: utf-8 -*-
+import os, sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import simulate  # noqa: E402
+
+@pytest.fixture
+def bot():
+    """สคริปต์บอทโหลดใหม่ทุกเทสต์ (singleton/สถิติ/clock ไม่ปนกัน)"""
+    m = simulate.load_bot()
+    yield m
+    m.clock.set(None)
+    m.sheet_executor.shutdown(wait=False)
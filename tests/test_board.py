@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+import asyncio
+from types import SimpleNamespace
+
+import discord
+
+import simulate
+
+def http_error(cls=discord.HTTPException, status=400):
+    return cls(SimpleNamespace(status=status, reason="test"), "test")
+
+class FakeBoardChannel:
+    """ห้องปลอม: send/pin ล้มได้ตามที่กำหนด เก็บข้อความที่ส่งได้"""
+
+    def __init__(self, channel_id: int, send_error=None, pin_error=None):
+        self.id = channel_id
+        self.send_error = send_error
+        self.pin_error = pin_error
+        self.sent = []
+        self.pinned = []
+
+    async def send(self, content=None, embed=None, **kwargs):
+        if self.send_error is not None:
+            raise self.send_error
+        msg = SimpleNamespace(id=len(self.sent) + 1, content=content, embed=embed, pin=lambda: self._pin(msg))
+        self.sent.append(msg)
+        return msg
+
+    async def _pin(self, msg):
+        if self.pin_error is not None:
+            raise self.pin_error
+        self.pinned.append(msg.id)
+
+def run_board(bot, channel, reply=None):
+    bot.open_stores(":memory:", "")
+    bot.SHEET_SNAPSHOT_PATH = ""
+    bot.clock.set(bot.localize(simulate.SIM_START).timestamp())
+    t = bot.TENANTS[0]
+    bot.sheet_session = simulate.FakeSheetSession(
+        [simulate.FakeSpreadsheet(t.primary_ws, simulate.sim_sheet_rows(20, simulate.SIM_START), t.spreadsheet_id)])
+    channel.id = t.channel_id
+    bot.alert_dispatcher._channels[channel.id] = channel
+    logged = []
+    bot.log = logged.append
+    ctx = SimpleNamespace(guild=None, channel=channel, author="mod", send=reply or channel.send)
+    asyncio.run(bot.board.callback(ctx))
+    return logged
+
+def test_board_forbidden_first_send_is_not_registered(bot):
+    ch = FakeBoardChannel(0, send_error=http_error(discord.Forbidden, 403))
+    logged = run_board(bot, ch)
+    assert bot.schedule_board.message_id(ch.id) is None
+    assert ch.id not in bot.schedule_board._msg_ids
+    assert any("!board" in m for m in logged)
+
+def test_board_send_error_replies_with_reason(bot):
+    ch = FakeBoardChannel(0, send_error=http_error(discord.HTTPException, 500))
+    sent = []
+
+    async def reply(content=None, **kwargs):
+        sent.append(content)
+
+    run_board(bot, ch, reply)
+    assert ch.id not in bot.schedule_board._msg_ids
+    assert len(sent) == 1 and sent[0].startswith("❌") and "500" in sent[0]
+
+def test_board_pin_failure_keeps_board_and_warns(bot):
+    ch = FakeBoardChannel(0, pin_error=http_error(discord.Forbidden, 403))
+    run_board(bot, ch)
+    board_msg, warning = ch.sent
+    assert bot.schedule_board.message_id(ch.id) == board_msg.id and board_msg.embed is not None
+    assert warning.content.startswith("⚠️") and "Manage Messages" in warning.content
+    assert ch.pinned == []
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import time
+from types import SimpleNamespace
+
+import simulate
+
+CALLERS = 50
+
+class SlowCountingSpreadsheet(simulate.FakeSpreadsheet):
+    """อ่านค่าช้า 0.2 วินาที (คำสั่งทั้งหมดมาถึงระหว่างอ่าน) และนับจำนวนครั้งที่อ่าน"""
+
+    def __init__(self, *args):
+        super().__init__(*args)
+        self.value_reads = 0
+
+    def values_batch_get(self, ranges: list) -> dict:
+        self.value_reads += 1
+        time.sleep(0.2)
+        return super().values_batch_get(ranges)
+
+def test_concurrent_boss_commands_share_one_read_and_build(bot):
+    bot.open_stores(":memory:", "")
+    bot.SHEET_SNAPSHOT_PATH = ""
+    bot.clock.set(bot.localize(simulate.SIM_START).timestamp())
+    t = bot.TENANTS[0]
+    ss = SlowCountingSpreadsheet(t.primary_ws, simulate.sim_sheet_rows(200, simulate.SIM_START), t.spreadsheet_id)
+    bot.sheet_session = simulate.FakeSheetSession([ss])
+
+    refreshes, builds = [], []
+    refresh_sheet, render = bot.refresh_sheet, bot.BossSnapshot._render
+
+    async def counting_refresh(tenant, *args):
+        refreshes.append(tenant.key)
+        return await refresh_sheet(tenant, *args)
+
+    def counting_render(self):
+        if self._version != self.t.timeline.version:
+            builds.append(self.t.timeline.version)
+        render(self)
+
+    bot.refresh_sheet = counting_refresh
+    bot.BossSnapshot._render = counting_render
+
+    replies = []
+
+    async def send(content=None, embed=None, **kwargs):
+        replies.append(embed)
+
+    ctx = SimpleNamespace(guild=None, channel=SimpleNamespace(id=1), author="tester", send=send)
+
+    async def main():
+        await asyncio.gather(*(bot.boss.callback(ctx) for _ in range(CALLERS)))
+
+    asyncio.run(main())
+
+    assert len(replies) == CALLERS
+    assert refreshes == [t.key]            # โหลดชีตครั้งเดียว ทุกคำสั่งรอ Task เดียวกัน
+    assert ss.value_reads == 2             # เลือกแท็บ (หัวตาราง) + อ่านทั้งช่วง ของการโหลดครั้งนั้น
+    assert len(builds) == 1                # render บรรทัดครั้งเดียวต่อ version ของไทม์ไลน์
+    fields = [[(f.name, f.value) for f in e.fields] for e in replies]
+    assert fields[0] and all(f == fields[0] for f in fields)
+
+    # คำสั่งถัดไปที่ไทม์ไลน์ยังเป็น version เดิม: ไม่อ่านชีต ไม่ render ใหม่
+    asyncio.run(main())
+    assert refreshes == [t.key] and ss.value_reads == 2 and len(builds) == 1
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+import asyncio
+from datetime import timedelta
+from types import SimpleNamespace
+
+import simulate
+
+class FlakySheetSession(simulate.FakeSheetSession):
+    """session ปลอมที่เปิดไฟล์ล้มได้ตามสั่ง — นับครั้งที่ลองเปิด และ reset ที่ breaker สั่ง"""
+
+    def __init__(self, sheets, error=None):
+        super().__init__(sheets)
+        self.error = error
+        self.opens = 0
+        self.resets = []
+
+    def spreadsheet(self, ss_id=None):
+        self.opens += 1
+        if self.error is not None:
+            raise self.error
+        return super().spreadsheet(ss_id)
+
+    def reset(self, ss_id=None):
+        self.resets.append(ss_id)
+
+def quota_error():
+    return RuntimeError("429 RESOURCE_EXHAUSTED")
+
+def setup_failing_sheet(bot, monkeypatch, error=None):
+    bot.open_stores(":memory:", "")
+    bot.SHEET_SNAPSHOT_PATH = ""
+    bot.SHEET_RETRY_BASE_SEC = 0     # ไม่ต้องรอจริงระหว่าง retry
+    start = bot.localize(simulate.SIM_START) + timedelta(hours=9, minutes=30)   # จันทร์ 09:30 → เวิลด์บอส 10:00
+    bot.clock.set(start.timestamp())
+    monkeypatch.setattr(bot.random, "uniform", lambda lo, hi: hi)   # ตัด jitter ให้เวลาพักคาดได้
+    t = bot.TENANTS[0]
+    ss = simulate.FakeSpreadsheet(t.primary_ws, simulate.sim_sheet_rows(20, simulate.SIM_START), t.spreadsheet_id)
+    bot.sheet_session = FlakySheetSession([ss], error or RuntimeError("sheet down"))
+    return t, bot.sheet_session
+
+def test_breaker_state_machine(bot, monkeypatch):
+    t, session = setup_failing_sheet(bot, monkeypatch)
+    br = t.breaker
+    base, cap = bot.SHEET_BREAKER_BASE_SEC, bot.SHEET_BREAKER_MAX_SEC
+
+    for _ in range(bot.SHEET_BREAKER_FAILURES - 1):
+        br.failure(RuntimeError("x"))
+        assert br.state == "closed" and br.retry_in() is None
+    br.failure(RuntimeError("x"))
+    assert (br.state, br.retry_in()) == ("open", base)
+    assert session.resets == [t.spreadsheet_id]
+    assert not br.allow()
+
+    # ลองใหม่แล้วล้ม → พักนานขึ้นเท่าตัว จนถึงเพดาน
+    delays = [base]
+    for _ in range(6):
+        bot.clock.set(br.open_until)
+        assert br.allow() and br.state == "half_open"
+        br.failure(RuntimeError("x"))
+        delays.append(br.retry_in())
+    assert delays == [min(cap, base * 2 ** i) for i in range(7)]
+    assert delays[-1] == cap
+
+    bot.clock.set(br.open_until)
+    assert br.allow()
+    br.success()
+    assert (br.state, br.failures, br.trips, br.retry_in()) == ("closed", 0, 0, None)
+
+    br.failure(quota_error())                       # quota → เปิดทันทีครั้งเดียว
+    assert (br.state, br.retry_in()) == ("open", base)
+
+def test_refresh_sheet_with_open_breaker(bot, monkeypatch):
+    t, session = setup_failing_sheet(bot, monkeypatch)
+    br = t.breaker
+
+    asyncio.run(bot.refresh_sheet(t))
+    assert session.opens == bot.SHEET_BREAKER_FAILURES and br.state == "open"
+
+    # เปิดอยู่: ไม่แตะชีตเลย
+    asyncio.run(bot.refresh_sheet(t))
+    assert session.opens == bot.SHEET_BREAKER_FAILURES
+
+    # half-open ให้ลองครั้งเดียว ล้ม → เปิดใหม่ นานขึ้นเท่าตัว
+    bot.clock.set(br.open_until)
+    asyncio.run(bot.refresh_sheet(t))
+    assert session.opens == bot.SHEET_BREAKER_FAILURES + 1
+    assert (br.state, br.retry_in()) == ("open", 2 * bot.SHEET_BREAKER_BASE_SEC)
+
+    # ชีตกลับมา → half-open สำเร็จ → ปิด
+    session.error = None
+    bot.clock.set(br.open_until)
+    asyncio.run(bot.refresh_sheet(t))
+    assert br.state == "closed" and t.timeline.sheet_loaded
+
+def test_quota_error_trips_on_first_failure(bot, monkeypatch):
+    t, session = setup_failing_sheet(bot, monkeypatch, error=quota_error())
+    asyncio.run(bot.refresh_sheet(t))
+    assert session.opens == 1 and t.breaker.state == "open"
+    assert bot.sheet_quota.hold_in() == bot.SHEET_BREAKER_BASE_SEC
+
+def test_fixed_and_world_alerts_queue_while_breaker_open(bot, monkeypatch):
+    t, session = setup_failing_sheet(bot, monkeypatch)
+    bot.lease = SimpleNamespace(leader=lambda: True)
+
+    asyncio.run(bot.check_alerts.coro())
+    assert t.breaker.state == "open" and not t.timeline.sheet_loaded
+
+    pending = bot.alert_scheduler._entries.get(t.key, {})
+    names = {key[1] for key in pending}
+    assert bot.WORLD_GROUP in names                    # เวิลด์บอส 10:00 อยู่ในคิว
+    assert all(e["boss"].ws == "Fixed" or e["kind"] == "world" for e in pending.values())
+    fixed = [b for b in t.timeline.between(bot.clock.now(), bot.clock.now() + timedelta(days=7)) if b.ws == "Fixed"]
+    assert fixed and not any(b.ws == t.primary_ws for b in t.timeline.next_k(50))
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+import asyncio
+from datetime import timedelta
+
+from aiohttp.test_utils import TestClient, TestServer
+
+import simulate
+
+def test_ics_escape(bot):
+    assert bot.ics_escape("a;b,c\\d") == "a\\;b\\,c\\\\d"
+    assert bot.ics_escape("ถ้ำ\r\nลึก\rชั้น\nสอง") == "ถ้ำ\\nลึก\\nชั้น\\nสอง"
+
+def test_ics_fold_keeps_thai_characters_whole(bot):
+    line = "SUMMARY:" + "บอสเลเวลสูง " * 20
+    folded = bot.ics_fold(line)
+    parts = folded.split("\r\n")
+    assert len(parts) > 1
+    assert all(len(p.encode("utf-8")) <= 75 for p in parts)
+    assert all(p.startswith(" ") for p in parts[1:])
+    assert parts[0] + "".join(p[1:] for p in parts[1:]) == line    # unfold แล้วได้บรรทัดเดิม (ไม่ตัดกลางตัวอักษร)
+    assert bot.ics_fold("SUMMARY:สั้น") == "SUMMARY:สั้น"
+
+def test_etag_matches(bot):
+    etag = '"abc"'
+    assert bot.etag_matches('"abc"', etag)
+    assert bot.etag_matches('W/"abc"', etag)
+    assert bot.etag_matches('"x", W/"abc" , "y"', etag)
+    assert bot.etag_matches("*", etag)
+    assert not bot.etag_matches('"abcd"', etag)
+    assert not bot.etag_matches('"x", "y"', etag)
+
+def setup_feed(bot):
+    bot.open_stores(":memory:", "")
+    bot.SHEET_SNAPSHOT_PATH = ""
+    bot.clock.set(bot.localize(simulate.SIM_START).timestamp())
+    t = bot.TENANTS[0]
+    ss = simulate.FakeSpreadsheet(t.primary_ws, simulate.sim_sheet_rows(20, simulate.SIM_START), t.spreadsheet_id)
+    bot.sheet_session = simulate.FakeSheetSession([ss])
+    return t, ss
+
+def test_schedule_feed_conditional_requests(bot):
+    t, ss = setup_feed(bot)
+
+    async def main():
+        await bot.refresh_sheet(t)
+        async with TestClient(TestServer(bot.make_http_app())) as client:
+            first = await client.get("/schedule.json")
+            assert first.status == 200
+            data = await first.json()
+            assert data["sheet_loaded"] and data["bosses"]
+            etag, last_modified = first.headers["ETag"], first.headers["Last-Modified"]
+
+            for headers in ({"If-None-Match": etag}, {"If-None-Match": "W/" + etag},
+                            {"If-None-Match": '"old", ' + etag}, {"If-Modified-Since": last_modified}):
+                resp = await client.get("/schedule.json", headers=headers)
+                assert resp.status == 304 and resp.headers["ETag"] == etag
+            # If-None-Match มาก่อน If-Modified-Since
+            resp = await client.get("/schedule.json", headers={"If-None-Match": '"old"', "If-Modified-Since": last_modified})
+            assert resp.status == 200
+            old = (bot.clock.now() - timedelta(days=1)).astimezone(bot.pytz.utc).strftime("%a, %d %b %Y %H:%M:%S GMT")
+            assert (await client.get("/schedule.json", headers={"If-Modified-Since": old})).status == 200
+
+            # แก้หมายเหตุ (ไม่อยู่ในตาราง) → ไทม์ไลน์ขยับ version แต่รายการเหมือนเดิม → ETag เดิม
+            version = t.timeline.version
+            ss.edit(2, 9, "หมายเหตุใหม่")
+            t.poll["force"] = True
+            await bot.refresh_sheet(t)
+            assert t.timeline.version != version
+            resp = await client.get("/schedule.json", headers={"If-None-Match": etag})
+            assert resp.status == 304 and resp.headers["Last-Modified"] == last_modified
+
+            # เปลี่ยนชื่อบอส → ETag ใหม่
+            ss.edit(2, 1, "บอสชื่อใหม่")
+            await bot.refresh_sheet(t)
+            resp = await client.get("/schedule.json", headers={"If-None-Match": etag})
+            assert resp.status == 200 and resp.headers["ETag"] != etag
+            assert bot.FEED_STATS["builds"] == 2
+
+    asyncio.run(main())
+
+def test_schedule_ics_is_valid_with_carriage_returns(bot):
+    t, ss = setup_feed(bot)
+    row = ss.rows[1]
+    row[1], row[2] = "บอส\rพิเศษ", "ถ้ำ\r\nชั้นล่าง; ซ้าย"
+
+    async def main():
+        await bot.refresh_sheet(t)
+        async with TestClient(TestServer(bot.make_http_app())) as client:
+            resp = await client.get("/schedule.ics")
+            assert resp.status == 200 and resp.content_type == "text/calendar"
+            body = await resp.read()
+            again = await client.get("/schedule.ics", headers={"If-None-Match": resp.headers["ETag"]})
+            assert again.status == 304
+        return body
+
+    body = asyncio.run(main())
+    assert body.endswith(b"END:VCALENDAR\r\n")
+    lines = body.decode("utf-8").split("\r\n")[:-1]
+    assert not any("\r" in line or "\n" in line for line in lines)
+    assert all(len(line.encode("utf-8")) <= 75 for line in lines)
+    unfolded = body.decode("utf-8").replace("\r\n ", "")
+    assert "พิเศษ" in unfolded and "LOCATION:ถ้ำ\\nชั้นล่าง\\; ซ้าย" in unfolded
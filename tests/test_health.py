@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import re
+
+from aiohttp.test_utils import TestClient, TestServer
+
+import simulate
+
+def setup_bot(bot):
+    bot.open_stores(":memory:", "")
+    bot.SHEET_SNAPSHOT_PATH = ""
+    start = bot.localize(simulate.SIM_START)
+    bot.clock.set(start.timestamp())
+    bot.STARTED_AT = start
+    t = bot.TENANTS[0]
+    bot.sheet_session = simulate.FakeSheetSession(
+        [simulate.FakeSpreadsheet(t.primary_ws, simulate.sim_sheet_rows(20, simulate.SIM_START), t.spreadsheet_id)])
+
+def test_healthz_goes_503_when_ticks_stop(bot):
+    setup_bot(bot)
+    max_age = bot.HEALTH_MAX_TICK_AGE_SEC
+
+    async def get(client):
+        resp = await client.get("/healthz")
+        return resp.status, await resp.json()
+
+    async def main():
+        async with TestClient(TestServer(bot.make_http_app())) as client:
+            status, body = await get(client)
+            assert status == 200 and body["ok"] and body["last_tick_ok_age_sec"] is None   # เพิ่งบูต ยังไม่มี tick
+
+            bot.clock.set(bot.clock.time() + max_age + 1)                                    # บูตนานแล้วยังไม่เคย tick สำเร็จ
+            status, body = await get(client)
+            assert status == 503 and not body["ok"] and body["uptime_sec"] == max_age + 1
+
+            await bot.check_alerts.coro()
+            status, body = await get(client)
+            assert status == 200 and body["last_tick_ok_age_sec"] == 0
+            assert body["tenants"][bot.TENANTS[0].key]
+
+            bot.clock.set(bot.clock.time() + max_age)
+            assert (await get(client))[0] == 200
+            bot.clock.set(bot.clock.time() + 1)
+            status, body = await get(client)
+            assert status == 503 and body["last_tick_ok_age_sec"] == max_age + 1
+
+    asyncio.run(main())
+
+def test_metrics_renders_histograms_and_stats(bot):
+    setup_bot(bot)
+    for v in (0.003, 0.02, 0.02, 2.0, 60.0):
+        bot.METRICS.observe("l9_feed_build_seconds", v)
+    bot.WEBHOOK_STATS["received"] = 7
+
+    async def main():
+        async with TestClient(TestServer(bot.make_http_app())) as client:
+            resp = await client.get("/metrics")
+            assert resp.status == 200 and resp.content_type == "text/plain"
+            return await resp.text()
+
+    text = asyncio.run(main())
+    lines = text.splitlines()
+    assert "# TYPE l9_feed_build_seconds histogram" in lines
+    buckets = [(m.group(1), int(m.group(2))) for m in
+               (re.match(r'l9_feed_build_seconds_bucket\{le="([^"]+)"\} (\d+)$', l) for l in lines) if m]
+    assert [le for le, _ in buckets] == [str(b) for b in bot.LATENCY_BUCKETS] + ["+Inf"]
+    counts = dict(buckets)
+    assert (counts["0.005"], counts["0.025"], counts["2.5"], counts["30.0"], counts["+Inf"]) == (1, 3, 4, 4, 5)
+    assert all(a[1] <= b[1] for a, b in zip(buckets, buckets[1:]))          # สะสม
+    assert "l9_feed_build_seconds_sum 62.043000" in lines
+    assert "l9_feed_build_seconds_count 5" in lines
+
+    assert "# TYPE l9_webhook_received_total counter" in lines and "l9_webhook_received_total 7" in lines
+    for prefix, stats in (("l9_sheet", bot.SHEET_STATS), ("l9_dispatch", bot.DISPATCH_STATS), ("l9_feed", bot.FEED_STATS),
+                          ("l9_kill", bot.KILL_STATS), ("l9_dm", bot.DM_STATS), ("l9_lease", bot.LEASE_STATS),
+                          ("l9_log", bot.LOG_STATS)):
+        for k in stats:
+            assert any(l.startswith(f"{prefix}_{k}_total ") for l in lines), f"{prefix}_{k}_total"
+    assert "l9_sheet_breaker_trips_total 0" in lines and "l9_tenants 1" in lines
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import random
+from datetime import timedelta
+
+import simulate
+
+ROUNDS = 30
+
+def rebuild(bot, t, ss, now):
+    """ไทม์ไลน์ที่สร้างใหม่ทั้งชีตด้วย replace_sheet (คำตอบที่ต้องได้)"""
+    cols = bot.row_cols(bot.build_col_idx(ss.rows[0]))
+    _, rows, _ = bot.diff_rows(ss.rows, cols, None)
+    t.timeline.advance(now)
+    until = t.timeline.until
+    sources, entries = bot.build_sheet_update(ss.title, list(rows.values()), now, until)
+    t.timeline.replace_sheet(rows, sources, entries, until)
+
+def spawns(t, now):
+    # ทุก entry รวม src (ไม่ผ่าน between() ที่กันซ้ำชื่อ+นาที — สองแถวชื่อ+นาทีเดียวกันเหลือตัวไหนขึ้นกับลำดับแทรก)
+    end = (now + timedelta(days=3)).timestamp()
+    return sorted((b.epoch, b.ws, b.name, b.level, b.location, b.src) for b in t.timeline._entries if b.epoch < end)
+
+def pending(bot, t):
+    return {key[1:]: e["fire_ts"] for key, e in bot.alert_scheduler._entries.get(t.key, {}).items()}
+
+def edit_sheet(rnd, ss, pool):
+    """แก้ชีตแบบสุ่ม 1-4 อย่าง: แทนแถว แก้ชื่อ/หมายเหตุ ลบค่าทั้งแถว เพิ่มแถวท้าย ตัดแถวท้าย"""
+    for _ in range(rnd.randint(1, 4)):
+        op = rnd.choice(("replace", "rename", "note", "blank", "append", "truncate"))
+        n = rnd.randrange(1, len(ss.rows))
+        if op == "replace":
+            ss.rows[n] = list(rnd.choice(pool))
+        elif op == "rename":
+            ss.rows[n][1] = f"บอส{rnd.randint(0, 30)}"
+        elif op == "note":
+            ss.rows[n][9] = f"note {rnd.randint(0, 99)}"
+        elif op == "blank":
+            ss.rows[n] = [""] * len(ss.rows[0])
+        elif op == "append":
+            ss.rows.append(list(rnd.choice(pool)))
+        elif len(ss.rows) > 10:
+            ss.rows.pop()
+    ss.modified += 1
+
+def test_incremental_updates_match_full_rebuild(bot):
+    bot.open_stores(":memory:", "")
+    bot.SHEET_SNAPSHOT_PATH = ""
+    start = bot.localize(simulate.SIM_START)
+    bot.clock.set(start.timestamp())
+    inc = bot.TENANTS[0]
+    ref = bot.Tenant("rebuild", guild_id=2, spreadsheet_id="REBUILD", channel_id=inc.channel_id)
+    bot.TENANTS = [inc, ref]
+    ss = simulate.FakeSpreadsheet(inc.primary_ws, simulate.sim_sheet_rows(60, start), inc.spreadsheet_id)
+    bot.sheet_session = simulate.FakeSheetSession([ss])
+    pool = simulate.sim_sheet_rows(200, start, seed=99)[1:]
+    rnd = random.Random(16)
+
+    asyncio.run(bot.refresh_sheet(inc))
+    replaced = []
+    replace_sheet = inc.timeline.replace_sheet
+    inc.timeline.replace_sheet = lambda *a: replaced.append(1) or replace_sheet(*a)
+    rebuild(bot, ref, ss, start)
+    assert spawns(inc, start) == spawns(ref, start) and pending(bot, inc) == pending(bot, ref)
+
+    for i in range(ROUNDS):
+        now = start + timedelta(minutes=17 * (i + 1))
+        bot.clock.set(now.timestamp())
+        for t in (inc, ref):          # เหมือน check_alerts: เดินไทม์ไลน์ + กระทบยอดคิวก่อนอ่านชีต
+            t.timeline.advance(now)
+            bot.resync_alerts(t, now)
+        edit_sheet(rnd, ss, pool)
+        inc.poll["force"] = True
+        asyncio.run(bot.refresh_sheet(inc))
+        rebuild(bot, ref, ss, now)
+        assert inc.timeline.sheet_rows == ref.timeline.sheet_rows, f"รอบ {i}"
+        assert spawns(inc, now) == spawns(ref, now), f"รอบ {i}"
+        assert pending(bot, inc) == pending(bot, ref), f"รอบ {i}"   # คิวจาก TimelineEvent อย่างเดียว ไม่ได้ resync
+
+    assert replaced == []    # ทุกรอบไปทาง diff ทีละแถว (update_rows) ไม่สร้างใหม่ทั้งชีต
+
+def test_row_digest_accepts_non_string_cells(bot):
+    assert bot.row_digest(["40", "บอส"]) == bot.row_digest([40, "บอส"])
+    assert len(bot.row_digest(["", None, 1.5])) == 8
@@ -0,0 +1,10 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+import simulate
+
+def test_parse_kill_args_bad_date_hides_internal_error(bot):
+    now = bot.localize(simulate.SIM_START)
+    with pytest.raises(ValueError, match="วันที่ไม่ถูกต้อง: 31/02") as exc:
+        bot.parse_kill_args(("บอส", "31/02", "12:30"), now)
+    assert exc.value.__cause__ is None and exc.value.__suppress_context__
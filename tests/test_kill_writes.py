@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+import asyncio
+from datetime import timedelta
+
+import simulate
+
+KILL_DT_COL = simulate.SIM_HEADER.index("kill_dt")
+
+class DownSheetSession(simulate.FakeSheetSession):
+    """session ที่เปิดไฟล์ไม่ได้เลย — ทุก flush ล้ม"""
+
+    def spreadsheet(self, ss_id=None):
+        raise RuntimeError("sheet down")
+
+def setup_sheet(bot, n=30):
+    bot.open_stores(":memory:", "")
+    bot.SHEET_SNAPSHOT_PATH = ""
+    bot.clock.set(bot.localize(simulate.SIM_START).timestamp())
+    t = bot.TENANTS[0]
+    ss = simulate.FakeSpreadsheet(t.primary_ws, simulate.sim_sheet_rows(n, simulate.SIM_START), t.spreadsheet_id)
+    bot.sheet_session = simulate.FakeSheetSession([ss])
+    asyncio.run(bot.refresh_sheet(t))
+    rows = sorted((n, r) for n, r in t.timeline.sheet_rows.items() if r.sp_type == "interval")
+    return t, ss, rows
+
+def test_kills_flush_as_one_batch(bot):
+    t, ss, rows = setup_sheet(bot)
+    now = bot.clock.now().replace(second=0, microsecond=0)
+    picked = rows[:4]
+    kills = {n: now - timedelta(minutes=5 * i) for i, (n, _) in enumerate(picked)}
+    for n, row in picked:
+        bot.kill_writes.submit(t, n, row, now - timedelta(hours=1))
+        bot.kill_writes.submit(t, n, row, kills[n])   # สั่งซ้ำก่อน flush → เขียนค่าล่าสุดค่าเดียว
+    assert len(bot.kill_writes) == len(picked)
+    assert all(t.timeline.sheet_rows[n].kill_dt == k for n, k in kills.items())   # ไทม์ไลน์เปลี่ยนทันที
+
+    calls = ss.calls
+    asyncio.run(bot.kill_writes.flush())
+    assert ss.calls - calls == 2   # อ่านตรวจ 1 + เขียน 1
+    assert bot.KILL_STATS["batches"] == 1 and bot.KILL_STATS["written"] == len(picked)
+    for n, k in kills.items():
+        assert ss.rows[n - 1][KILL_DT_COL] == k.strftime("%Y-%m-%d %H:%M:%S")
+
+    # รอบอ่านชีตถัดไปเห็นค่าเดียวกัน → เลิกพัก
+    assert t.poll["force"]
+    asyncio.run(bot.refresh_sheet(t))
+    assert not bot.kill_writes._pending
+    assert all(t.timeline.sheet_rows[n].kill_dt == k for n, k in kills.items())
+
+def test_kill_conflict_keeps_sheet_value(bot):
+    t, ss, rows = setup_sheet(bot)
+    (n, row), (n2, row2) = rows[:2]
+    before = ss.rows[n - 1][KILL_DT_COL]
+    now = bot.clock.now().replace(second=0, microsecond=0)
+    bot.kill_writes.submit(t, n, row, now)
+    bot.kill_writes.submit(t, n2, row2, now)
+    ss.edit(n, 1, "บอสเปลี่ยนชื่อ")   # มีคนแก้แถวในชีตก่อน flush
+
+    asyncio.run(bot.kill_writes.flush())
+    assert ss.rows[n - 1][KILL_DT_COL] == before
+    assert ss.rows[n2 - 1][KILL_DT_COL] == now.strftime("%Y-%m-%d %H:%M:%S")
+    assert bot.KILL_STATS["conflicts"] == 1 and bot.KILL_STATS["written"] == 1
+    assert (t.key, n) not in bot.kill_writes._pending
+    assert t.timeline.sheet_rows[n].name == "บอสเปลี่ยนชื่อ"   # ไทม์ไลน์ตามชีตจริง
+
+def test_kill_write_retries_then_drops(bot, monkeypatch):
+    t, ss, rows = setup_sheet(bot)
+    monkeypatch.setattr(bot.random, "uniform", lambda lo, hi: hi)
+    bot.sheet_session = DownSheetSession([ss])
+    n, row = rows[0]
+    bot.kill_writes.submit(t, n, row, bot.clock.now().replace(second=0, microsecond=0))
+    t.poll["force"] = False
+
+    waits = []
+    for _ in range(bot.KILL_WRITE_MAX_TRIES):
+        asyncio.run(bot.kill_writes.flush())
+        if not bot.kill_writes._pending:
+            break
+        retry_at = bot.kill_writes._retry_at[t.key]
+        waits.append(retry_at - bot.clock.time())
+        bot.clock.set(max(retry_at, t.breaker.open_until) + 1)
+
+    assert bot.KILL_STATS["retries"] == bot.KILL_WRITE_MAX_TRIES - 1
+    assert bot.KILL_STATS["dropped"] == 1 and bot.KILL_STATS["written"] == 0
+    assert waits == [bot.KILL_FLUSH_SEC * 2 ** i for i in range(1, bot.KILL_WRITE_MAX_TRIES)]
+    assert not bot.kill_writes._pending
+    assert t.poll["force"]   # ไทม์ไลน์มีค่าที่ไม่ถึงชีต → อ่านชีตใหม่
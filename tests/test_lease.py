@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import sqlite3
+
+class BrokenDB:
+    """ไฟล์ lease ใช้ไม่ได้ (ล็อก/ดิสก์เต็ม) — ทุกคำสั่งล้ม"""
+
+    def execute(self, *args):
+        raise sqlite3.OperationalError("database is locked")
+
+def test_standby_start_when_lease_unreadable(bot, tmp_path):
+    bot.open_stores(":memory:", str(tmp_path / "lease.sqlite3"))
+    lease = bot.lease
+    lease._db = BrokenDB()
+    logged = []
+    bot.log = logged.append
+
+    async def main():
+        await lease.start()
+        lease._task.cancel()
+
+    asyncio.run(main())
+    assert lease.other is None and not lease.leader()
+    assert bot.LEASE_STATS["errors"] == 1
+    assert any("standby" in m and "ไม่รู้" in m for m in logged)
+
+def test_standby_start_names_other_holder(bot, tmp_path):
+    path = str(tmp_path / "lease.sqlite3")
+    bot.open_stores(":memory:", path)
+    first = bot.lease
+    assert first.try_acquire()
+    second = bot.LeaderLease(path)
+    logged = []
+    bot.log = logged.append
+
+    async def main():
+        await second.start()
+        second._task.cancel()
+
+    asyncio.run(main())
+    assert second.other[0] == first.holder
+    assert any(f"leader คือ {first.holder}" in m for m in logged)
+
+def test_two_replicas_hand_over_the_lease(bot, tmp_path):
+    path = str(tmp_path / "lease.sqlite3")
+    a, b = bot.LeaderLease(path), bot.LeaderLease(path)
+
+    assert a.try_acquire() and a.epoch == 1
+    assert not b.try_acquire() and b.other[0] == a.holder           # ถืออยู่ → standby ถูกปฏิเสธ
+    assert a.try_acquire() and a.epoch == 1                         # ต่ออายุไม่เปลี่ยน epoch
+
+    a.release()                                                     # SIGTERM → รับช่วงรอบถัดไปได้ทันที
+    assert not a.leader()
+    assert b.try_acquire() and b.epoch == 2 and b.status()["holder"] == b.holder
+
+    # b ตายเงียบ: lease หมดอายุ → a ยึดคืนได้
+    b._db.execute("UPDATE leases SET expires = ? WHERE name = ?", (bot.time.time() - 1, b.name))
+    assert a.try_acquire() and a.epoch == 3
+    assert not b.try_acquire() and not b.leader()
+
+def test_shared_ledger_claims_each_alert_once(bot, tmp_path):
+    path = str(tmp_path / "ledger.sqlite3")
+    first, second = bot.AlertLedger(path), bot.AlertLedger(path)   # สอง replica ใช้ไฟล์ ledger เดียวกัน
+    key = ("l9", "บอส", 29450000, 5)
+    assert first.add(key) is True
+    assert second.add(key) is False                                # INSERT ของอีกตัวชนแล้ว → ไม่ส่งซ้ำ
+    assert first.add(key) is False
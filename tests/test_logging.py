@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+import logging
+import queue
+
+import pytest
+
+import simulate
+
+class Capture(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+@pytest.fixture
+def captured(bot):
+    """ตั้ง logging ผ่าน setup_logging() จริง แต่ให้ listener เขียนลง Capture แทน stdout"""
+    bot.clock.set(bot.localize(simulate.SIM_START).timestamp())
+    listener = bot.setup_logging("DEBUG", "text")
+    cap = Capture()
+    listener.handlers = (cap,)
+
+    def flush():
+        listener.stop()   # รอให้คิวออกครบ
+        listener.start()
+        return cap.records
+    yield flush
+    listener.stop()
+    bot.logger.handlers[:] = []   # logger "l9" ใช้ร่วมกันทั้งโปรเซส — คืนสภาพเหมือนก่อน setup_logging
+    bot.logger.filters[:] = []
+    bot.logger.propagate = True
+
+def test_repeated_message_emitted_once_then_reports_suppressed(bot, captured):
+    for _ in range(5):
+        bot.log("[WARN] ชีตช้า")
+    bot.log("[WARN] ข้อความอื่น")
+    bot.clock.set(bot.clock.time() + bot.LOG_DEDUP_SEC - 1)
+    bot.log("[WARN] ชีตช้า")                          # ยังอยู่ใน window
+    bot.clock.set(bot.clock.time() + 1)
+    bot.log("[WARN] ชีตช้า")                          # หมด window → ผ่าน พร้อมจำนวนที่ข้ามไป
+
+    records = captured()
+    msgs = [r.msg for r in records]
+    assert msgs == ["[WARN] ชีตช้า", "[WARN] ข้อความอื่น", "[WARN] ชีตช้า"]
+    assert not getattr(records[0], "repeated", 0) and records[2].repeated == 5
+    assert bot.LOG_STATS["suppressed"] == 5
+    assert bot.TextLogFormatter().format(records[2]).endswith("(ซ้ำอีก 5 ครั้งก่อนหน้านี้)")
+    assert '"repeated": 5' in bot.JsonLogFormatter().format(records[2])
+
+def test_tag_maps_to_level(bot, captured):
+    for msg in ("[DEBUG] d", "[WARN] w", "[ERROR] e", "[SCHED] s", "ไม่มีแท็ก"):
+        bot.log(msg)
+    levels = {r.msg: r.levelno for r in captured()}
+    assert levels == {"[DEBUG] d": logging.DEBUG, "[WARN] w": logging.WARNING, "[ERROR] e": logging.ERROR,
+                      "[SCHED] s": logging.INFO, "ไม่มีแท็ก": logging.INFO}
+
+def test_debug_is_skipped_below_level(bot, captured):
+    bot.logger.setLevel(logging.INFO)
+    bot.log_min_level = logging.INFO
+    bot.log("[DEBUG] ไม่ควรออก")
+    bot.log("[AUTO] ออก")
+    assert [r.msg for r in captured()] == ["[AUTO] ออก"]
+
+def test_full_queue_drops_and_counts(bot):
+    bot.logger.handlers[:] = [bot.LogQueueHandler(queue.Queue(2))]
+    bot.logger.filters[:] = []
+    bot.logger.setLevel(logging.INFO)
+    try:
+        for i in range(5):
+            bot.log(f"[INFO] ข้อความ {i}")   # ไม่มี listener มาดึง → คิวเต็มหลัง 2 ข้อความ
+        assert bot.LOG_STATS["dropped"] == 3
+    finally:
+        bot.logger.handlers[:] = []
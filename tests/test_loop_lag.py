@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import time
+from datetime import datetime
+
+import simulate
+
+SLOW_READ_SEC = 1.0
+MAX_LAG_SEC   = 0.25   # อ่าน blocking บน loop จะค้างเท่า SLOW_READ_SEC (ดูเทสต์ควบคุมด้านล่าง)
+
+class SlowSpreadsheet(simulate.FakeSpreadsheet):
+    """ชีตที่อ่านค่าช้า (blocking) เหมือน Google Sheets ตอนช้า"""
+
+    def values_batch_get(self, ranges: list) -> dict:
+        time.sleep(SLOW_READ_SEC)
+        return super().values_batch_get(ranges)
+
+async def max_loop_lag(coro, interval: float = 0.01) -> float:
+    """รัน coro พร้อมตัววัดที่ตื่นทุก interval — คืนว่าตื่นช้ากว่ากำหนดมากที่สุดเท่าไร"""
+    lags, done = [], asyncio.Event()
+
+    async def probe():
+        while not done.is_set():
+            t0 = time.perf_counter()
+            await asyncio.sleep(interval)
+            lags.append(time.perf_counter() - t0 - interval)
+
+    task = asyncio.create_task(probe())
+    await asyncio.sleep(0)
+    try:
+        await coro
+    finally:
+        done.set()
+        await task
+    return max(lags)
+
+def setup_slow_sheet(bot):
+    bot.open_stores(":memory:", "")
+    bot.SHEET_SNAPSHOT_PATH = ""
+    t = bot.TENANTS[0]
+    ss = SlowSpreadsheet(t.primary_ws, simulate.sim_sheet_rows(200, datetime.now()), t.spreadsheet_id)
+    bot.sheet_session = simulate.FakeSheetSession([ss])
+    return t, ss
+
+def test_slow_sheet_read_does_not_block_loop(bot):
+    t, ss = setup_slow_sheet(bot)
+
+    async def main():
+        t0 = time.perf_counter()
+        lag = await max_loop_lag(bot.refresh_sheet(t))
+        return lag, time.perf_counter() - t0
+
+    lag, took = asyncio.run(main())
+    assert took >= SLOW_READ_SEC            # อ่านช้าจริง
+    assert t.timeline.sheet_loaded           # และได้แถวเข้าไทม์ไลน์
+    assert lag < MAX_LAG_SEC, f"loop ค้าง {lag:.3f}s ระหว่างอ่านชีต"
+
+def test_probe_detects_blocking_read(bot):
+    # ตัวควบคุม: อ่านแบบ blocking บน loop ตรง ๆ ต้องวัด lag ได้เกือบเท่าเวลาอ่าน
+    t, ss = setup_slow_sheet(bot)
+
+    async def blocking_read():
+        bot.load_sheet_rows(ss, t)
+
+    lag = asyncio.run(max_loop_lag(blocking_read()))
+    assert lag >= SLOW_READ_SEC * 0.8
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+"""
+micro-benchmark ตัว parse วันที่/เวลาฆ่าจากชีต: strptime วนทีละฟอร์แม็ต (ก่อน) เทียบ FastFormats (หลัง)
+pytest -s tests/test_parse_bench.py พิมพ์ตัวเลข — ผลต้องเหมือนกันทุกค่า และรุ่นใหม่ต้องเร็วกว่า
+"""
+import random
+import time
+from datetime import datetime, timedelta
+
+import simulate
+
+ROWS = 2000
+
+def strptime_parse_gsheet_date(raw, bad_tokens):
+    """parse_gsheet_date รุ่นก่อน FastFormats (ลอง strptime ทีละฟอร์แม็ต)"""
+    s = str(raw).strip()
+    if s in bad_tokens:
+        return None
+    for fmt in ("%Y-%m-%d", "%d/%m/%Y", "%d-%m-%Y", "%Y/%m/%d"):
+        try:
+            return datetime.strptime(s, fmt).date()
+        except Exception:
+            continue
+    return None
+
+def strptime_parse_kill_dt(raw, bad_tokens, tz):
+    """parse_kill_dt รุ่นก่อน FastFormats"""
+    s = str(raw).strip()
+    if s in bad_tokens:
+        return None
+    for fmt in ("%d/%m/%Y, %H:%M:%S", "%d/%m/%Y %H:%M:%S", "%d/%m/%Y, %H:%M", "%d/%m/%Y %H:%M",
+                "%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M"):
+        try:
+            return tz.localize(datetime.strptime(s, fmt))
+        except Exception:
+            continue
+    return None
+
+def mixed_cells(n: int, seed: int = 1):
+    """วันที่/เวลาฆ่าหลายฟอร์แม็ตปนกัน + ช่องว่าง/ค่าเสีย เหมือนชีตที่หลายคนกรอก"""
+    rnd = random.Random(seed)
+    dates, kills = [], []
+    base = datetime(2026, 1, 5)
+    for _ in range(n):
+        d = base + timedelta(minutes=rnd.randrange(60 * 24 * 30))
+        dates.append(rnd.choice((d.strftime("%Y-%m-%d"), d.strftime("%d/%m/%Y"), d.strftime("%d-%m-%Y"),
+                                 d.strftime("%Y/%m/%d"), "", "-", "ไม่รู้")))
+        kills.append(rnd.choice((d.strftime("%d/%m/%Y %H:%M:%S"), d.strftime("%d/%m/%Y, %H:%M"),
+                                 d.strftime("%Y-%m-%d %H:%M"), d.strftime("%Y-%m-%d %H:%M:%S"), "", "#VALUE!")))
+    return dates, kills
+
+def best_of(fn, repeat: int = 5) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+def test_fast_formats_match_strptime_and_are_faster(bot):
+    dates, kills = mixed_cells(ROWS)
+    bad, tz = bot.BAD_TOKENS, bot.tz
+
+    before = ([strptime_parse_gsheet_date(s, bad) for s in dates], [strptime_parse_kill_dt(s, bad, tz) for s in kills])
+    after = ([bot.parse_gsheet_date(s) for s in dates], [bot.parse_kill_dt(s) for s in kills])
+    assert after == before
+
+    t_before = best_of(lambda: ([strptime_parse_gsheet_date(s, bad) for s in dates],
+                                [strptime_parse_kill_dt(s, bad, tz) for s in kills]))
+    t_after = best_of(lambda: ([bot.parse_gsheet_date(s) for s in dates], [bot.parse_kill_dt(s) for s in kills]))
+    print(f"\n[BENCH] วันที่+เวลาฆ่า {ROWS} แถว: strptime {t_before * 1000:.1f} ms → FastFormats {t_after * 1000:.1f} ms "
+          f"({t_before / t_after:.1f}x)")
+    assert t_after * 2 < t_before
+
+def test_full_sheet_parse_throughput(bot):
+    # ทั้งเส้นทาง parse (diff_rows ไม่มี cache) บนชีตจำลองขนาด READ_RANGE เต็ม — พิมพ์ไว้ดูแนวโน้ม
+    raw = simulate.sim_sheet_rows(ROWS, simulate.SIM_START)
+    cols = bot.row_cols(bot.build_col_idx(raw[0]))
+    hashes, rows, _ = bot.diff_rows(raw, cols, None)
+    assert len(rows) > ROWS * 0.9
+    took = best_of(lambda: bot.diff_rows(raw, cols, None))
+    print(f"\n[BENCH] diff_rows {ROWS} แถว (parse ทั้งหมด): {took * 1000:.1f} ms ({int(ROWS / took)} แถว/วินาที)")
@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+import asyncio
+from datetime import timedelta
+from types import SimpleNamespace
+
+import discord
+
+def http_error(cls=discord.HTTPException, status=400):
+    return cls(SimpleNamespace(status=status, reason="test"), "test")
+
+class FakeMessage:
+    def __init__(self, channel, msg_id: int, age: timedelta, error=None):
+        self.channel = channel
+        self.id = msg_id
+        self.created_at = discord.utils.utcnow() - age
+        self.error = error
+
+    async def delete(self):
+        ch = self.channel
+        ch.inflight += 1
+        ch.max_inflight = max(ch.max_inflight, ch.inflight)
+        try:
+            await asyncio.sleep(0.001)
+            if self.error:
+                raise self.error
+            ch.single_deleted.append(self.id)
+        finally:
+            ch.inflight -= 1
+
+class FakePurgeChannel:
+    """ห้องปลอม: history ใหม่→เก่า, bulk delete ปฏิเสธข้อความอายุ ≥ 14 วัน/เกิน 100 ข้อความเหมือน Discord"""
+
+    def __init__(self, bulk_error=None, history_error_after=None):
+        self.id = 42
+        self.messages = []
+        self.bulk_batches = []
+        self.single_deleted = []
+        self.bulk_error = bulk_error
+        self.history_error_after = history_error_after   # history ล้มหลังส่งข้อความไปกี่ข้อความ
+        self.inflight = self.max_inflight = 0
+
+    def add(self, n: int, age: timedelta, error=None):
+        for _ in range(n):
+            self.messages.append(FakeMessage(self, len(self.messages) + 1, age, error))
+
+    async def history(self, limit=None):
+        for i, msg in enumerate(sorted(self.messages, key=lambda m: m.created_at, reverse=True)):
+            if i == self.history_error_after:
+                raise http_error(discord.DiscordServerError, 503)
+            yield msg
+
+    async def delete_messages(self, batch):
+        if self.bulk_error:
+            raise self.bulk_error
+        limit = discord.utils.utcnow() - timedelta(days=14)
+        assert len(batch) <= 100
+        assert all(m.created_at > limit for m in batch)
+        self.bulk_batches.append([m.id for m in batch])
+
+def test_bulk_batches_and_old_messages(bot):
+    ch = FakePurgeChannel()
+    ch.add(250, timedelta(hours=1))
+    ch.add(1, timedelta(days=13, hours=23))              # ใหม่กว่า cutoff → bulk
+    ch.add(1, timedelta(days=13, hours=23, minutes=55))  # อยู่ในช่วงเผื่อ 10 นาที → ลบทีละข้อความ
+    ch.add(7, timedelta(days=20))
+    ch.add(1, timedelta(minutes=1))                      # prompt ของคำสั่ง → ข้าม
+    skip = {ch.messages[-1].id}
+    reports = []
+
+    async def progress(result):
+        reports.append(dict(result))
+
+    result = asyncio.run(bot.purge_channel(ch, skip_ids=skip, progress=progress))
+
+    assert [len(b) for b in ch.bulk_batches] == [100, 100, 51]
+    assert len(ch.single_deleted) == 8
+    assert ch.max_inflight <= bot.PURGE_OLD_CONCURRENCY
+    assert not skip & ({i for b in ch.bulk_batches for i in b} | set(ch.single_deleted))
+    assert result == {"deleted": 259, "failed": 0, "errors": {}}
+    assert reports[-1] == result
+
+def test_bulk_failure_falls_back_and_counts_failures(bot):
+    ch = FakePurgeChannel(bulk_error=http_error())
+    ch.add(5, timedelta(hours=1))
+    ch.add(1, timedelta(hours=1), error=http_error(discord.NotFound, 404))    # หายไปแล้ว → ไม่นับว่าพลาด
+    ch.add(2, timedelta(hours=1), error=http_error(discord.Forbidden, 403))
+    ch.add(3, timedelta(days=30))
+    ch.add(1, timedelta(days=30), error=http_error(discord.Forbidden, 403))
+
+    result = asyncio.run(bot.purge_channel(ch))
+
+    assert ch.bulk_batches == []
+    assert len(ch.single_deleted) == 8
+    assert result == {"deleted": 8, "failed": 3, "errors": {"Forbidden": 3}}
+
+def test_history_error_flushes_collected_chunk_and_counts_failure(bot):
+    ch = FakePurgeChannel(history_error_after=150)
+    ch.add(300, timedelta(hours=1))
+
+    result = asyncio.run(bot.purge_channel(ch))
+
+    assert [len(b) for b in ch.bulk_batches] == [100, 50]    # 50 ที่เก็บไว้ก่อน history ล้มถูกลบด้วย
+    assert result == {"deleted": 150, "failed": 1, "errors": {"DiscordServerError": 1}}
@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+import asyncio
+from collections import Counter
+
+import simulate
+
+class CountingSpreadsheet(simulate.FakeSpreadsheet):
+    """ชีตปลอมที่นับ call แยกตามเมธอด"""
+
+    def __init__(self, *args):
+        super().__init__(*args)
+        self.by_method = Counter()
+
+    def worksheets(self):
+        self.by_method["worksheets"] += 1
+        return super().worksheets()
+
+    def values_batch_get(self, ranges: list) -> dict:
+        self.by_method["values"] += 1
+        return super().values_batch_get(ranges)
+
+    def get_lastUpdateTime(self) -> str:
+        self.by_method["probe"] += 1
+        return super().get_lastUpdateTime()
+
+def test_idle_sheet_costs_one_probe_per_poll(bot):
+    bot.open_stores(":memory:", "")
+    bot.SHEET_SNAPSHOT_PATH = ""
+    start = bot.localize(simulate.SIM_START)
+    bot.clock.set(start.timestamp())
+    t = bot.TENANTS[0]
+    ss = CountingSpreadsheet(t.primary_ws, simulate.sim_sheet_rows(100, simulate.SIM_START), t.spreadsheet_id)
+    bot.sheet_session = simulate.FakeSheetSession([ss])
+
+    async def poll(minutes):
+        for minute in minutes:
+            bot.clock.set(start.timestamp() + minute * 60)
+            await bot.check_alerts.coro()
+
+    # รอบแรกโหลดเข้า cache (เลือกแท็บด้วยหัวตาราง + อ่านทั้งช่วง)
+    asyncio.run(poll([0]))
+    assert t.timeline.sheet_loaded
+    first = Counter(ss.by_method)
+
+    # อีก 1 ชั่วโมงที่ชีตไม่เปลี่ยน: probe รอบละ 1 ครั้ง ไม่อ่านค่าเลย
+    asyncio.run(poll(range(1, 61)))
+    idle = Counter(ss.by_method) - first
+    assert idle["probe"] == 60
+    assert idle["values"] == 0
+    assert idle["worksheets"] == 0
+    assert bot.SHEET_STATS["probe_hits"] == 60
+
+    # แก้ชีต 1 ช่อง → รอบถัดไปอ่านค่าใหม่ 1 ครั้ง แล้วกลับไป probe อย่างเดียว
+    ss.edit(2, 9, "แก้ note")
+
+    asyncio.run(poll([61, 62]))
+    after = Counter(ss.by_method) - first
+    assert after["probe"] == 62
+    assert after["values"] == 1
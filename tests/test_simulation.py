@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import simulate
+
+BKK = timezone(timedelta(hours=7))   # Asia/Bangkok ไม่มี DST — คิดด้วยมือได้
+
+def bkk_minute(d: int, hh: int, mm: int) -> int:
+    return int(datetime(2026, 1, d, hh, mm, tzinfo=BKK).timestamp()) // 60
+
+def test_week_replay_exactly_once():
+    r = asyncio.run(simulate.run_simulation(rows_n=100, days=7, subs_n=50))
+    assert r["alerts_expected"] > 1000
+    assert r["missing"] == r["unexpected"] == r["duplicates"] == 0
+    assert simulate.sim_ok(r), r
+
+def test_replay_twice_in_one_process():
+    a = asyncio.run(simulate.run_simulation(rows_n=30, days=1, seed=3))
+    b = asyncio.run(simulate.run_simulation(rows_n=30, days=1, seed=3))
+    assert simulate.sim_ok(a) and simulate.sim_ok(b)
+    assert a["alerts_fired"] == b["alerts_fired"]
+
+def test_alerts_match_hand_computed_times(bot):
+    # จันทร์ 5 ม.ค. 2026 00:00 → 06:00 (เวลาไทย) แจ้ง T-60 / T-30 / T-5
+    header = simulate.SIM_HEADER
+    rows = [
+        list(header),
+        # ฆ่า 23:30 คืนก่อน รอบ 4 ชั่วโมง → เกิด 03:30 (รอบถัดไป 07:30 แจ้ง 06:30 เลยช่วงจำลอง)
+        ["50", "บอสรอบ", "แผนที่1", "", "03:30", "", "2026-01-05", "interval", "4 ชั่วโมง", "", "04/01/2026 23:30:00"],
+        # รายสัปดาห์ จันทร์ 02:00
+        ["40", "บอสจันทร์", "แผนที่2", "", "", "", "", "fixed", "จันทร์ 02:00", "", ""],
+        # รายวัน 05:10
+        ["30", "บอสรายวัน", "แผนที่3", "", "05:10", "", "", "other", "", "", ""],
+    ]
+    r = asyncio.run(simulate.run_simulation(days=0.25, sheet_rows=rows, bot=bot))
+    assert simulate.sim_ok(r), r
+
+    got = {(name, minute, th) for _, name, minute, th in bot.alerted.fired
+           if name in {"บอสรอบ", "บอสจันทร์", "บอสรายวัน"}}
+    want = {(name, bkk_minute(5, hh, mm), th)
+            for name, hh, mm in (("บอสรอบ", 3, 30), ("บอสจันทร์", 2, 0), ("บอสรายวัน", 5, 10))
+            for th in (60, 30, 5)}
+    assert got == want
+    assert all(c == 1 for c in bot.alerted.fired.values())
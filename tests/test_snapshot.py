@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import json
+from datetime import timedelta
+
+import pytest
+
+import simulate
+
+def setup_sheet(bot, path, ss=None):
+    bot.open_stores(":memory:", "")
+    bot.SHEET_SNAPSHOT_PATH = str(path)
+    bot.clock.set(bot.localize(simulate.SIM_START).timestamp())
+    t = bot.TENANTS[0]
+    ss = ss or simulate.FakeSpreadsheet(t.primary_ws, simulate.sim_sheet_rows(50, simulate.SIM_START), t.spreadsheet_id)
+    bot.sheet_session = simulate.FakeSheetSession([ss])
+    return t, ss
+
+def spawns(t, bot):
+    now = bot.clock.now()
+    return [(b.epoch, b.ws, b.name) for b in t.timeline.between(now, now + timedelta(days=3))]
+
+@pytest.fixture
+def snapshot(bot, tmp_path):
+    """snapshot ที่บอทตัวแรกเขียนหลังอ่านชีตสำเร็จ → (path, ชีต, tenant ของตัวแรก)"""
+    path = tmp_path / "sheet_snapshot.json"
+    t, ss = setup_sheet(bot, path)
+    asyncio.run(bot.refresh_sheet(t))
+    bot.sheet_executor.shutdown(wait=True)   # save_snapshot รันใน executor
+    assert path.exists()
+    return path, ss, t
+
+@pytest.fixture
+def fresh():
+    """บอทตัวที่สอง (เหมือนรีสตาร์ทโปรเซส)"""
+    m = simulate.load_bot()
+    yield m
+    m.clock.set(None)
+    m.sheet_executor.shutdown(wait=False)
+
+def test_warm_start_round_trip(bot, snapshot, fresh):
+    path, ss, t1 = snapshot
+    t2, _ = setup_sheet(fresh, path, ss)
+    calls = ss.calls
+
+    asyncio.run(fresh.warm_start(t2))
+    assert ss.calls == calls                                   # ไม่แตะ Google
+    assert t2.timeline.sheet_loaded and spawns(t2, fresh) == spawns(t1, bot)
+    assert fresh.WS_CACHE[t2.key]["title"] == bot.WS_CACHE[t1.key]["title"]
+    c1, c2 = bot.SHEET_CACHE[t1.key], fresh.SHEET_CACHE[t2.key]
+    assert c2["hashes"] == c1["hashes"] and c2["rows"] == c1["rows"] and c2["modified"] == c1["modified"]
+
+    # อ่านชีตครั้งแรกหลังรีสตาร์ท: แก้ 1 แถว → diff 1 แถว ไม่สร้างใหม่ทั้งชีต
+    builds, updates = [], []
+    build_sheet_update, update_rows = fresh.build_sheet_update, t2.timeline.update_rows
+    fresh.build_sheet_update = lambda *a: builds.append(1) or build_sheet_update(*a)
+    t2.timeline.update_rows = lambda ws, changed, now: updates.append(sorted(changed)) or update_rows(ws, changed, now)
+    ss.edit(5, 1, "บอสหลังรีสตาร์ท")
+    t2.poll["force"] = True
+    asyncio.run(fresh.refresh_sheet(t2))
+    assert builds == [] and updates == [[5]]
+    assert t2.timeline.sheet_rows[5].name == "บอสหลังรีสตาร์ท"
+
+def test_unchanged_sheet_after_restart_is_a_probe_hit(bot, snapshot, fresh):
+    path, ss, _ = snapshot
+    t2, _ = setup_sheet(fresh, path, ss)
+    asyncio.run(fresh.warm_start(t2))
+    version = t2.timeline.version
+    asyncio.run(fresh.refresh_sheet(t2))
+    assert fresh.SHEET_STATS["probe_hits"] == 1 and t2.timeline.version == version
+
+@pytest.mark.parametrize("damage", ["truncated", "garbage", "version", "other_sheet", "missing_key"])
+def test_bad_snapshot_is_ignored(bot, snapshot, fresh, damage):
+    path, ss, _ = snapshot
+    raw = path.read_text(encoding="utf-8")
+    data = json.loads(raw)
+    if damage == "truncated":
+        path.write_text(raw[:len(raw) // 2], encoding="utf-8")
+    elif damage == "garbage":
+        path.write_bytes(b"\x00\xff not json")
+    else:
+        if damage == "version":
+            data["v"] = -1
+        elif damage == "other_sheet":
+            data["spreadsheet_id"] = "ไฟล์อื่น"
+        else:
+            del data["hashes"]
+        path.write_text(json.dumps(data), encoding="utf-8")
+
+    t2, _ = setup_sheet(fresh, path, ss)
+    logged = []
+    fresh.log = logged.append
+    asyncio.run(fresh.warm_start(t2))
+    assert not t2.timeline.sheet_loaded
+    assert t2.key not in fresh.WS_CACHE and t2.key not in fresh.SHEET_CACHE
+    assert any("snapshot" in m for m in logged) == (damage in ("truncated", "garbage", "missing_key"))
+
+    asyncio.run(fresh.refresh_sheet(t2))                       # ชีตยังอ่านได้ตามปกติ
+    assert t2.timeline.sheet_loaded
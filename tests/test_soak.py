@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+import asyncio
+
+import simulate
+
+def test_month_soak_state_stays_bounded(bot):
+    # 30 วันด้วย clock จำลอง: ledger ถูก prune ทั้งในหน่วยความจำและใน SQLite และสถานะไม่โตตามเวลา
+    r = asyncio.run(simulate.run_simulation(rows_n=20, days=30, subs_n=10, bot=bot))
+    assert simulate.sim_ok(r), r
+    daily = r["daily"]
+    assert len(daily) == 31
+
+    week1, later = daily[:8], daily[8:]
+    for d in daily:
+        assert d["ledger_rows"] == d["ledger_keys"], d
+    assert max(d["ledger_keys"] for d in later) <= 2 * max(d["ledger_keys"] for d in week1) + 5
+    assert max(d["alerts_pending"] for d in later) <= 2 * max(d["alerts_pending"] for d in week1) + 5
+
+    lo, hi = min(d["timeline_entries"] for d in week1), max(d["timeline_entries"] for d in week1)
+    assert all(0.9 * lo <= d["timeline_entries"] <= 1.1 * hi for d in later)
+
+    # object ทั้งโปรเซสหลังสัปดาห์แรก (cache อุ่นแล้ว) โตไม่เกิน 2% ตลอดอีก 3 สัปดาห์
+    assert daily[-1]["gc_objects"] <= daily[7]["gc_objects"] * 1.02
+    assert bot.alerted._db.execute("SELECT COUNT(*) FROM alerts_sent").fetchone()[0] == len(bot.alerted)
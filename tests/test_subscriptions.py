@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+import random
+
+def brute_users(subs, tenant, level, lead):
+    return {s.user_id for s in subs if s.tenant == tenant and s.kind == "level" and s.lead_min == lead
+            and s.lv_min <= level <= s.lv_max}
+
+def test_level_ranges_are_stored_as_intervals(bot, tmp_path):
+    path = str(tmp_path / "subs.sqlite3")
+    store = bot.SubscriptionStore(path)
+    for uid in range(200):
+        store.add("g", uid, "level", lv_min=1, lv_max=bot.SUB_MAX_LEVEL, lead_min=5)
+    # ช่วงกว้างสุดไม่แตกเป็นรายเลเวล: 1 รายการต่อ subscription
+    assert sum(len(ivs) for by_lead in store._levels.values() for ivs in by_lead.values()) == 200
+    assert not store._index
+    b = bot.Boss("Sheet", "บอส", 0, level="500")
+    assert store.leads("g", b) == {5}
+    assert store.users("g", b, 5) == set(range(200))
+    assert store.remove("g", 0) == 1 and len(store.users("g", b, 5)) == 199
+    # โหลดจากไฟล์ใหม่ได้ผลเดียวกัน
+    assert bot.SubscriptionStore(path).users("g", b, 5) == set(range(1, 200))
+
+def test_level_lookup_matches_brute_force(bot):
+    store = bot.SubscriptionStore(":memory:")
+    rnd = random.Random(3)
+    for uid in range(300):
+        lo = rnd.randint(1, 300)
+        store.add(rnd.choice(("g1", "g2")), uid, "level", lv_min=lo, lv_max=lo + rnd.randint(0, 60),
+                  lead_min=rnd.choice((5, 10, 30)))
+    store.add("g1", 999, "name", name="บอส", lead_min=10)
+    for uid in rnd.sample(range(300), 100):
+        store.remove("g1", uid)
+        store.remove("g2", uid)
+    subs = list(store._subs.values())
+    for level in range(0, 400, 7):
+        b = bot.Boss("Sheet", "บอส", 0, level=str(level))
+        for tenant in ("g1", "g2"):
+            for lead in (5, 10, 30):
+                expect = brute_users(subs, tenant, level, lead) | ({999} if tenant == "g1" and lead == 10 else set())
+                assert store.users(tenant, b, lead) == expect
+                assert (lead in store.leads(tenant, b)) == bool(expect)
+    # เวิลด์บอส/เลเวลไม่ใช่ตัวเลข → ไม่เข้าช่วงเลเวล
+    assert store.users("g1", bot.Boss("Sheet", "อื่น", 0, level="?"), 5) == set()
+    assert store.users("g1", bot.Boss("Sheet", "อื่น", 0, level="100"), 5, world=True) == set()
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+import json
+import re
+import sqlite3
+
+import pytest
+
+def load(bot, tmp_path, rows):
+    path = tmp_path / "tenants.json"
+    path.write_text(json.dumps(rows, ensure_ascii=False), encoding="utf-8")
+    bot.TENANTS_FILE = str(path)
+    return bot.load_tenants()
+
+def test_load_tenants_valid_rows(bot, tmp_path):
+    a, b = load(bot, tmp_path, [
+        {"key": "l9", "guild_id": 1, "spreadsheet_id": "SS1", "channel_id": 10, "channels": {"Fixed": 11}, "roles": [5]},
+        {"key": "other", "guild_id": "2", "spreadsheet_id": "SS2", "worksheet": "boss_timer"},
+    ])
+    assert (a.key, a.guild_id, a.channels(), a.mention) == ("l9", 1, {10, 11}, "<@&5>")
+    assert (b.guild_id, b.primary_ws, b.tag) == (2, "boss_timer", "[other] ")
+
+@pytest.mark.parametrize("rows, message", [
+    ({"key": "l9"}, "JSON list"),
+    (["l9"], "แถวที่ 1 ต้องเป็น object"),
+    ([{"spreadsheet_id": "SS1"}], "แถวที่ 1: ไม่มีคีย์ 'key'"),
+    ([{"key": "l9"}], "แถวที่ 1 ('l9'): ไม่มีคีย์ 'spreadsheet_id'"),
+    ([{"key": "l9", "spreadsheet_id": "SS1", "chanel_id": 10}], "('l9'): ไม่รู้จักคีย์ chanel_id"),
+    ([{"key": "l9", "spreadsheet_id": "SS1"}, {"key": "b", "spreadsheet_id": "SS2", "guild_id": "abc"}],
+     "แถวที่ 2 ('b'): 'guild_id'"),
+    ([{"key": "l9", "spreadsheet_id": "SS1", "channels": {"Fixed": "x"}}], "('l9'): 'channels'"),
+    ([{"key": "l9", "spreadsheet_id": "SS1", "roles": 5}], "('l9'): 'roles'"),
+])
+def test_load_tenants_rejects_bad_rows(bot, tmp_path, rows, message):
+    with pytest.raises(RuntimeError, match=re.escape(message)):
+        load(bot, tmp_path, rows)
+
+def test_ledger_migrates_single_tenant_table(bot, tmp_path):
+    path = str(tmp_path / "ledger.db")
+    now_min = int(bot.clock.time()) // 60
+    db = sqlite3.connect(path)
+    with db:
+        db.execute("CREATE TABLE alerted (name TEXT, spawn_min INTEGER, th INTEGER)")
+        db.executemany("INSERT INTO alerted VALUES (?, ?, ?)",
+                       [("บอสก", now_min + 30, 15), ("บอสข", now_min + 60, 5), ("เก่า", now_min - 10, 5)])
+    db.close()
+
+    ledger = bot.AlertLedger(path)
+    assert ("default", "บอสก", now_min + 30, 15) in ledger
+    assert ("default", "บอสข", now_min + 60, 5) in ledger
+    assert len(ledger) == 2   # คีย์ที่เลยเวลาเกิดแล้วถูกลบ
+    assert not ledger._db.execute("SELECT 1 FROM sqlite_master WHERE name = 'alerted'").fetchone()
+
+    # คีย์แยกตาม tenant: ชื่อ+นาทีเดียวกันของอีก tenant ไม่ถือว่าส่งแล้ว
+    assert not ledger.add(("default", "บอสก", now_min + 30, 15))
+    assert ledger.add(("other", "บอสก", now_min + 30, 15))
+    assert len(bot.AlertLedger(path)) == 3
+
+def test_webhook_tenant_routing(bot, tmp_path):
+    bot.TENANTS = load(bot, tmp_path, [
+        {"key": "a", "spreadsheet_id": "SS1", "worksheet": "main"},
+        {"key": "b", "spreadsheet_id": "SS1", "worksheet": "alt"},
+        {"key": "c", "spreadsheet_id": "SS2"},
+    ])
+    a, b, c = bot.TENANTS
+    assert bot.webhook_tenant("SS2", "whatever") is c
+    assert bot.webhook_tenant("SS1", "main") is a
+    assert bot.webhook_tenant("SS1", "alt") is b
+    assert bot.webhook_tenant("SS1", "other") is None   # ไฟล์เดียวหลายแท็บ แต่ไม่ตรงแท็บไหน
+    assert bot.webhook_tenant("SS3", "main") is None
+    assert bot.webhook_tenant(None, "alt") is b          # payload ไม่มี id → ดูชื่อแท็บ
+
+    # แท็บที่เปิดได้จริง (WS_CACHE) มาก่อนชื่อใน config
+    bot.WS_CACHE["b"] = {"title": "renamed", "col": {}}
+    assert bot.webhook_tenant("SS1", "renamed") is b
+    assert bot.webhook_tenant("SS1", "alt") is None
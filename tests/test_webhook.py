@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import json
+import time
+
+from aiohttp.test_utils import TestClient, TestServer
+
+import simulate
+
+SECRET = "test-secret"
+
+def setup_sheet(bot):
+    bot.open_stores(":memory:", "")
+    bot.SHEET_SNAPSHOT_PATH = ""
+    bot.SHEET_WEBHOOK_SECRET = SECRET
+    bot.clock.set(bot.localize(simulate.SIM_START).timestamp())
+    t = bot.TENANTS[0]
+    ss = simulate.FakeSpreadsheet(t.primary_ws, simulate.sim_sheet_rows(20, simulate.SIM_START), t.spreadsheet_id)
+    bot.sheet_session = simulate.FakeSheetSession([ss])
+    asyncio.run(bot.refresh_sheet(t))
+    return t, ss
+
+def post_all(bot, requests: list) -> list:
+    """POST /sheet-webhook ทีละรายการ [(payload, ลายเซ็นหรือ None = เซ็นถูก)] คืน [(status, json)]"""
+    async def main():
+        out = []
+        async with TestClient(TestServer(bot.make_http_app())) as client:
+            for payload, sig in requests:
+                body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+                resp = await client.post("/sheet-webhook", data=body,
+                                         headers={"X-Signature": sig or bot.sign_webhook_body(body)})
+                out.append((resp.status, await resp.json()))
+        return out
+    return asyncio.run(main())
+
+def payload(t, rows, ts=None):
+    return {"spreadsheet_id": t.spreadsheet_id, "sheet": t.primary_ws, "ts": ts or time.time(), "rows": rows}
+
+def test_webhook_applies_signed_edit(bot):
+    t, ss = setup_sheet(bot)
+    row = list(ss.rows[1])
+    row[1] = "บอสจากเว็บฮุก"
+    [(status, body)] = post_all(bot, [(payload(t, [{"row": 2, "values": row}]), None)])
+    assert (status, body) == (200, {"ok": True, "applied": 1})
+    assert t.timeline.sheet_rows[2].name == "บอสจากเว็บฮุก"
+    assert t.webhook_edits == 1 and bot.WEBHOOK_STATS["applied"] == 1
+
+def test_webhook_rejects_bad_requests(bot):
+    t, ss = setup_sheet(bot)
+    good_row = {"row": 2, "values": list(ss.rows[1])}
+    results = post_all(bot, [
+        (payload(t, [good_row]), "0" * 64),                                  # ลายเซ็นผิด
+        (payload(t, [good_row], ts=time.time() - 3600), None),               # ts เก่า (replay)
+        ({"sheet": t.primary_ws, "rows": []}, None),                         # ไม่มี ts
+        (payload(t, [{"row": "สอง", "values": []}]), None),                  # เลขแถวไม่ใช่ตัวเลข
+        (payload(t, [{"row": 2, "values": "บอส,40"}]), None),                # values ไม่ใช่ list
+        ({**payload(t, [good_row]), "spreadsheet_id": "ไม่มีไฟล์นี้"}, None),
+    ])
+    assert [s for s, _ in results] == [401, 401, 400, 400, 400, 404]
+    assert all(body["ok"] is False for _, body in results)
+    assert t.webhook_edits == 0 and bot.WEBHOOK_STATS["rejected"] == 6
+
+def test_webhook_non_string_cells_are_text(bot):
+    t, ss = setup_sheet(bot)
+    row = [40, 123, None] + list(ss.rows[1][3:])    # level/ชื่อเป็นตัวเลข location เป็น null
+    [(status, body)] = post_all(bot, [(payload(t, [{"row": 2, "values": row}]), None)])
+    assert (status, body) == (200, {"ok": True, "applied": 1})
+    r = t.timeline.sheet_rows[2]
+    assert (r.level, r.name, r.location) == ("40", "123", "")
+
+def test_webhook_edits_match_full_reread(bot):
+    t, ss = setup_sheet(bot)
+    rows = []
+    for n, name in ((3, "บอสแก้ชื่อ"), (7, ""), (12, "บอสใหม่")):    # แก้ชื่อ / ลบแถว / แถวเดิมเปลี่ยนเป็นบอสอื่น
+        row = list(ss.rows[n - 1])
+        row[1] = name
+        ss.rows[n - 1] = row                                         # ชีตจริงถูกแก้ก่อน Apps Script ส่งมา
+        rows.append({"row": n, "values": row})
+    ss.modified += 1
+    [(status, body)] = post_all(bot, [(payload(t, rows), None)])
+    assert (status, body) == (200, {"ok": True, "applied": 3})
+
+    def state():
+        return dict(t.timeline.sheet_rows), sorted((b.epoch, b.name, b.src) for b in t.timeline._entries)
+
+    via_webhook = state()
+    bot.SHEET_CACHE.pop(t.key)                                       # อ่านเต็มใหม่ → replace_sheet
+    asyncio.run(bot.refresh_sheet(t))
+    assert state() == via_webhook
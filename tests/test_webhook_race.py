@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+import asyncio
+
+import simulate
+
+def setup_two_tenants(bot):
+    bot.open_stores(":memory:", "")
+    bot.SHEET_SNAPSHOT_PATH = ""
+    bot.clock.set(bot.localize(simulate.SIM_START).timestamp())
+    bot.TENANTS = [bot.Tenant(f"g{i}", guild_id=i + 1, spreadsheet_id=f"SS{i}", channel_id=1000 + i) for i in range(2)]
+    sheets = [simulate.FakeSpreadsheet(t.primary_ws, simulate.sim_sheet_rows(20, simulate.SIM_START, seed=i + 1),
+                                       t.spreadsheet_id)
+              for i, t in enumerate(bot.TENANTS)]
+    bot.sheet_session = simulate.FakeSheetSession(sheets)
+    return bot.TENANTS, sheets
+
+def webhook_during_read(bot, target, ss):
+    """load_sheet_rows ที่มี webhook ของ target แก้แถว 2 เข้ามาระหว่างอ่าน"""
+    load_sheet_rows = bot.load_sheet_rows
+
+    def racing(*args):
+        result = load_sheet_rows(*args)
+        row = list(ss.rows[1])
+        row[1] = row[1] + " (แก้)"
+        assert bot.apply_sheet_edits(target, target.primary_ws, [{"row": 2, "values": row}], bot.clock.now()) == 1
+        return result
+    return racing
+
+def test_webhook_on_other_tenant_does_not_discard_read(bot):
+    (a, b), (ss_a, ss_b) = setup_two_tenants(bot)
+
+    async def main():
+        for t in (a, b):
+            await bot.refresh_sheet(t)
+        ss_a.edit(3, 1, "บอสใหม่")
+        bot.load_sheet_rows = webhook_during_read(bot, b, ss_b)
+        await bot.refresh_sheet(a)
+
+    asyncio.run(main())
+    assert (a.webhook_edits, b.webhook_edits) == (0, 1)
+    assert a.poll["force"] is False and a.key in bot.SHEET_CACHE
+    assert any(r.name == "บอสใหม่" for r in a.timeline._sheet_rows.values())
+
+def test_webhook_on_same_tenant_forces_reread(bot):
+    (a, _), (ss_a, _) = setup_two_tenants(bot)
+
+    async def main():
+        await bot.refresh_sheet(a)
+        bot.load_sheet_rows = webhook_during_read(bot, a, ss_a)
+        await bot.refresh_sheet(a)
+
+    asyncio.run(main())
+    assert a.webhook_edits == 1
+    assert a.poll["force"] is True and a.key not in bot.SHEET_CACHE